@@ -0,0 +1,312 @@
+"""API JSON check-in untuk scanner QR / kiosk (asyncio, stdlib sahaja).
+
+Guna majlis_db yang sama dengan UI Streamlit, jadi boleh jalan serentak
+terhadap DB yang sama (WAL). Lookup dibaca dari index roster dalam memori
+(disync dari DB oleh task latar dalam executor, bukan dalam handler); confirm
+dihantar ke writer group-commit dan di-await tanpa blok event loop.
+
+    MAJLIS_DB=dinner.db python api.py --host 0.0.0.0 --port 8502
+
+Endpoint:
+    GET  /health
+    GET  /lookup?email=...      (atau ?t=<token QR>)
+    POST /confirm           {"email": "..."}   (email atau token QR)
+    POST /confirm/batch     {"emails": ["...", ...]}
+    GET  /stats
+
+Kalau MAJLIS_API_TOKEN diset, setiap request mesti hantar
+"Authorization: Bearer <token>".
+
+Lookup / confirm melalui rate limit (op api_* majlis_db) dan gate admission
+(tanpa beratur - event loop tak boleh blok): 429 bila client melebihi had,
+503 bila gate penuh, kedua-duanya dengan Retry-After. Client dikenal pasti
+dengan header "X-Kiosk-Id" (setiap kiosk/scanner bajet sendiri walaupun di
+belakang NAT yang sama), jika tiada ikut IP. /confirm/batch dicaj setiap email.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import kiosk_sync
+import majlis_db as db
+
+API_TOKEN = os.environ.get("MAJLIS_API_TOKEN", "")
+API_BATCH_MAX = 500              # email setiap /confirm/batch
+API_MAX_BODY = 1 << 20           # 1 MB
+API_HEADER_LIMIT = 16 * 1024
+API_KEEPALIVE_S = 30.0
+API_CONFIRM_TIMEOUT = 30.0
+API_ADMIT_OPS = {"/lookup": "api_lookup", "/confirm": "api_confirm", "/confirm/batch": "api_confirm"}
+API_ADMIT_MAX_ACTIVE = 512       # confirm pegang slot sepanjang tunggu group commit
+
+HTTP_STATUS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required",
+    413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+# =========================
+# HANDLERS
+# =========================
+def guest_json(row, checked_in: bool) -> dict:
+    email, nama, gelaran, no_meja = row
+    return {"email": email, "nama": nama, "gelaran": gelaran, "no_meja": no_meja, "checked_in": checked_in}
+
+async def handle_lookup(query, body):
+    raw = (query.get("email") or query.get("t") or [""])[0]
+    email = db.parse_checkin_input(raw)
+    if not email:
+        raise HTTPError(400, "Parameter 'email' (atau token QR 't') diperlukan / tidak sah.")
+    row = db.get_guest(email)
+    if row is None:
+        loop = asyncio.get_running_loop()
+        sug = await loop.run_in_executor(None, db.fuzzy_lookup, email)
+        return 404, {
+            "found": False,
+            "email": email,
+            "suggestions": [{"email": e, "nama": n} for e, n, _ in sug],
+        }
+    return 200, {"found": True, **guest_json(row, db.already_checked_in(row[0]))}
+
+async def _confirm_one(email: str) -> dict:
+    """Satu check-in (email atau token QR). Sudah hadir -> 'already' (scan berulang tak tulis semula)."""
+    email = db.parse_checkin_input(email)
+    row = db.get_guest(email) if email else None
+    if row is None:
+        return {"email": email, "status": "not_found"}
+    if db.already_checked_in(row[0]):
+        return {"status": "already", **guest_json(row, True)}
+
+    fut = db.submit_checkin(row)
+    ts = await asyncio.wait_for(asyncio.wrap_future(fut), API_CONFIRM_TIMEOUT)
+    return {"status": "checked_in", "timestamp": ts, **guest_json(row, True)}
+
+async def handle_confirm(query, body):
+    email = body.get("email") if isinstance(body, dict) else None
+    if not isinstance(email, str) or not email.strip():
+        raise HTTPError(400, "Medan 'email' diperlukan.")
+    res = await _confirm_one(email)
+    return (404 if res["status"] == "not_found" else 200), res
+
+async def handle_confirm_batch(query, body):
+    emails = body.get("emails") if isinstance(body, dict) else None
+    if not isinstance(emails, list) or not all(isinstance(e, str) for e in emails):
+        raise HTTPError(400, "Medan 'emails' mesti senarai string.")
+    if len(emails) > API_BATCH_MAX:
+        raise HTTPError(413, f"Maksimum {API_BATCH_MAX} email setiap batch.")
+
+    # semua masuk queue writer serentak -> satu / beberapa commit sahaja
+    results = await asyncio.gather(*(_confirm_one(e) for e in emails), return_exceptions=True)
+    out = []
+    for e, r in zip(emails, results):
+        out.append({"email": db.norm_email(e), "status": "error", "error": type(r).__name__}
+                   if isinstance(r, BaseException) else r)
+    summary = {}
+    for r in out:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return 200, {"results": out, "summary": summary}
+
+async def handle_stats(query, body):
+    loop = asyncio.get_running_loop()
+    total, hadir, belum = await loop.run_in_executor(None, db.count_stats)
+    return 200, {
+        "total": total,
+        "hadir": hadir,
+        "belum": belum,
+        "writer": db.checkin_writer_stats(),
+        "admission": db.admission_stats(),
+        "at": db.now_myt_str(),
+    }
+
+async def handle_health(query, body):
+    return 200, {"ok": True, "roster": db.roster_stats(), "db": db.DB_NAME}
+
+ROUTES = {
+    ("GET", "/health"): handle_health,
+    ("GET", "/lookup"): handle_lookup,
+    ("POST", "/confirm"): handle_confirm,
+    ("POST", "/confirm/batch"): handle_confirm_batch,
+    ("GET", "/stats"): handle_stats,
+}
+
+
+# =========================
+# HTTP/1.1 (keep-alive, Content-Length sahaja)
+# =========================
+async def read_request(reader):
+    """Pulang (method, path, query, headers, body, keep_alive) atau None bila sambungan tutup."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), API_KEEPALIVE_S)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Header terlalu besar.")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Request line tidak sah.")
+    headers = {}
+    for ln in lines[1:]:
+        if ln:
+            k, _, v = ln.partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Guna Content-Length.")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Content-Length tidak sah.")
+    if length > API_MAX_BODY:
+        raise HTTPError(413, "Body terlalu besar.")
+    raw = await reader.readexactly(length) if length else b""
+
+    url = urlsplit(target)
+    keep = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return method.upper(), url.path.rstrip("/") or "/", parse_qs(url.query), headers, raw, keep
+
+def write_response(writer, status: int, payload: dict, keep: bool, retry_after: float = None):
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    extra = f"Retry-After: {max(1, round(retry_after))}\r\n" if retry_after is not None else ""
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_STATUS.get(status, 'OK')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n{extra}"
+        f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n".encode("latin-1") + body
+    )
+
+def client_key(headers, peer_ip) -> str:
+    """Kunci rate limit: kiosk id (header X-Kiosk-Id) kalau sah, jika tidak IP."""
+    kiosk = headers.get("x-kiosk-id", "")
+    try:
+        return "kiosk:" + kiosk_sync.check_kiosk_id(kiosk)
+    except ValueError:
+        return f"ip:{peer_ip}"
+
+def authorized(headers) -> bool:
+    if not API_TOKEN:
+        return True
+    got = headers.get("authorization", "")
+    return hmac.compare_digest(got.encode(), f"Bearer {API_TOKEN}".encode())
+
+async def dispatch(method, path, query, headers, raw, peer_ip=None):
+    if not authorized(headers):
+        raise HTTPError(401, "Token tidak sah.")
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        if any(p == path for _, p in ROUTES):
+            raise HTTPError(405, "Method tidak dibenarkan.")
+        raise HTTPError(404, "Endpoint tidak wujud.")
+    body = {}
+    if raw:
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            raise HTTPError(400, "Body bukan JSON yang sah.")
+    op = API_ADMIT_OPS.get(path)
+    if op is None:
+        return await handler(query, body)
+    cost = 1
+    if path == "/confirm/batch" and isinstance(body, dict) and isinstance(body.get("emails"), list):
+        cost = min(max(len(body["emails"]), 1), API_BATCH_MAX)   # lebih dari had ditolak 413 oleh handler
+    try:
+        with db.admit(op, client_key(headers, peer_ip), wait_s=0, cost=cost):
+            return await handler(query, body)
+    except db.Busy as e:
+        if e.reason == "rate":
+            raise HTTPError(429, "Terlalu banyak permintaan, cuba lagi sebentar.", e.retry_after)
+        raise HTTPError(503, "Sistem sibuk, cuba lagi sebentar.", e.retry_after)
+
+async def serve_conn(reader, writer):
+    peer = writer.get_extra_info("peername")
+    peer_ip = peer[0] if peer else "local"
+    try:
+        while True:
+            keep = False
+            retry_after = None
+            t0 = time.perf_counter()
+            op = "api_error"
+            try:
+                req = await read_request(reader)
+                if req is None:
+                    break
+                method, path, query, headers, raw, keep = req
+                if (method, path) in ROUTES:
+                    op = "api_" + path.strip("/").replace("/", "_")
+                status, payload = await dispatch(method, path, query, headers, raw, peer_ip)
+            except HTTPError as e:
+                status, payload, retry_after = e.status, {"error": e.message}, e.retry_after
+            except asyncio.TimeoutError:
+                status, payload = 503, {"error": "Writer sibuk, cuba lagi."}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, payload = 500, {"error": type(e).__name__}
+            write_response(writer, status, payload, keep, retry_after)
+            await writer.drain()
+            if db.perf_enabled():
+                db.perf_record(op, time.perf_counter() - t0)
+            if not keep:
+                break
+    finally:
+        writer.close()
+
+async def roster_sync_loop():
+    """Sync roster dari DB di latar. Handler hanya baca memori, jadi muat semula
+    master penuh (import dari proses lain) tidak blok event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(db.ROSTER_SYNC_INTERVAL)
+        try:
+            await loop.run_in_executor(None, db.roster_sync)
+        except Exception as e:   # cth DB lock sementara - cuba lagi pusingan seterusnya
+            print(f"Sync roster gagal: {type(e).__name__}: {e}", flush=True)
+
+async def serve(host: str, port: int):
+    db.init_db()
+    db.ADMIT_MAX_ACTIVE = API_ADMIT_MAX_ACTIVE
+    db.ROSTER_SYNC_INLINE = False
+    kiosk_sync.start_background()
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(None, db.roster_stats)   # muat index sebelum terima request
+    sync_task = asyncio.create_task(roster_sync_loop())
+    server = await asyncio.start_server(serve_conn, host, port, limit=API_HEADER_LIMIT, backlog=1024)
+    print(f"API check-in di http://{host}:{port} · DB {db.DB_NAME} · "
+          f"{stats['guests']} jemputan, {stats['hadir']} hadir", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sync_task.cancel()
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="API JSON check-in (lookup / confirm / stats)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8502)
+    p.add_argument("--db", help="fail DB (default: MAJLIS_DB atau dinner.db)")
+    args = p.parse_args(argv)
+    if args.db:
+        db.DB_NAME = args.db
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
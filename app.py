@@ -1,317 +1,100 @@
-import streamlit as st
-import pandas as pd
+import os
 import sqlite3
-from datetime import datetime
 import time
-import pytz
-from PIL import Image
-import io
-import re
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+
+import cards
+import kiosk_sync
+
+from majlis_db import (
+    ARRIVAL_DESK_SERVICE_S,
+    ARRIVAL_DESK_UTIL,
+    ARRIVAL_HORIZON_MIN,
+    ARRIVAL_TARGET,
+    ASSET_KINDS,
+    ATTENDANCE_COLS,
+    ATTENDANCE_PAGE_SIZE,
+    Busy,
+    DASH_REFRESH_S,
+    EXPORT_REPORTS,
+    GUEST_PAGE_SIZE,
+    GUEST_SEARCH_COLS,
+    KIOSK_ID,
+    TZ,
+    admission_reset,
+    admission_stats,
+    admit,
+    already_checked_in,
+    arrival_forecast,
+    arrivals_by_table,
+    asset_dir,
+    asset_store_stats,
+    build_layout_highlights,
+    check_counters,
+    checkin_writer_stats,
+    clear_layout_highlights,
+    confirm_checkin,
+    dashboard_snapshot,
+    dashboard_stats,
+    draw_winners,
+    export_report,
+    fetch_attendance_page,
+    forget_ingest,
+    fuzzy_lookup,
+    get_asset_display,
+    get_asset_meta,
+    get_conn,
+    get_guest,
+    get_layout_highlight,
+    import_master_chunks,
+    ingest_once,
+    init_db,
+    iter_upload_chunks,
+    layout_highlight_count,
+    list_mapped_tables,
+    load_winners,
+    now_myt_str,
+    parse_checkin_input,
+    perf_enabled,
+    perf_export,
+    perf_histogram,
+    perf_record,
+    perf_reset,
+    perf_slow_log,
+    perf_snapshot,
+    rate_limit,
+    reset_assets,
+    reset_roster_index,
+    save_asset,
+    search_guests,
+    set_perf_enabled,
+    table_stats,
+    upsert_table_map_chunks,
+)
 
 # =========================
 # CONFIG
 # =========================
 st.set_page_config(page_title="Pendaftaran Majlis Hari Inovasi UiTMCNS 2025", page_icon="📝", layout="centered")
 
-DB_NAME = "dinner.db"
-
 ADMIN_PIN_ENABLED = True
 ADMIN_PIN = "2025"   # tukar PIN di sini
 
-TZ = pytz.timezone("Asia/Kuala_Lumpur")
-
-
-# =========================
-# HELPERS: NORMALIZE
-# =========================
-def norm_meja(v) -> str:
-    """Normalisasi No_Meja supaya match jemputan & koordinat (VIP 1 -> VIP1)."""
-    if v is None:
-        return ""
-    s = str(v).strip().upper()
-    s = re.sub(r"\s+", " ", s)
-    s = s.replace(" ", "")
-    return s
-
-def norm_email(v) -> str:
-    return (str(v).strip().lower()) if v is not None else ""
-
-def now_myt_str():
-    return datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
-
-
-# =========================
-# DB
-# =========================
-def get_conn():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
-
-def init_db():
-    with get_conn() as conn:
-        c = conn.cursor()
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS master (
-            email TEXT PRIMARY KEY,
-            nama TEXT,
-            gelaran TEXT,
-            no_meja TEXT
-        )""")
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            email TEXT PRIMARY KEY,
-            timestamp TEXT,
-            nama TEXT,
-            gelaran TEXT,
-            no_meja TEXT
-        )""")
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS winners (
-            email TEXT PRIMARY KEY,
-            timestamp TEXT,
-            nama TEXT,
-            gelaran TEXT,
-            no_meja TEXT
-        )""")
-
-        # Kekal (walaupun layout tak highlight lagi)
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS table_map (
-            no_meja TEXT PRIMARY KEY,
-            x INTEGER,
-            y INTEGER,
-            r INTEGER
-        )""")
-
-        # minimal table; schema penuh akan dimigrate
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS event_assets (
-            id INTEGER PRIMARY KEY
-        )
-        """)
-
-        conn.commit()
-
-def migrate_event_assets_schema():
-    """Auto-migrate table event_assets supaya DB lama tak crash."""
-    cols = {
-        "poster_filename": "TEXT",
-        "poster_bytes": "BLOB",
-        "layout_filename": "TEXT",
-        "layout_bytes": "BLOB",
-        "aturcara_filename": "TEXT",
-        "aturcara_bytes": "BLOB",
-        "updated_at": "TEXT",
-    }
-
-    with get_conn() as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS event_assets (
-            id INTEGER PRIMARY KEY,
-            poster_filename TEXT,
-            poster_bytes BLOB,
-            layout_filename TEXT,
-            layout_bytes BLOB,
-            aturcara_filename TEXT,
-            aturcara_bytes BLOB,
-            updated_at TEXT
-        )
-        """)
-
-        existing = [r[1] for r in conn.execute("PRAGMA table_info(event_assets)").fetchall()]
-        for col, typ in cols.items():
-            if col not in existing:
-                conn.execute(f"ALTER TABLE event_assets ADD COLUMN {col} {typ}")
-
-        conn.execute("""
-            INSERT OR IGNORE INTO event_assets (id, updated_at)
-            VALUES (1, ?)
-        """, (now_myt_str(),))
-
-        conn.commit()
-
-
-# =========================
-# ASSETS (Poster/Layout/Aturcara) in DB
-# =========================
-def save_asset(kind: str, filename: str, data: bytes):
-    """kind: 'poster' | 'layout' | 'aturcara'"""
-    if kind not in ("poster", "layout", "aturcara"):
-        raise ValueError("Invalid kind for asset.")
-
-    col_fn = f"{kind}_filename"
-    col_by = f"{kind}_bytes"
-
-    with get_conn() as conn:
-        conn.execute(f"""
-            UPDATE event_assets
-            SET {col_fn} = ?,
-                {col_by} = ?,
-                updated_at = ?
-            WHERE id = 1
-        """, (filename, data, now_myt_str()))
-        conn.commit()
-
-def load_assets():
-    with get_conn() as conn:
-        row = conn.execute("""
-            SELECT poster_filename, poster_bytes,
-                   layout_filename, layout_bytes,
-                   aturcara_filename, aturcara_bytes,
-                   updated_at
-            FROM event_assets
-            WHERE id=1
-        """).fetchone()
-    return row
-
-def get_asset_bytes(kind: str):
-    row = load_assets()
-    if not row:
-        return (None, None, None)
-    poster_fn, poster_by, layout_fn, layout_by, atur_fn, atur_by, upd = row
-    if kind == "poster":
-        return (poster_fn, poster_by, upd)
-    if kind == "layout":
-        return (layout_fn, layout_by, upd)
-    if kind == "aturcara":
-        return (atur_fn, atur_by, upd)
-    return (None, None, upd)
-
-
-# =========================
-# MASTER IMPORT
-# =========================
-def normalize_master(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
-
-    required = ["Email", "Nama", "No_Meja"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise ValueError(f"Kolum wajib tiada: {missing}. Perlu: {required}")
-
-    if "Gelaran" not in df.columns:
-        df["Gelaran"] = ""
-
-    df["Email"] = df["Email"].apply(norm_email)
-    df["Nama"] = df["Nama"].astype(str).str.strip()
-    df["Gelaran"] = df["Gelaran"].astype(str).str.strip()
-    df["No_Meja"] = df["No_Meja"].apply(norm_meja)
-
-    df = df[df["Email"].str.len() > 3]
-    df = df.drop_duplicates(subset=["Email"], keep="last")
-    return df[["Email", "Nama", "Gelaran", "No_Meja"]]
-
-def import_master(df: pd.DataFrame):
-    df = normalize_master(df)
-    with get_conn() as conn:
-        for _, r in df.iterrows():
-            conn.execute("""
-            INSERT INTO master(email, nama, gelaran, no_meja)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(email) DO UPDATE SET
-              nama=excluded.nama,
-              gelaran=excluded.gelaran,
-              no_meja=excluded.no_meja
-            """, (r["Email"], r["Nama"], r["Gelaran"], r["No_Meja"]))
-        conn.commit()
-
-def get_guest(email: str):
-    email = norm_email(email)
-    if not email:
-        return None
-    with get_conn() as conn:
-        row = conn.execute("SELECT email, nama, gelaran, no_meja FROM master WHERE email=?", (email,)).fetchone()
-    if not row:
-        return None
-    return (row[0], row[1], row[2], norm_meja(row[3]))
-
-def already_checked_in(email: str) -> bool:
-    with get_conn() as conn:
-        return conn.execute("SELECT 1 FROM attendance WHERE email=? LIMIT 1", (email,)).fetchone() is not None
-
-def confirm_checkin(row):
-    now = now_myt_str()
-    time.sleep(0.10)
-    email, nama, gelaran, no_meja = row
-    no_meja = norm_meja(no_meja)
-    with get_conn() as conn:
-        conn.execute("""
-        INSERT INTO attendance(email, timestamp, nama, gelaran, no_meja)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(email) DO UPDATE SET
-          timestamp=excluded.timestamp,
-          nama=excluded.nama,
-          gelaran=excluded.gelaran,
-          no_meja=excluded.no_meja
-        """, (email, now, nama, gelaran, no_meja))
-        conn.commit()
-
-def count_stats():
-    with get_conn() as conn:
-        total = conn.execute("SELECT COUNT(*) FROM master").fetchone()[0]
-        hadir = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
-    return total, hadir, max(total - hadir, 0)
-
-def load_attendance():
-    with get_conn() as conn:
-        return pd.read_sql(
-            "SELECT email, timestamp, nama, no_meja FROM attendance ORDER BY timestamp DESC",
-            conn
-        )
-
-
-# =========================
-# TABLE MAP (KEKAL)
-# =========================
-def upsert_table_map(df_map: pd.DataFrame):
-    df = df_map.copy()
-    df.columns = [str(c).strip() for c in df.columns]
-
-    required = ["No_Meja", "x", "y"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise ValueError(f"Kolum wajib tiada: {missing}. Perlu: {required}")
-
-    if "r" not in df.columns:
-        df["r"] = 18
-
-    df["No_Meja"] = df["No_Meja"].apply(norm_meja)
-    df["x"] = pd.to_numeric(df["x"], errors="coerce").fillna(0).astype(int)
-    df["y"] = pd.to_numeric(df["y"], errors="coerce").fillna(0).astype(int)
-    df["r"] = pd.to_numeric(df["r"], errors="coerce").fillna(18).astype(int)
-
-    df = df[df["No_Meja"].str.len() > 0]
-
-    with get_conn() as conn:
-        for _, r in df.iterrows():
-            conn.execute("""
-            INSERT INTO table_map(no_meja, x, y, r)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(no_meja) DO UPDATE SET
-              x=excluded.x, y=excluded.y, r=excluded.r
-            """, (r["No_Meja"], int(r["x"]), int(r["y"]), int(r["r"])))
-        conn.commit()
-
-def list_mapped_tables(limit=500):
-    with get_conn() as conn:
-        df = pd.read_sql("SELECT no_meja, x, y, r FROM table_map ORDER BY no_meja ASC", conn)
-    return df.head(limit)
-
 
 # =========================
 # UI (CSS)
 # =========================
 def inject_css():
-    # LOCK ZOOM untuk phone (laptop tetap boleh zoom browser)
-    st.markdown(
-        '<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">',
-        unsafe_allow_html=True
-    )
+    # Streamlit buang elemen yang tak dilukis semula, jadi CSS mesti dihantar
+    # setiap rerun - tapi cukup satu elemen (meta + style sekali).
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
-    st.markdown("""
+# LOCK ZOOM untuk phone (laptop tetap boleh zoom browser)
+APP_CSS = """
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
     <style>
       .block-container { padding-top: 1.1rem; }
       @keyframes popFade {
@@ -388,7 +171,7 @@ def inject_css():
         margin-top: 6px;
       }
     </style>
-    """, unsafe_allow_html=True)
+"""
 
 def vip_card(nama, email, meja, status_text):
     st.markdown(
@@ -414,13 +197,36 @@ def vip_card(nama, email, meja, status_text):
         unsafe_allow_html=True
     )
 
+def busy_notice(e):
+    """Mesej 'sila tunggu' bila rate limit / admission queue tolak permintaan."""
+    wait = int(e.retry_after + 0.999)
+    if e.reason == "rate":
+        st.warning(f"⏳ Terlalu banyak cubaan. Sila tunggu {wait} saat dan cuba lagi.")
+    else:
+        st.warning(f"⏳ Sistem sedang sibuk. Sila tunggu {wait} saat dan cuba lagi.")
+
+def file_download(path):
+    """data untuk st.download_button: fail dibaca hanya bila butang ditekan, bukan setiap rerun."""
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
 
 # =========================
 # APP START
 # =========================
-init_db()
-migrate_event_assets_schema()
+_rerun_t0 = time.perf_counter()
+
+def end_rerun():
+    """Rekod masa rerun ini (dipanggil di hujung skrip & sebelum st.stop())."""
+    if perf_enabled():
+        perf_record("rerun", time.perf_counter() - _rerun_t0)
+
+init_db()   # migration sekali setiap proses; rerun seterusnya no-op
+kiosk_sync.start_background()   # no-op kalau MAJLIS_SYNC_DIR tidak diset / thread sudah jalan
 inject_css()
+client_id = st.session_state.setdefault("client_id", os.urandom(8).hex())   # kunci rate limit sesi ini
 
 # Tajuk premium (center)
 st.markdown("""
@@ -438,10 +244,10 @@ tab1, tab2 = st.tabs(["✅ Pendaftaran", "🛠️ Admin"])
 # =========================================================
 with tab1:
     # Poster (atas sekali)
-    _, poster_bytes, _ = get_asset_bytes("poster")
+    poster_bytes, poster_fmt = get_asset_display("poster")
     if poster_bytes:
         try:
-            st.image(Image.open(io.BytesIO(poster_bytes)), use_container_width=True)
+            st.image(poster_bytes, use_container_width=True, output_format=poster_fmt)
         except Exception:
             st.warning("Poster gagal dibaca. Admin upload semula.")
     else:
@@ -451,16 +257,44 @@ with tab1:
 
     # Check-in
     st.subheader("Semakan Kehadiran")
-    email = st.text_input("Masukkan Email Jemputan", placeholder="contoh: zahari@uitm.edu.my")
-    email = norm_email(email)
+    if "t" in st.query_params:   # QR kad jemputan dibuka terus dari kamera phone
+        st.session_state.setdefault("checkin_email", st.query_params["t"])
+    raw_input = st.text_input("Masukkan Email Jemputan (atau imbas QR kad)", placeholder="contoh: zahari@uitm.edu.my", key="checkin_email")
+    email = parse_checkin_input(raw_input)
+    if raw_input.strip() and not email:
+        st.error("Kod QR tidak sah. Sila taip email jemputan.")
 
     if email:
-        row = get_guest(email)
-        if not row:
-            st.error("Email tidak dijumpai dalam senarai jemputan. Sila hubungi urusetia.")
+        row, cadangan, busy = None, [], None
+        try:
+            if st.session_state.get("lookup_email") != email:   # token dikira bila input baru sahaja
+                rate_limit(client_id, "lookup")
+                st.session_state.lookup_email = email
+            with admit("lookup"):
+                row = get_guest(email)
+                if not row:
+                    cadangan = fuzzy_lookup(email)
+        except Busy as e:
+            busy = e
+
+        if busy:
+            busy_notice(busy)
+            st.button("🔄 Cuba lagi", key="busy_retry")
+        elif not row:
+            if cadangan:
+                st.warning("Email tidak dijumpai. Adakah anda maksudkan:")
+                for e_sug, nama_sug, _ in cadangan:
+                    st.button(
+                        f"{e_sug} ({nama_sug})" if nama_sug else e_sug,
+                        key=f"sug_{e_sug}",
+                        use_container_width=True,
+                        on_click=st.session_state.__setitem__,
+                        args=("checkin_email", e_sug),
+                    )
+            else:
+                st.error("Email tidak dijumpai dalam senarai jemputan. Sila hubungi urusetia.")
         else:
             email_db, nama, gelaran, no_meja = row
-            no_meja = norm_meja(no_meja)
 
             if already_checked_in(email_db):
                 vip_card(nama, email_db, no_meja, "ℹ️ Rekod wujud (sudah daftar)")
@@ -474,18 +308,32 @@ with tab1:
                 refresh = st.button("🔄 Reset", use_container_width=True)
 
             if confirm:
-                confirm_checkin((email_db, nama, gelaran, no_meja))
-                st.success("Pendaftaran berjaya direkod. Terima kasih!")
-                st.toast("✅ Confirmed", icon="🎉")
-
-            # Layout (TANPA koordinat / TANPA highlight)
+                try:
+                    rate_limit(client_id, "confirm")
+                    if already_checked_in(email_db):   # tap berulang: tiada tulisan semula
+                        st.info("Pendaftaran anda sudah direkod. Terima kasih!")
+                    else:
+                        with admit("confirm"):
+                            confirm_checkin((email_db, nama, gelaran, no_meja))
+                        st.success("Pendaftaran berjaya direkod. Terima kasih!")
+                        st.toast("✅ Confirmed", icon="🎉")
+                except Busy as e:
+                    busy_notice(e)
+                except (TimeoutError, sqlite3.Error):   # writer lambat / DB lock - rekod mungkin belum disimpan
+                    st.warning("Pendaftaran belum dapat disahkan (sistem sibuk). Sila tekan Confirm sekali lagi.")
+
+            # Layout: versi pra-render dengan meja tetamu ditanda (kalau ada koordinat),
+            # jika tidak layout biasa
             st.markdown("---")
             st.subheader("🗺️ Layout Dewan")
 
-            _, layout_bytes, _ = get_asset_bytes("layout")
-            if layout_bytes:
+            hl_bytes, hl_fmt = get_layout_highlight(no_meja)
+            layout_bytes, layout_fmt = get_asset_display("layout") if not hl_bytes else (None, None)
+            if hl_bytes:
+                st.image(hl_bytes, use_container_width=True, output_format=hl_fmt, caption=f"📍 Meja {no_meja}")
+            elif layout_bytes:
                 try:
-                    st.image(Image.open(io.BytesIO(layout_bytes)), use_container_width=True)
+                    st.image(layout_bytes, use_container_width=True, output_format=layout_fmt)
                 except Exception:
                     st.warning("Layout gagal dibaca. Admin upload semula.")
             else:
@@ -495,10 +343,10 @@ with tab1:
             st.markdown("---")
             st.subheader("📌 Aturcara")
 
-            _, atur_bytes, _ = get_asset_bytes("aturcara")
+            atur_bytes, atur_fmt = get_asset_display("aturcara")
             if atur_bytes:
                 try:
-                    st.image(Image.open(io.BytesIO(atur_bytes)), use_container_width=True)
+                    st.image(atur_bytes, use_container_width=True, output_format=atur_fmt)
                 except Exception:
                     st.warning("Aturcara gagal dibaca. Admin upload semula.")
             else:
@@ -528,16 +376,37 @@ with tab2:
                     st.rerun()
                 else:
                     st.error("PIN salah.")
+            end_rerun()
             st.stop()
 
     # 1) Master XLSX
     st.markdown("### 1) Upload Master List (Excel)")
     up_master = st.file_uploader("Upload Excel (Master)", type=["xlsx"], key="master_upl")
+    master_replace = st.checkbox("Ganti keseluruhan senarai (buang jemputan yang tiada dalam fail)", key="master_replace")
     if up_master is not None:
         try:
-            df = pd.read_excel(up_master)
-            import_master(df)
-            st.success("Master list berjaya diimport / dikemaskini.")
+            prog = st.empty()
+            rep, info = ingest_once(
+                "master", up_master,
+                lambda: import_master_chunks(
+                    iter_upload_chunks(up_master),
+                    replace=master_replace,
+                    progress=lambda n: prog.caption(f"{n} baris dibaca..."),
+                ),
+                opts=("replace",) if master_replace else (),
+            )
+            prog.empty()
+            st.success(
+                f"Master list berjaya diimport / dikemaskini: {rep['added']} baru, "
+                f"{rep['updated']} dikemaskini, {rep['unchanged']} tiada perubahan, "
+                f"{rep['removed']} dibuang, {rep['rejected']} ditolak."
+            )
+            if rep["duplicates"]:
+                st.warning(f"Email berulang dalam fail (baris terakhir diguna): {', '.join(rep['duplicates'][:20])}"
+                           + (" ..." if len(rep["duplicates"]) > 20 else ""))
+            if rep["tables"]:
+                st.caption(f"Meja terlibat: {', '.join(rep['tables'])}")
+            st.caption(f"Fail ini diimport pada {info['ingested_at']}.")
         except Exception as e:
             st.error(f"Gagal import master: {e}")
 
@@ -548,10 +417,11 @@ with tab2:
     up_poster = st.file_uploader("Upload Poster", type=["png", "jpg", "jpeg"], key="poster_upl")
     if up_poster is not None:
         try:
-            data = up_poster.read()
-            save_asset("poster", up_poster.name, data)
-            st.success("Poster disimpan.")
-            st.image(Image.open(io.BytesIO(data)), use_container_width=True)
+            _, info = ingest_once("poster", up_poster, lambda: save_asset("poster", up_poster.name, up_poster.getvalue()))
+            st.success(f"Poster disimpan ({info['ingested_at']}).")
+            prev, prev_fmt = get_asset_display("poster")
+            if prev:
+                st.image(prev, use_container_width=True, output_format=prev_fmt)
         except Exception as e:
             st.error(f"Gagal simpan poster: {e}")
 
@@ -562,10 +432,11 @@ with tab2:
     up_layout = st.file_uploader("Upload Layout", type=["png", "jpg", "jpeg"], key="layout_upl")
     if up_layout is not None:
         try:
-            data = up_layout.read()
-            save_asset("layout", up_layout.name, data)
-            st.success("Layout disimpan.")
-            st.image(Image.open(io.BytesIO(data)), use_container_width=True)
+            _, info = ingest_once("layout", up_layout, lambda: save_asset("layout", up_layout.name, up_layout.getvalue()))
+            st.success(f"Layout disimpan ({info['ingested_at']}).")
+            prev, prev_fmt = get_asset_display("layout")
+            if prev:
+                st.image(prev, use_container_width=True, output_format=prev_fmt)
         except Exception as e:
             st.error(f"Gagal simpan layout: {e}")
 
@@ -576,25 +447,26 @@ with tab2:
     up_atur = st.file_uploader("Upload Aturcara", type=["png", "jpg", "jpeg"], key="aturcara_upl")
     if up_atur is not None:
         try:
-            data = up_atur.read()
-            save_asset("aturcara", up_atur.name, data)
-            st.success("Aturcara disimpan.")
-            st.image(Image.open(io.BytesIO(data)), use_container_width=True)
+            _, info = ingest_once("aturcara", up_atur, lambda: save_asset("aturcara", up_atur.name, up_atur.getvalue()))
+            st.success(f"Aturcara disimpan ({info['ingested_at']}).")
+            prev, prev_fmt = get_asset_display("aturcara")
+            if prev:
+                st.image(prev, use_container_width=True, output_format=prev_fmt)
         except Exception as e:
             st.error(f"Gagal simpan aturcara: {e}")
 
     # Status ringkas tanpa nama fail
     st.markdown("---")
     st.markdown("### ✅ Status Upload")
-    assets = load_assets()
-    if assets:
-        _, poster_by, _, layout_by, _, atur_by, _ = assets
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Poster", "✅" if poster_by else "—")
-        c2.metric("Layout", "✅" if layout_by else "—")
-        c3.metric("Aturcara", "✅" if atur_by else "—")
+    metas = [get_asset_meta(k) for k in ASSET_KINDS]
+    if any(m[0] for m in metas):
+        for col, label, (_, mime, size, _) in zip(st.columns(3), ["Poster", "Layout", "Aturcara"], metas):
+            col.metric(label, "✅" if size else "—", f"{size / 1024:.0f} KB · {mime.split('/')[-1]}" if size else None,
+                       delta_color="off")
     else:
         st.info("Belum ada assets disimpan.")
+    store = asset_store_stats()   # GC hanya selepas upload / reset, bukan setiap rerun
+    st.caption(f"Asset store: {store['files']} fail · {store['bytes'] / 1e6:.1f} MB · {asset_dir()}")
 
     # Table Map kekal (kalau nak guna kemudian)
     st.markdown("---")
@@ -602,36 +474,301 @@ with tab2:
     map_choice = st.radio("Format mapping", ["CSV", "Excel (XLSX)"], horizontal=True)
     if map_choice == "CSV":
         up_map = st.file_uploader("Upload Mapping CSV", type=["csv"], key="map_csv")
-        if up_map is not None:
-            try:
-                dfm = pd.read_csv(up_map)
-                upsert_table_map(dfm)
-                st.success("Table map berjaya diimport / dikemaskini.")
-            except Exception as e:
-                st.error(f"Gagal import mapping: {e}")
     else:
         up_map = st.file_uploader("Upload Mapping Excel", type=["xlsx"], key="map_xlsx")
-        if up_map is not None:
-            try:
-                dfm = pd.read_excel(up_map)
-                upsert_table_map(dfm)
-                st.success("Table map berjaya diimport / dikemaskini.")
-            except Exception as e:
-                st.error(f"Gagal import mapping: {e}")
+    if up_map is not None:
+        try:
+            prog = st.empty()
+            n_map, info = ingest_once(
+                "table_map", up_map,
+                lambda: upsert_table_map_chunks(
+                    iter_upload_chunks(up_map),
+                    progress=lambda n: prog.caption(f"{n} baris diproses..."),
+                ),
+            )
+            prog.empty()
+            st.success(f"Table map berjaya diimport / dikemaskini ({n_map} meja, {info['ingested_at']}).")
+        except Exception as e:
+            st.error(f"Gagal import mapping: {e}")
 
     df_map_show = list_mapped_tables()
     st.dataframe(df_map_show, use_container_width=True, height=220)
+    st.caption(f"Layout highlight siap: {layout_highlight_count()} meja (dibina semula automatik bila layout / table map berubah)")
+    if st.button("🖼️ Bina semula highlight layout", use_container_width=True):
+        bar = st.progress(0.0)
+        hl = build_layout_highlights(force=True, progress=lambda d, n: bar.progress(d / max(n, 1)))
+        bar.empty()
+        st.success(f"{hl['built']} gambar meja dibina ({hl['seconds']:.1f}s).")
+
+    st.markdown("---")
+    st.markdown("### 🎫 Kad Jemputan QR")
+    st.caption("Satu kad setiap jemputan (nama, gelaran, no. meja + QR bertanda tangan). Imbas QR di kaunter terus buka rekod tetamu.")
+    card_fmt = st.radio("Format", ["PDF (cetak A4, 10 kad/muka)", "ZIP (JPEG setiap tetamu)"], horizontal=True, key="card_fmt")
+    card_fmt = "pdf" if card_fmt.startswith("PDF") else "zip"
+    if st.button("Jana kad", use_container_width=True):
+        bar = st.progress(0.0, text="Menjana kad...")
+        try:
+            res = cards.generate_cards(
+                card_fmt, progress=lambda d, n: bar.progress(d / max(n, 1), text=f"{d}/{n} kad"),
+            )
+            st.session_state.cards_out = {**res, "fmt": card_fmt}
+        except Exception as e:
+            st.error(f"Gagal jana kad: {e}")
+        bar.empty()
+    out = st.session_state.get("cards_out")
+    if out and out["fmt"] == card_fmt and os.path.exists(out["path"]):   # fail lama dibuang bila roster berubah
+        st.caption(f"{out['count']} kad · " + ("dari cache" if out["cached"] else f"{out['seconds']:.1f}s"))
+        st.download_button(
+            f"⬇️ Muat turun kad ({card_fmt.upper()})", file_download(out["path"]),
+            file_name=f"kad_jemputan.{card_fmt}",
+            mime="application/pdf" if card_fmt == "pdf" else "application/zip",
+            use_container_width=True,
+        )
+
+    st.markdown("---")
+    live = st.toggle(
+        "📺 Dashboard langsung", key="dash_live",
+        help=f"Stats & senarai kehadiran refresh sendiri setiap {DASH_REFRESH_S}s tanpa rerun penuh. "
+             "DB hanya di-query bila ada perubahan - selamat untuk banyak skrin serentak.",
+    )
+
+    @st.fragment(run_every=DASH_REFRESH_S if live else None)
+    def live_dashboard():
+        snap = dashboard_snapshot()
+        prev = st.session_state.get("dash_seen")
+        st.session_state.dash_seen = snap["hadir"]
+
+        a, b, c = st.columns(3)
+        a.metric("Total Jemputan", snap["total"])
+        b.metric("Dah Daftar", snap["hadir"],
+                 delta=snap["hadir"] - prev if live and prev is not None and snap["hadir"] != prev else None)
+        c.metric("Belum Hadir", snap["belum"])
+
+        with st.expander("Kehadiran ikut meja", expanded=False):
+            st.dataframe(snap["tables"], use_container_width=True, height=240)
+
+        ws = checkin_writer_stats()
+        st.caption(
+            f"Writer check-in: {ws['committed']} rekod / {ws['batches']} batch "
+            f"(purata {ws['avg_batch']:.1f}) · {ws['rate']:.1f}/s · "
+            f"p50 {ws['p50_ms']:.0f} ms · p99 {ws['p99_ms']:.0f} ms · "
+            f"queue {ws['queue']} · ralat {ws['errors']}"
+        )
+
+        st.write("### 📋 Senarai Kehadiran")
+        pages = max(1, -(-snap["hadir"] // ATTENDANCE_PAGE_SIZE))
+        page = st.number_input("Halaman", min_value=1, max_value=pages, value=1, step=1, key="att_page")
+        if page == 1:
+            att_rows = snap["latest"]
+        else:
+            att_rows = fetch_attendance_page(page)
+        att = pd.DataFrame(att_rows, columns=ATTENDANCE_COLS).drop(columns=["seq"])
+        st.dataframe(att, use_container_width=True, height=280)
+        ds = dashboard_stats()
+        st.caption(f"{snap['hadir']} rekod · halaman {page}/{pages} · {ATTENDANCE_PAGE_SIZE} setiap halaman"
+                   + (f" · dikemas kini {snap['at']} · {ds['polls']} semakan / {ds['rebuilds']} query" if live else ""))
+
+    live_dashboard()
+
+    meja_list = table_stats()["no_meja"].tolist()   # sekali setiap rerun: pilihan meja ketibaan & cabutan
+
+    st.write("### 📈 Kadar Ketibaan")
+    arr_meja = st.selectbox("Meja", ["Semua"] + meja_list, key="arr_meja")
+
+    @st.fragment(run_every=DASH_REFRESH_S if live else None)
+    def arrival_panel():
+        f = arrival_forecast(None if arr_meja == "Semua" else arr_meja)
+        labels = [datetime.fromtimestamp(m * 60, TZ).strftime("%H:%M") for m in f["minutes"] + f["forecast_minutes"]]
+        n_act = len(f["minutes"])
+        chart = pd.DataFrame({
+            "Tiba": f["actual"] + [None] * len(f["forecast"]),
+            # sambung garisan ramalan dari minit semasa
+            "Ramalan": [None] * (n_act - 1) + [f["actual"][-1]] + [round(x, 1) for x in f["forecast"]],
+        }, index=pd.Index(labels, name="masa"))
+        st.line_chart(chart, height=240)
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Kadar semasa", f"{f['rate']:.1f}/min", f"{f['trend']:+.2f}/min²", delta_color="off")
+        m2.metric(f"Ramalan tiba {ARRIVAL_HORIZON_MIN} min", f"{f['expected']:.0f}")
+        m3.metric("Belum hadir (ramalan)", f"{f['belum_forecast'][-1]:.0f}" if f["belum_forecast"] else "—",
+                  f"sekarang {f['belum']}", delta_color="off")
+        eta = f["eta_target_min"]
+        m4.metric(f"{ARRIVAL_TARGET:.0%} hadir", "sudah" if eta == 0 else (f"~{eta} min" if eta else f"> {ARRIVAL_HORIZON_MIN} min"))
+        if arr_meja == "Semua":
+            st.caption(f"Kaunter dicadangkan pada kadar puncak ramalan: {f['desks']} "
+                       f"({ARRIVAL_DESK_SERVICE_S}s setiap tetamu, sasaran {ARRIVAL_DESK_UTIL:.0%} penggunaan) · {f['at']}")
+            with st.expander("Ketibaan ikut meja (15 min terakhir)", expanded=False):
+                st.dataframe(arrivals_by_table(15), use_container_width=True, hide_index=True, height=220)
+
+    arrival_panel()
+
+    st.markdown("---")
+    st.write("### 🔎 Cari Jemputan")
+    s1, s2 = st.columns([3, 2])
+    with s1:
+        g_query = st.text_input("Nama / gelaran / email / no. meja", placeholder="contoh: ahmad, Dr., staff12, meja:5",
+                                key="guest_q")
+    with s2:
+        g_status = st.radio("Status", ["semua", "hadir", "belum"], horizontal=True, key="guest_status")
+    # Keyset: guest_keys = kunci 'after' bagi setiap halaman yang dilalui (atas = semasa)
+    if st.session_state.get("guest_sig") != (g_query, g_status):   # carian baru -> halaman pertama
+        st.session_state.guest_sig = (g_query, g_status)
+        st.session_state.guest_keys = [0]
+    g_keys = st.session_state.guest_keys
+    g_rows, g_total, g_next = search_guests(g_query, g_status, after=g_keys[-1])
+    g_pages = max(1, -(-g_total // GUEST_PAGE_SIZE))
+    st.dataframe(pd.DataFrame(g_rows, columns=GUEST_SEARCH_COLS), use_container_width=True, hide_index=True, height=280)
+    p1, p2, p3 = st.columns([1, 1, 3])
+    p1.button("◀ Sebelum", key="guest_prev", disabled=len(g_keys) == 1, on_click=g_keys.pop,
+              use_container_width=True)
+    p2.button("Seterusnya ▶", key="guest_next", disabled=g_next is None, on_click=g_keys.append, args=(g_next,),
+              use_container_width=True)
+    p3.caption(f"{g_total} padanan · halaman {len(g_keys)}/{g_pages} · {GUEST_PAGE_SIZE} setiap halaman")
+
+    if kiosk_sync.SYNC_DIR or KIOSK_ID:
+        st.markdown("---")
+        st.write("### 🔁 Sync Kiosk" + (f" · kiosk {KIOSK_ID}" if KIOSK_ID else " · pusat"))
+        ss = kiosk_sync.sync_state()
+        if ss["error"]:
+            st.warning(f"Sync gagal ({ss['at']}): {ss['error']} - check-in tempatan tetap direkod, akan dicuba semula.")
+        if KIOSK_ID:
+            ks = kiosk_sync.kiosk_status()
+            k1, k2, k3 = st.columns(3)
+            k1.metric("Belum dihantar", ks["pending"])
+            k2.metric("Dihantar sehingga #", ks["pushed_id"])
+            k3.metric("Replika master", ks["master_sha"] or "—")
+            st.caption(f"Hantar terakhir: {ks['pushed_at'] or '—'} · master diterbitkan: {ks['master_at'] or '—'}"
+                       + (f" · rekod tertua belum dihantar: {ks['oldest_pending']}" if ks["pending"] else ""))
+        elif kiosk_sync.SYNC_DIR:
+            sm = kiosk_sync.sync_metrics()
+            if len(sm):
+                st.dataframe(sm, use_container_width=True, hide_index=True)
+                st.caption("diganti_awal = rekod kiosk lebih awal menggantikan rekod sedia ada · "
+                           "duplikat = sudah check-in lebih awal di tempat lain · lag = masa check-in -> merge pusat")
+            else:
+                st.info("Belum ada kiosk menghantar data.")
+        if kiosk_sync.SYNC_DIR and st.button("🔁 Sync sekarang", use_container_width=True):
+            res = kiosk_sync.sync_once()
+            if res["error"]:
+                st.error(f"Gagal sync: {res['error']}")
+            elif KIOSK_ID:
+                st.success(f"Sync selesai: {res['pushed']} rekod dihantar.")
+            else:
+                m = res["merged"]
+                st.success(f"Sync selesai: {m['segments']} segmen, {m['rows']} rekod ({m['inserted']} baru, "
+                           f"{m['replaced']} diganti, {m['duplicates']} duplikat).")
+
+    st.markdown("---")
+    st.write("### 🎁 Cabutan Bertuah")
+    d1, d2 = st.columns([2, 1])
+    with d1:
+        draw_prize = st.text_input("Hadiah", placeholder="contoh: Hadiah Utama", key="draw_prize")
+    with d2:
+        draw_n = st.number_input("Bil. pemenang", min_value=1, max_value=100, value=1, step=1, key="draw_n")
+    draw_meja = st.multiselect("Hadkan ikut meja (optional)", meja_list, key="draw_meja")
+    draw_gelaran = st.text_input("Hadkan ikut gelaran (optional, pisah dengan koma)", key="draw_gelaran")
+    draw_seed = st.text_input("Seed (kosong = rawak)", key="draw_seed")
+    if st.button("🎲 Cabut", use_container_width=True):
+        res = draw_winners(
+            int(draw_n), prize=draw_prize, no_meja=draw_meja,
+            gelaran=draw_gelaran.split(",") if draw_gelaran else None, seed=draw_seed,
+        )
+        if res["winners"]:
+            for w_email, w_nama, w_gelaran, w_meja in res["winners"]:
+                st.success(f"🎉 {w_gelaran} {w_nama} — Meja {w_meja}".replace("  ", " "))
+        else:
+            st.warning("Tiada peserta layak untuk dicabut.")
+        if len(res["winners"]) < int(draw_n):
+            st.info(f"Hanya {len(res['winners'])} pemenang dicabut (peserta layak tidak mencukupi).")
+        st.caption(f"Cabutan #{res['draw_id']} · seed {res['seed']}")
+
+    st.dataframe(load_winners(), use_container_width=True, height=220)
+
+    st.markdown("---")
+    st.write("### 📤 Export Laporan")
+    st.caption("Dibaca terus dari DB secara berperingkat (snapshot baca) - selamat dijana semasa check-in berjalan.")
+    x1, x2 = st.columns([3, 2])
+    with x1:
+        exp_kinds = st.multiselect(
+            "Laporan", list(EXPORT_REPORTS), default=["hadir"], key="exp_kinds",
+            format_func=lambda k: EXPORT_REPORTS[k][0],
+        )
+    with x2:
+        exp_fmt = st.radio("Format", ["xlsx", "csv"], horizontal=True, key="exp_fmt",
+                           format_func=lambda f: "Excel (XLSX)" if f == "xlsx" else "CSV")
+    if exp_fmt == "csv" and len(exp_kinds) > 1:
+        st.info("CSV hanya satu laporan setiap fail - pilih satu, atau guna XLSX (satu sheet setiap laporan).")
+    elif st.button("Jana export", use_container_width=True, disabled=not exp_kinds):
+        prog = st.empty()
+        try:
+            st.session_state.export_out = export_report(
+                exp_kinds, exp_fmt, progress=lambda n: prog.caption(f"{n} baris ditulis..."),
+            )
+        except Exception as e:
+            st.error(f"Gagal export: {e}")
+        prog.empty()
+    exp_out = st.session_state.get("export_out")
+    if exp_out and os.path.exists(exp_out["path"]):
+        st.caption(" · ".join(f"{EXPORT_REPORTS[k][0]}: {n}" for k, n in exp_out["rows"].items())
+                   + f" · {exp_out['seconds']:.1f}s")
+        st.download_button(
+            f"⬇️ Muat turun {exp_out['filename']}", file_download(exp_out["path"]), file_name=exp_out["filename"],
+            mime="text/csv" if exp_out["filename"].endswith(".csv")
+            else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True,
+        )
 
     st.markdown("---")
-    total, hadir, belum = count_stats()
-    a, b, c = st.columns(3)
-    a.metric("Total Jemputan", total)
-    b.metric("Dah Daftar", hadir)
-    c.metric("Belum Hadir", belum)
+    st.write("### 🚦 Kawalan Beban")
+    st.caption("Rate limit setiap sesi + queue global di depan lookup & confirm. Lebihan terus dapat mesej 'sila tunggu'.")
+    adm = admission_stats()
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Aktif", f"{adm['active']}/{adm['max_active']}")
+    k2.metric("Queue", f"{adm['waiting']}/{adm['queue_max']}", help=f"Puncak: {adm['peak_waiting']}")
+    k3.metric("Tunggu p99", f"{adm['wait_p99_ms']:.0f} ms")
+    k4.metric("Ditolak", sum(r["rate_limit"] + r["queue_penuh"] + r["timeout"] for r in adm["ops"]))
+    st.dataframe(pd.DataFrame(adm["ops"]), use_container_width=True, hide_index=True)
+    st.caption(
+        f"Tunggu p50 {adm['wait_p50_ms']:.0f} ms · maks {adm['wait_max_ms']:.0f} ms · "
+        f"{adm['clients']} client dijejak"
+    )
+    if st.button("Reset kaunter beban", use_container_width=True):
+        admission_reset()
+        st.rerun()
 
-    st.write("### 📋 Senarai Kehadiran")
-    att = load_attendance()
-    st.dataframe(att, use_container_width=True, height=280)
+    st.markdown("---")
+    st.write("### ⏱️ Prestasi")
+    st.toggle(
+        "Instrumentation aktif", value=perf_enabled(), key="perf_on",
+        on_change=lambda: set_perf_enabled(st.session_state.perf_on),
+        help="Rekod masa setiap fungsi data & rerun. Bila off, overhead hampir sifar.",
+    )
+    snap = perf_snapshot()
+    if snap:
+        st.dataframe(pd.DataFrame(snap).round(2), use_container_width=True, hide_index=True, height=280)
+        hist_op = st.selectbox("Histogram (sampel terkini)", [r["op"] for r in snap], key="perf_hist_op")
+        hist = perf_histogram(hist_op)
+        st.bar_chart(pd.DataFrame({"bucket": list(hist), "calls": list(hist.values())}),
+                     x="bucket", y="calls", sort=False, height=200)
+        slow = perf_slow_log()
+        if slow:
+            st.caption("Slow log (terbaru dahulu)")
+            st.dataframe(pd.DataFrame(slow, columns=["masa", "op", "ms", "thread", "ralat"]),
+                         use_container_width=True, hide_index=True, height=200)
+    else:
+        st.info("Belum ada metrik.")
+
+    p1, p2 = st.columns(2)
+    with p1:
+        st.download_button(
+            "⬇️ Export metrik (JSON)", perf_export,   # dijana hanya bila butang ditekan
+            file_name=f"perf_{now_myt_str().replace(' ', '_').replace(':', '')}.json",
+            mime="application/json", use_container_width=True,
+        )
+    with p2:
+        if st.button("Reset metrik", use_container_width=True):
+            perf_reset()
+            st.rerun()
 
 
 # =========================================================
@@ -645,6 +782,8 @@ with st.expander("⚠️ Maintenance", expanded=False):
             with get_conn() as conn:
                 conn.execute("DELETE FROM master")
                 conn.commit()
+            reset_roster_index(master=True)
+            forget_ingest("master")
             st.success("MASTER dikosongkan.")
             st.rerun()
 
@@ -653,6 +792,7 @@ with st.expander("⚠️ Maintenance", expanded=False):
             with get_conn() as conn:
                 conn.execute("DELETE FROM attendance")
                 conn.commit()
+            reset_roster_index(attendance=True)
             st.success("Attendance dikosongkan.")
             st.rerun()
 
@@ -669,40 +809,38 @@ with st.expander("⚠️ Maintenance", expanded=False):
             with get_conn() as conn:
                 conn.execute("DELETE FROM table_map")
                 conn.commit()
+            clear_layout_highlights()
+            forget_ingest("table_map")
             st.success("Table map dikosongkan.")
             st.rerun()
 
     with col5:
         if st.button("Reset Assets", use_container_width=True):
-            with get_conn() as conn:
-                conn.execute("""
-                    UPDATE event_assets
-                    SET poster_filename=NULL, poster_bytes=NULL,
-                        layout_filename=NULL, layout_bytes=NULL,
-                        aturcara_filename=NULL, aturcara_bytes=NULL,
-                        updated_at=?
-                    WHERE id=1
-                """, (now_myt_str(),))
-                conn.commit()
+            reset_assets()
+            forget_ingest(*ASSET_KINDS)
             st.success("Assets dikosongkan.")
             st.rerun()
 
     st.markdown("---")
 
+    if st.button("🧮 Semak / Bina Semula Counter", use_container_width=True):
+        drift = check_counters(rebuild=True)
+        if drift:
+            st.warning(f"Counter tidak sepadan, sudah dibina semula: {drift}")
+        else:
+            st.success("Counter konsisten.")
+
     if st.button("🔥 Reset SEMUA", use_container_width=True):
         with get_conn() as conn:
             conn.execute("DELETE FROM master")
             conn.execute("DELETE FROM attendance")
             conn.execute("DELETE FROM winners")
             conn.execute("DELETE FROM table_map")
-            conn.execute("""
-                UPDATE event_assets
-                SET poster_filename=NULL, poster_bytes=NULL,
-                    layout_filename=NULL, layout_bytes=NULL,
-                    aturcara_filename=NULL, aturcara_bytes=NULL,
-                    updated_at=?
-                WHERE id=1
-            """, (now_myt_str(),))
             conn.commit()
+        reset_assets()
+        reset_roster_index(master=True, attendance=True)
+        forget_ingest("master", "table_map", *ASSET_KINDS)
         st.success("SEMUA data dikosongkan. Upload semula master + 3 gambar + mapping (optional).")
         st.rerun()
+
+end_rerun()
@@ -0,0 +1,241 @@
+"""Benchmark laluan check-in tanpa browser / server Streamlit.
+
+Jana senarai jemputan sintetik, kemudian simulasi N sesi serentak (thread,
+sama seperti Streamlit) yang buat lookup -> semak -> gambar -> confirm, dan
+beberapa sesi dashboard. Lapor throughput, p50/p95/p99 & ralat lock, dan
+tulis hasil JSON untuk dibanding antara versi.
+
+Contoh:
+    python benchmark.py --guests 5000 --sessions 64 --duration 15 --json bench.json
+    python benchmark.py --sessions 200 --max-p99-ms 250 --max-errors 0   # gagal (exit 1) kalau melepasi had
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import majlis_db as db
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * p))]
+
+def synthetic_master(n: int, tables: int = 300) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Email": [f"tetamu{i}@uitm.edu.my" for i in range(n)],
+        "Nama": [f"Tetamu Jemputan {i}" for i in range(n)],
+        "Gelaran": ["Prof." if i % 40 == 0 else "" for i in range(n)],
+        "No_Meja": [f"T{i % tables}" for i in range(n)],
+    })
+
+def synthetic_image(w: int = 2400, h: int = 1700) -> bytes:
+    from PIL import Image
+
+    img = Image.effect_noise((w, h), 60).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def setup_db(args):
+    db.init_db()
+    t0 = time.perf_counter()
+    db.import_master(synthetic_master(args.guests))
+    t_import = time.perf_counter() - t0
+
+    t_assets = 0.0
+    if not args.no_assets:
+        data = synthetic_image()
+        t0 = time.perf_counter()
+        for kind in db.ASSET_KINDS:
+            db.save_asset(kind, f"{kind}.png", data)
+        t_assets = time.perf_counter() - t0
+    return {"import_master_s": t_import, "save_assets_s": t_assets}
+
+
+class Recorder:
+    """Latency & ralat setiap thread (tiada lock semasa rekod)."""
+
+    def __init__(self):
+        self.lat = {}
+        self.errors = {"lock": 0, "timeout": 0, "other": 0}
+
+    def timed(self, op, fn, *a):
+        t0 = time.perf_counter()
+        try:
+            return fn(*a)
+        except sqlite3.OperationalError as e:
+            self.errors["lock" if "locked" in str(e) or "busy" in str(e) else "other"] += 1
+        except TimeoutError:
+            self.errors["timeout"] += 1
+        except Exception:
+            self.errors["other"] += 1
+        finally:
+            self.lat.setdefault(op, []).append(time.perf_counter() - t0)
+
+
+def guest_session(rec, args, deadline, seed):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        if rng.random() < args.miss_ratio:
+            email = f"tetamu{rng.randrange(args.guests)}@uitm.edu.mx"   # salah taip
+        else:
+            email = f"tetamu{rng.randrange(args.guests)}@uitm.edu.my"
+        email = db.norm_email(email)
+
+        row = rec.timed("lookup", db.get_guest, email)
+        if row is None:
+            rec.timed("fuzzy_lookup", db.fuzzy_lookup, email)
+        else:
+            rec.timed("already_checked_in", db.already_checked_in, row[0])
+            for kind in db.ASSET_KINDS:
+                rec.timed("asset", db.get_asset_display, kind)
+            if rng.random() < args.confirm_ratio:
+                rec.timed("confirm", db.confirm_checkin, row)
+        rec.lat.setdefault("session_step", []).append(time.perf_counter() - t0)
+
+        if args.think_ms:
+            time.sleep(rng.expovariate(1000.0 / args.think_ms))
+
+def dashboard_session(rec, args, deadline):
+    feed = {}
+    while time.perf_counter() < deadline:
+        rec.timed("count_stats", db.count_stats)
+        rec.timed("attendance_feed", db.attendance_feed, feed)
+        rec.timed("table_stats", db.table_stats)
+        time.sleep(args.dashboard_interval)
+
+def run(args) -> dict:
+    info = setup_db(args)
+    recs = []
+    threads = []
+    deadline = time.perf_counter() + args.warmup + args.duration
+
+    for i in range(args.sessions):
+        rec = Recorder()
+        recs.append(rec)
+        threads.append(threading.Thread(target=guest_session, args=(rec, args, deadline, args.seed + i), daemon=True))
+    for _ in range(args.dashboards):
+        rec = Recorder()
+        recs.append(rec)
+        threads.append(threading.Thread(target=dashboard_session, args=(rec, args, deadline), daemon=True))
+
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    if args.warmup:
+        # buang sampel warmup: kosongkan rekod selepas tempoh warmup
+        time.sleep(args.warmup)
+        for rec in recs:
+            rec.lat = {}
+            rec.errors = dict.fromkeys(rec.errors, 0)
+        t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    ops = {}
+    for rec in recs:
+        for op, vals in list(rec.lat.items()):
+            ops.setdefault(op, []).extend(vals)
+    errors = {k: sum(r.errors[k] for r in recs) for k in ("lock", "timeout", "other")}
+
+    report = {}
+    for op, vals in sorted(ops.items()):
+        vals.sort()
+        report[op] = {
+            "count": len(vals),
+            "per_s": len(vals) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(vals, 0.50) * 1000,
+            "p95_ms": percentile(vals, 0.95) * 1000,
+            "p99_ms": percentile(vals, 0.99) * 1000,
+            "max_ms": vals[-1] * 1000 if vals else 0.0,
+        }
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "env": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "setup": info,
+        "elapsed_s": elapsed,
+        "checkins_per_s": report.get("confirm", {}).get("per_s", 0.0),
+        "errors": errors,
+        "writer": db.checkin_writer_stats(),
+        "perf": db.perf_snapshot(),
+        "ops": report,
+    }
+
+def print_report(res):
+    print(f"SQLite {res['env']['sqlite']} · {res['config']['guests']} jemputan · "
+          f"{res['config']['sessions']} sesi · {res['elapsed_s']:.1f}s")
+    print(f"setup: import {res['setup']['import_master_s']:.2f}s, assets {res['setup']['save_assets_s']:.2f}s")
+    print(f"{'op':<20}{'count':>9}{'/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for op, r in res["ops"].items():
+        print(f"{op:<20}{r['count']:>9}{r['per_s']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}")
+    print(f"check-in/s: {res['checkins_per_s']:.1f} · ralat: {res['errors']}")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--guests", type=int, default=5000, help="saiz senarai jemputan sintetik")
+    p.add_argument("--sessions", type=int, default=32, help="sesi tetamu serentak")
+    p.add_argument("--dashboards", type=int, default=2, help="sesi dashboard serentak")
+    p.add_argument("--dashboard-interval", type=float, default=0.5, help="saat antara refresh dashboard")
+    p.add_argument("--duration", type=float, default=10.0, help="saat diukur")
+    p.add_argument("--warmup", type=float, default=1.0, help="saat warmup (tidak diukur)")
+    p.add_argument("--confirm-ratio", type=float, default=0.5, help="peratus lookup yang diikuti confirm")
+    p.add_argument("--miss-ratio", type=float, default=0.02, help="peratus email salah taip")
+    p.add_argument("--think-ms", type=float, default=0.0, help="purata masa fikir antara langkah (0 = tepu)")
+    p.add_argument("--no-assets", action="store_true", help="jangan simpan poster/layout/aturcara sintetik")
+    p.add_argument("--no-perf", action="store_true", help="matikan instrumentation majlis_db (ukur overhead)")
+    p.add_argument("--seed", type=int, default=2025)
+    p.add_argument("--db", help="fail DB baru (mesti belum wujud; default: fail sementara baru)")
+    p.add_argument("--json", help="tulis hasil JSON ke fail ini ('-' = stdout)")
+    p.add_argument("--max-p99-ms", type=float, help="exit 1 kalau p99 confirm melebihi had ini")
+    p.add_argument("--max-errors", type=int, help="exit 1 kalau jumlah ralat melebihi had ini")
+    args = p.parse_args(argv)
+
+    # benchmark import jemputan sintetik, check-in & tulis ganti asset - jangan sentuh DB sebenar
+    if args.db and (os.path.exists(args.db) or os.path.exists(os.path.splitext(args.db)[0] + "_assets")):
+        p.error(f"{args.db} sudah wujud. Benchmark akan menulis data sintetik - guna laluan baru.")
+    os.environ.pop("MAJLIS_ASSET_DIR", None)   # asset di sebelah DB benchmark, bukan direktori sebenar
+    db.DB_NAME = args.db or os.path.join(tempfile.mkdtemp(prefix="majlis-bench-"), "bench.db")
+    db.set_perf_enabled(not args.no_perf)
+    res = run(args)
+
+    if args.json == "-":
+        json.dump(res, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(res)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(res, f, indent=2)
+
+    failed = False
+    if args.max_p99_ms is not None and res["ops"].get("confirm", {}).get("p99_ms", 0.0) > args.max_p99_ms:
+        print(f"GAGAL: p99 confirm > {args.max_p99_ms} ms", file=sys.stderr)
+        failed = True
+    if args.max_errors is not None and sum(res["errors"].values()) > args.max_errors:
+        print(f"GAGAL: ralat > {args.max_errors}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""Kad jemputan QR (satu setiap baris master) - render pukal guna process pool.
+
+Reka bentuk kad ikut vip_card (ungu + emas): nama & gelaran, no. meja, dan QR
+bertanda tangan (majlis_db.qr_payload) yang terus dipetakan ke tetamu bila
+diimbas di kaunter / kiosk.
+
+Output:
+    zip - satu JPEG setiap tetamu (Meja_<no>_<email>.jpg)
+    pdf - A4, 10 kad setiap muka (2 x 5, saiz kad 3.5 x 2 inci) untuk dicetak
+
+    python cards.py --fmt pdf --out kad.pdf
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+import majlis_db as db
+
+CARD_SIZE = (1050, 600)      # px, 3.5 x 2 inci @ 300 dpi
+CARD_JPEG_QUALITY = 80       # ~80 KB setiap kad; QR masih tajam (4:2:0)
+CARD_CHUNK = 100             # kad setiap tugasan worker
+CARD_INLINE_MAX = 200        # <= ini render terus (tak berbaloi spawn pool)
+CARD_DIR = os.path.join(tempfile.gettempdir(), "majlis_cards")
+CARD_PART_KEEP_S = 3600      # .part (jana terhenti) lebih lama dari ini dibuang
+
+PURPLE_DARK = (75, 31, 120)      # #4B1F78
+PURPLE = (106, 47, 163)          # #6A2FA3
+GOLD = (201, 162, 39)            # #C9A227
+CREAM = (255, 247, 230)          # #FFF7E6
+GOLD_TEXT = (106, 75, 0)         # #6A4B00
+
+FONT_BOLD = ("DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf")
+FONT_REGULAR = ("DejaVuSans.ttf", "Arial.ttf", "arial.ttf")
+
+# A4 dalam point (1/72 inci); kad 3.5 x 2 inci
+PDF_PAGE = (595.28, 841.89)
+PDF_CARD = (252.0, 144.0)
+PDF_COLS, PDF_ROWS, PDF_GAP = 2, 5, 10.0
+
+
+# =========================
+# RENDER (jalan dalam worker)
+# =========================
+_fonts = {}
+_template = []
+
+def _font(size: int, bold: bool = True):
+    from PIL import ImageFont
+
+    key = (size, bold)
+    if key not in _fonts:
+        for name in (FONT_BOLD if bold else FONT_REGULAR):
+            try:
+                _fonts[key] = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            _fonts[key] = ImageFont.load_default(size)
+    return _fonts[key]
+
+def _card_template():
+    """Latar kad (gradient, bingkai emas, tajuk) - sama untuk semua, dibina sekali setiap proses."""
+    if _template:
+        return _template[0]
+    from PIL import Image, ImageDraw
+
+    w, h = CARD_SIZE
+    # gradient pepenjuru ungu gelap -> ungu (putar segi empat besar, ambil bahagian tengah)
+    side = int((w * w + h * h) ** 0.5) + 2
+    mask = Image.linear_gradient("L").resize((side, side)).rotate(45)
+    mask = mask.crop(((side - w) // 2, (side - h) // 2, (side - w) // 2 + w, (side - h) // 2 + h))
+    img = Image.composite(Image.new("RGB", (w, h), PURPLE), Image.new("RGB", (w, h), PURPLE_DARK), mask)
+
+    d = ImageDraw.Draw(img)
+    d.ellipse((w - 260, -240, w + 200, 200), fill=(140, 90, 120))   # cahaya emas (vip-card::before)
+    d.rounded_rectangle((18, 18, w - 18, h - 18), radius=30, outline=GOLD, width=4)
+
+    d.text((340, 62), "KAD JEMPUTAN", font=_font(40), fill="white", anchor="mm")
+    d.text((340, 108), "Majlis Hari Inovasi UiTMCNS 2025", font=_font(24, bold=False), fill=(235, 225, 245), anchor="mm")
+
+    # kotak QR putih
+    d.rounded_rectangle((680, 90, 1010, 420), radius=22, fill="white")
+    d.text((845, 452), "Imbas untuk daftar", font=_font(22, bold=False), fill="white", anchor="mm")
+    _template.append(img)
+    return img
+
+def _fit(draw, text: str, max_w: int, size: int, min_size: int, bold: bool = True):
+    while size > min_size and draw.textlength(text, font=_font(size, bold)) > max_w:
+        size -= 2
+    return _font(size, bold)
+
+def _qr_image(payload: str, size: int):
+    import qrcode
+    from PIL import Image
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=1, border=2)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    n = len(matrix)
+    img = Image.new("L", (n, n))
+    img.putdata([0 if v else 255 for row in matrix for v in row])
+    k = max(1, size // n)
+    return img.resize((n * k, n * k), Image.NEAREST)
+
+def _draw_name(d, name: str, cx: int, cy: int, max_w: int):
+    """Nama satu baris (40 -> 30 px); kalau masih panjang, pecah dua baris."""
+    font = _fit(d, name, max_w, 40, 30)
+    if d.textlength(name, font=font) <= max_w:
+        d.text((cx, cy), name, font=font, fill="white", anchor="mm")
+        return
+    words = name.split()
+    best = min(range(1, len(words)), key=lambda i: abs(len(" ".join(words[:i])) - len(" ".join(words[i:]))),
+               default=1)
+    lines = [" ".join(words[:best]), " ".join(words[best:])] if len(words) > 1 else [name, ""]
+    size = 34
+    while size > 18 and max(d.textlength(ln, font=_font(size)) for ln in lines) > max_w:
+        size -= 2
+    for i, ln in enumerate(lines):
+        d.text((cx, cy + (i - 0.5) * (size + 6)), ln, font=_font(size), fill="white", anchor="mm")
+
+def render_card(nama: str, gelaran: str, no_meja: str, email: str, payload: str):
+    """Satu kad (PIL Image RGB, CARD_SIZE)."""
+    from PIL import ImageDraw
+
+    img = _card_template().copy()
+    d = ImageDraw.Draw(img)
+
+    name = f"{gelaran or ''} {nama or ''}".strip() or email
+    _draw_name(d, name, 340, 185, 600)
+
+    # kotak no. meja (vip-meja-box)
+    d.rounded_rectangle((90, 250, 590, 470), radius=24, fill=CREAM, outline=GOLD, width=4)
+    d.text((340, 292), "NO. MEJA", font=_font(24), fill=GOLD_TEXT, anchor="mm")
+    meja = no_meja or "-"
+    d.text((340, 385), meja, font=_fit(d, meja, 460, 110, 40), fill=PURPLE_DARK, anchor="mm")
+
+    d.text((340, 520), email, font=_fit(d, email, 600, 22, 14, bold=False), fill=(230, 220, 240), anchor="mm")
+
+    qr = _qr_image(payload, 310)
+    img.paste(qr.convert("RGB"), (845 - qr.width // 2, 255 - qr.height // 2))
+    return img
+
+def card_jpeg(row) -> bytes:
+    email, nama, gelaran, no_meja, payload = row
+    buf = io.BytesIO()
+    render_card(nama, gelaran, no_meja, email, payload).save(
+        buf, "JPEG", quality=CARD_JPEG_QUALITY, dpi=(300, 300)
+    )
+    return buf.getvalue()
+
+def _render_chunk(rows):
+    """Tugasan worker: [(email, nama, gelaran, no_meja, payload)] -> [(email, no_meja, jpeg)]."""
+    return [(r[0], r[3], card_jpeg(r)) for r in rows]
+
+
+# =========================
+# BULK (proses utama)
+# =========================
+def card_rows():
+    """Baris master + payload QR, disusun ikut no_meja & nama (susunan cetakan)."""
+    with db.get_conn() as conn:
+        rows = conn.execute("""
+            SELECT email, nama, gelaran, no_meja FROM master
+            ORDER BY no_meja, nama, email
+        """).fetchall()
+    return [(e, n or "", g or "", db.norm_meja(m), db.qr_payload(e)) for e, n, g, m in rows]
+
+def _chunks(rows, size):
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+def iter_rendered(rows, workers: int = None):
+    """Yield (chunk_index, [(email, no_meja, jpeg)]) - ikut susunan siap, bukan susunan asal."""
+    chunks = _chunks(rows, CARD_CHUNK)
+    workers = workers or os.cpu_count() or 1
+    if len(rows) <= CARD_INLINE_MAX or workers == 1:
+        for i, ch in enumerate(chunks):
+            yield i, _render_chunk(ch)
+        return
+
+    # spawn: jangan fork proses Streamlit yang ada thread (writer, server)
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futs = {pool.submit(_render_chunk, ch): i for i, ch in enumerate(chunks)}
+        for fut in concurrent.futures.as_completed(futs):
+            yield futs[fut], fut.result()
+
+def _safe(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9@._-]+", "_", s or "-")
+
+def write_zip(rows, out_path: str, workers: int = None, progress=None):
+    done = 0
+    with zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_STORED) as zf:   # JPEG dah mampat
+        for _, cards in iter_rendered(rows, workers):
+            for email, no_meja, jpg in cards:
+                zf.writestr(f"Meja_{_safe(no_meja)}_{_safe(email)}.jpg", jpg)
+            done += len(cards)
+            if progress:
+                progress(done, len(rows))
+
+def write_pdf(rows, out_path: str, workers: int = None, progress=None):
+    """PDF ditulis secara streaming: setiap kad = satu XObject JPEG (DCTDecode), tiada decode semula."""
+    per_page = PDF_COLS * PDF_ROWS
+    pending = {}
+    next_chunk = 0
+    done = 0
+    offsets = {}
+    kids = []
+    w_px, h_px = CARD_SIZE
+    cw, ch = PDF_CARD
+    x0 = (PDF_PAGE[0] - (PDF_COLS * cw + (PDF_COLS - 1) * PDF_GAP)) / 2
+    y_top = PDF_PAGE[1] - (PDF_PAGE[1] - (PDF_ROWS * ch + (PDF_ROWS - 1) * PDF_GAP)) / 2
+
+    with open(out_path, "wb") as f:
+        obj_no = [2]   # 1 = Catalog, 2 = Pages (ditulis di hujung)
+
+        def new_obj():
+            obj_no[0] += 1
+            return obj_no[0]
+
+        def write_obj(n, head: bytes, stream: bytes = None):
+            offsets[n] = f.tell()
+            f.write(f"{n} 0 obj\n".encode() + head)
+            if stream is not None:
+                f.write(b"\nstream\n" + stream + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        def write_page(cards):
+            refs, ops = [], []
+            for i, jpg in enumerate(cards):
+                n = new_obj()
+                write_obj(n, (f"<< /Type /XObject /Subtype /Image /Width {w_px} /Height {h_px} "
+                              f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode "
+                              f"/Length {len(jpg)} >>").encode(), jpg)
+                refs.append(f"/C{i} {n} 0 R")
+                col, row = i % PDF_COLS, i // PDF_COLS
+                x = x0 + col * (cw + PDF_GAP)
+                y = y_top - (row + 1) * ch - row * PDF_GAP
+                ops.append(f"q {cw:.2f} 0 0 {ch:.2f} {x:.2f} {y:.2f} cm /C{i} Do Q")
+            content = "\n".join(ops).encode()
+            c = new_obj()
+            write_obj(c, f"<< /Length {len(content)} >>".encode(), content)
+            p = new_obj()
+            write_obj(p, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PDF_PAGE[0]} {PDF_PAGE[1]}] "
+                          f"/Resources << /XObject << {' '.join(refs)} >> >> /Contents {c} 0 R >>").encode())
+            kids.append(p)
+
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        page_buf = []
+        for idx, cards in iter_rendered(rows, workers):
+            pending[idx] = cards
+            # tulis ikut susunan asal (no_meja) walaupun chunk siap tak tersusun
+            while next_chunk in pending:
+                for _, _, jpg in pending.pop(next_chunk):
+                    page_buf.append(jpg)
+                    if len(page_buf) == per_page:
+                        write_page(page_buf)
+                        page_buf = []
+                next_chunk += 1
+            done += len(cards)
+            if progress:
+                progress(done, len(rows))
+        if page_buf:
+            write_page(page_buf)
+
+        write_obj(2, f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode())
+        write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = f.tell()
+        f.write(f"xref\n0 {obj_no[0] + 1}\n0000000000 65535 f \n".encode())
+        for n in range(1, obj_no[0] + 1):
+            f.write(f"{offsets[n]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {obj_no[0] + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+def prune_cards(keep_tag: str):
+    """Buang fail kad dalam CARD_DIR selain tag semasa (roster / URL / rahsia lama).
+
+    .part dibiarkan kecuali sudah lama - mungkin sesi lain sedang menjana.
+    """
+    for old in os.scandir(CARD_DIR):
+        try:
+            if not old.is_file() or old.name.startswith(f"kad_jemputan_{keep_tag}."):
+                continue
+            if old.name.endswith(".part") and time.time() - old.stat().st_mtime <= CARD_PART_KEEP_S:
+                continue
+            os.remove(old.path)
+        except OSError:
+            pass
+
+def generate_cards(fmt: str = "pdf", out_path: str = None, workers: int = None, progress=None) -> dict:
+    """Jana kad untuk semua master. Fail sama (ikut master_gen) diguna semula kalau dah wujud."""
+    if fmt not in ("pdf", "zip"):
+        raise ValueError("Format kad mesti 'pdf' atau 'zip'.")
+
+    if out_path is None:
+        with db.get_conn() as conn:
+            gen = conn.execute("SELECT value FROM counters WHERE name = 'master_gen'").fetchone()
+        tag = hashlib.sha256(
+            f"{os.path.abspath(db.DB_NAME)}|{gen[0] if gen else 0}|{db.QR_BASE_URL}|{db.qr_token('x')}".encode()
+        ).hexdigest()[:16]
+        os.makedirs(CARD_DIR, exist_ok=True)
+        prune_cards(tag)
+        out_path = os.path.join(CARD_DIR, f"kad_jemputan_{tag}.{fmt}")
+        if os.path.exists(out_path):
+            return {"path": out_path, "count": db.count_stats()[0], "seconds": 0.0, "cached": True}
+
+    t0 = time.perf_counter()
+    rows = card_rows()
+    tmp = out_path + ".part"
+    (write_pdf if fmt == "pdf" else write_zip)(rows, tmp, workers, progress)
+    os.replace(tmp, out_path)
+    secs = time.perf_counter() - t0
+    if db.perf_enabled():
+        db.perf_record(f"generate_cards_{fmt}", secs)
+    return {"path": out_path, "count": len(rows), "seconds": secs, "cached": False}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Jana kad jemputan QR (PDF / ZIP)")
+    p.add_argument("--fmt", choices=("pdf", "zip"), default="pdf")
+    p.add_argument("--out", help="fail output (default: cache dalam direktori temp)")
+    p.add_argument("--workers", type=int, help="bil. proses (default: semua CPU)")
+    p.add_argument("--db", help="fail DB (default: MAJLIS_DB atau dinner.db)")
+    args = p.parse_args(argv)
+    if args.db:
+        db.DB_NAME = args.db
+    db.init_db()
+    res = generate_cards(args.fmt, args.out, args.workers,
+                         progress=lambda d, n: print(f"\r{d}/{n}", end="", flush=True))
+    print(f"\n{res['path']} · {res['count']} kad · {res['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""Mod multi-kiosk offline: replika master tempatan + changelog check-in, merge ke DB pusat.
+
+Setiap kiosk jalan app.py (atau api.py) atas DB sendiri:
+
+    MAJLIS_KIOSK_ID=pintu1 MAJLIS_DB=kiosk_pintu1.db MAJLIS_SYNC_DIR=/mnt/majlis streamlit run app.py
+
+dan mesin pusat atas dinner.db:
+
+    MAJLIS_SYNC_DIR=/mnt/majlis streamlit run app.py     (atau: python kiosk_sync.py central)
+
+Pengangkutan = direktori dikongsi (share rangkaian / USB). Setiap fail ditulis
+atomik (tmp + rename), jadi pembaca tak pernah nampak fail separuh siap:
+
+    <dir>/master/master.csv + manifest.json     pusat -> kiosk (replika master)
+    <dir>/inbox/<kiosk>/<first>-<last>.jsonl     kiosk -> pusat (segmen changelog, tak diubah)
+    <dir>/status/<kiosk>.json                    heartbeat kiosk (pending, ralat)
+
+Rangkaian putus: kiosk terus check-in ke DB sendiri; changelog dihantar bila
+direktori boleh dicapai semula. Merge idempotent (segmen sama dihantar dua kali
+tak ubah apa-apa); check-in berulang dari kiosk lain / pusat diselesaikan ikut
+timestamp paling awal.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import majlis_db as db
+
+SYNC_DIR = os.environ.get("MAJLIS_SYNC_DIR", "")
+SYNC_INTERVAL = 2.0          # saat antara pusingan sync (thread latar)
+SYNC_SEGMENT_ROWS = 500      # rekod changelog setiap fail segmen (= satu batch merge)
+SYNC_STALE_S = 30            # heartbeat lebih lama dari ini -> kiosk dianggap offline
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+SYNC_MARKER = ".majlis-sync"   # dicipta pusat; tiada = share belum di-mount / rangkaian putus
+
+# Rekod lebih awal menang; rekod sama / lebih lewat diabaikan (dikira duplikat)
+SQL_MERGE_ATTENDANCE = """
+    INSERT INTO attendance(email, timestamp, nama, gelaran, no_meja, ts_epoch, seq)
+    VALUES (?, ?, ?, ?, ?, ?, (SELECT value + 1 FROM counters WHERE name = 'attendance_seq'))
+    ON CONFLICT(email) DO UPDATE SET
+      timestamp=excluded.timestamp,
+      nama=excluded.nama,
+      gelaran=excluded.gelaran,
+      no_meja=excluded.no_meja,
+      ts_epoch=excluded.ts_epoch,
+      seq=excluded.seq
+    WHERE excluded.timestamp < attendance.timestamp
+"""
+
+
+# =========================
+# HELPERS
+# =========================
+def check_kiosk_id(kiosk: str) -> str:
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,32}", kiosk or ""):
+        raise ValueError("ID kiosk tidak sah (huruf, nombor, '-' atau '_' sahaja, maks 32).")
+    return kiosk
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def require_share(sync_dir: str):
+    """Kiosk hanya tulis ke share yang disediakan pusat - elak tulis ke mount point kosong (disk tempatan)."""
+    if not os.path.exists(os.path.join(sync_dir, SYNC_MARKER)):
+        raise FileNotFoundError(f"Direktori sync tidak boleh dicapai: {sync_dir}")
+
+def _get_setting(conn, key: str, default=None):
+    row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+def _set_setting(conn, key: str, value):
+    conn.execute("""
+        INSERT INTO settings(key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value
+    """, (key, str(value)))
+
+def _lag_s(ts: str, now: datetime) -> float:
+    try:
+        return max(0.0, (now - datetime.strptime(ts, TS_FMT)).total_seconds())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# =========================
+# PUSAT: terbit master, merge changelog
+# =========================
+def publish_master(sync_dir: str, force: bool = False) -> bool:
+    """Tulis master.csv + manifest.json bila master_gen berubah. Pulang True kalau diterbitkan."""
+    manifest_path = os.path.join(sync_dir, "master", "manifest.json")
+    marker = os.path.join(sync_dir, SYNC_MARKER)
+    if not os.path.exists(marker):
+        _atomic_write(marker, db.DB_NAME.encode())
+    with db.get_conn() as conn:
+        gen = conn.execute("SELECT value FROM counters WHERE name = 'master_gen'").fetchone()
+        gen = str(gen[0] if gen else 0)
+        if not force and gen == _get_setting(conn, "sync_master_gen") and os.path.exists(manifest_path):
+            return False
+        rows = conn.execute("SELECT email, nama, gelaran, no_meja FROM master ORDER BY email").fetchall()
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["Email", "Nama", "Gelaran", "No_Meja"])
+    w.writerows(rows)
+    data = buf.getvalue().encode("utf-8")
+    sha = hashlib.sha256(data).hexdigest()
+
+    # csv dulu, manifest kemudian; kiosk semak sha supaya tak muat csv dari terbitan lain
+    _atomic_write(os.path.join(sync_dir, "master", "master.csv"), data)
+    _atomic_write(manifest_path, json.dumps({
+        "sha256": sha, "rows": len(rows), "master_gen": gen, "published_at": db.now_myt_str(),
+    }).encode())
+    with db.get_conn() as conn:
+        _set_setting(conn, "sync_master_gen", gen)
+        conn.commit()
+    return True
+
+def pending_segments(sync_dir: str) -> list:
+    """Segmen dalam inbox yang belum di-merge: list (name, path), ikut kiosk & urutan id."""
+    inbox = os.path.join(sync_dir, "inbox")
+    if not os.path.isdir(inbox):
+        return []
+    with db.get_conn() as conn:
+        done = {r[0] for r in conn.execute("SELECT name FROM sync_segments")}
+    out = []
+    for kiosk in sorted(os.listdir(inbox)):
+        kdir = os.path.join(inbox, kiosk)
+        if not os.path.isdir(kdir):
+            continue
+        for fn in sorted(os.listdir(kdir)):
+            name = f"{kiosk}/{fn}"
+            if fn.endswith(".jsonl") and name not in done:
+                out.append((name, os.path.join(kdir, fn)))
+    return out
+
+def _merge_segment(conn, name: str, rows: list) -> dict:
+    """Merge satu segmen dalam satu transaksi. Email sama dalam segmen -> paling awal sahaja."""
+    earliest = {}
+    for r in rows:
+        email = db.norm_email(r.get("email"))
+        if not email:
+            continue
+        cur = earliest.get(email)
+        if cur is None or r["timestamp"] < cur[1]:
+            earliest[email] = (email, r["timestamp"], r.get("nama"), r.get("gelaran"), db.norm_meja(r.get("no_meja")),
+                               db.myt_to_epoch(r["timestamp"]))
+
+    now_s = db.now_myt_str()
+    now = datetime.strptime(now_s, TS_FMT)
+    lags = [_lag_s(r.get("timestamp"), now) for r in rows]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = dict(conn.execute(
+            "SELECT email, timestamp FROM attendance WHERE email IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(earliest)),),
+        ).fetchall())
+        inserted = sum(1 for e in earliest if e not in existing)
+        replaced = sum(1 for e, p in earliest.items() if e in existing and p[1] < existing[e])
+        conn.executemany(SQL_MERGE_ATTENDANCE, list(earliest.values()))
+        stats = {
+            "rows": len(rows),
+            "inserted": inserted,
+            "replaced": replaced,
+            "duplicates": len(rows) - inserted - replaced,
+            "lag_sum_s": sum(lags),
+            "lag_max_s": max(lags, default=0.0),
+            "last_checkin": max((r.get("timestamp") or "" for r in rows), default=""),
+        }
+        conn.execute("""
+            INSERT INTO sync_segments(name, kiosk, rows, inserted, replaced, duplicates,
+                                      lag_sum_s, lag_max_s, last_checkin, merged_at)
+            VALUES (:name, :kiosk, :rows, :inserted, :replaced, :duplicates,
+                    :lag_sum_s, :lag_max_s, :last_checkin, :merged_at)
+        """, {**stats, "name": name, "kiosk": name.split("/", 1)[0], "merged_at": now_s})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
+def merge_inbox(sync_dir: str, progress=None) -> dict:
+    """Merge semua segmen baru ke attendance (satu transaksi setiap segmen). Pulang jumlah."""
+    todo = pending_segments(sync_dir)
+    total = {"segments": 0, "rows": 0, "inserted": 0, "replaced": 0, "duplicates": 0}
+    t0 = time.perf_counter()
+    with db.get_conn() as conn:
+        for i, (name, path) in enumerate(todo, 1):
+            with open(path, "r", encoding="utf-8") as f:
+                rows = [json.loads(ln) for ln in f if ln.strip()]
+            stats = _merge_segment(conn, name, rows)
+            total["segments"] += 1
+            for k in ("rows", "inserted", "replaced", "duplicates"):
+                total[k] += stats[k]
+            if progress:
+                progress(i, len(todo))
+    if todo and db.perf_enabled():
+        db.perf_record("sync_merge", time.perf_counter() - t0)
+    return total
+
+
+# =========================
+# KIOSK: tarik master, hantar changelog
+# =========================
+def pull_master(sync_dir: str):
+    """Muat master.csv terbitan pusat kalau berubah. Pulang ringkasan import atau None."""
+    try:
+        with open(os.path.join(sync_dir, "master", "manifest.json"), "rb") as f:
+            manifest = json.load(f)
+        with open(os.path.join(sync_dir, "master", "master.csv"), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    with db.get_conn() as conn:
+        if manifest["sha256"] == _get_setting(conn, "sync_master_sha"):
+            return None
+    if hashlib.sha256(data).hexdigest() != manifest["sha256"]:
+        return None   # csv sedang diganti - cuba pusingan seterusnya
+
+    chunks = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, chunksize=db.IMPORT_CHUNK_ROWS)
+    res = db.import_master_chunks(chunks, replace=True)
+    with db.get_conn() as conn:
+        _set_setting(conn, "sync_master_sha", manifest["sha256"])
+        _set_setting(conn, "sync_master_at", manifest.get("published_at", ""))
+        conn.commit()
+    return res
+
+def push_changelog(sync_dir: str, kiosk: str) -> int:
+    """Tulis changelog yang belum dihantar sebagai segmen <first>-<last>.jsonl. Pulang bil. rekod."""
+    sent = 0
+    while True:
+        with db.get_conn() as conn:
+            pushed = int(_get_setting(conn, "sync_pushed_id", 0))
+            rows = conn.execute("""
+                SELECT id, email, timestamp, nama, gelaran, no_meja FROM changelog
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (pushed, SYNC_SEGMENT_ROWS)).fetchall()
+        if not rows:
+            return sent
+
+        data = "".join(
+            json.dumps({"id": i, "email": e, "timestamp": t, "nama": n, "gelaran": g, "no_meja": m},
+                       ensure_ascii=False) + "\n"
+            for i, e, t, n, g, m in rows
+        ).encode("utf-8")
+        # nama segmen tetap (ikut id) -> tulis semula selepas crash menghasilkan fail yang sama
+        _atomic_write(os.path.join(sync_dir, "inbox", kiosk, f"{rows[0][0]:010d}-{rows[-1][0]:010d}.jsonl"), data)
+        with db.get_conn() as conn:
+            _set_setting(conn, "sync_pushed_id", rows[-1][0])
+            _set_setting(conn, "sync_pushed_at", db.now_myt_str())
+            conn.commit()
+        sent += len(rows)
+
+def kiosk_status() -> dict:
+    """Keadaan sync kiosk ini dari DB tempatan (tak perlu direktori sync)."""
+    with db.get_conn() as conn:
+        pushed = int(_get_setting(conn, "sync_pushed_id", 0))
+        last = conn.execute("SELECT COALESCE(MAX(id), 0), MIN(CASE WHEN id > ? THEN timestamp END) FROM changelog",
+                            (pushed,)).fetchone()
+        return {
+            "kiosk": db.KIOSK_ID,
+            "pending": last[0] - pushed,
+            "oldest_pending": last[1],
+            "pushed_id": pushed,
+            "pushed_at": _get_setting(conn, "sync_pushed_at"),
+            "master_sha": (_get_setting(conn, "sync_master_sha") or "")[:12],
+            "master_at": _get_setting(conn, "sync_master_at"),
+        }
+
+def write_heartbeat(sync_dir: str, kiosk: str, error: str = None):
+    st = kiosk_status()
+    _atomic_write(os.path.join(sync_dir, "status", f"{kiosk}.json"), json.dumps({
+        **st, "at": db.now_myt_str(), "unix": time.time(), "error": error,
+    }).encode())
+
+
+# =========================
+# PUSINGAN SYNC (thread latar / CLI)
+# =========================
+_state = {"lock": threading.Lock(), "thread": None, "last": None, "error": None, "at": None, "rounds": 0}
+
+def sync_once(sync_dir: str = None, kiosk: str = None) -> dict:
+    """Satu pusingan. Kiosk: tarik master, hantar changelog, heartbeat. Pusat: terbit master, merge inbox."""
+    sync_dir = sync_dir or SYNC_DIR
+    kiosk = kiosk if kiosk is not None else db.KIOSK_ID
+    if not sync_dir:
+        raise ValueError("Direktori sync tidak diset (MAJLIS_SYNC_DIR).")
+    out = {"role": "kiosk" if kiosk else "pusat"}
+    try:
+        if kiosk:
+            check_kiosk_id(kiosk)
+            require_share(sync_dir)
+            out["master"] = pull_master(sync_dir)
+            out["pushed"] = push_changelog(sync_dir, kiosk)
+            write_heartbeat(sync_dir, kiosk)
+        else:
+            out["published"] = publish_master(sync_dir)
+            out["merged"] = merge_inbox(sync_dir)
+        err = None
+    except OSError as e:
+        # direktori tak boleh dicapai (rangkaian putus) - check-in tempatan tetap jalan, cuba lagi nanti
+        err = f"{type(e).__name__}: {e}"
+    with _state["lock"]:
+        _state.update(last=out, error=err, at=db.now_myt_str(), rounds=_state["rounds"] + 1)
+    return {**out, "error": err}
+
+def _loop(sync_dir, kiosk, interval):
+    while True:
+        try:
+            sync_once(sync_dir, kiosk)
+        except Exception as e:
+            with _state["lock"]:
+                _state.update(error=f"{type(e).__name__}: {e}", at=db.now_myt_str())
+        time.sleep(interval)
+
+def start_background(sync_dir: str = None, kiosk: str = None, interval: float = SYNC_INTERVAL) -> bool:
+    """Mula thread sync (sekali setiap proses). Pulang False kalau MAJLIS_SYNC_DIR tidak diset."""
+    sync_dir = sync_dir or SYNC_DIR
+    if not sync_dir:
+        return False
+    with _state["lock"]:
+        if _state["thread"] is None:
+            kiosk = kiosk if kiosk is not None else db.KIOSK_ID
+            _state["thread"] = threading.Thread(target=_loop, args=(sync_dir, kiosk, interval),
+                                                name="kiosk-sync", daemon=True)
+            _state["thread"].start()
+    return True
+
+def sync_state() -> dict:
+    with _state["lock"]:
+        return {k: _state[k] for k in ("last", "error", "at", "rounds")}
+
+
+# =========================
+# METRIK (Admin pusat)
+# =========================
+def sync_metrics(sync_dir: str = None) -> pd.DataFrame:
+    """Satu baris setiap kiosk: rekod di-merge, konflik, lag, pending & heartbeat."""
+    sync_dir = sync_dir or SYNC_DIR
+    with db.get_conn() as conn:
+        df = pd.read_sql("""
+            SELECT kiosk,
+                   COUNT(*) AS segmen,
+                   SUM(rows) AS rekod,
+                   SUM(inserted) AS baru,
+                   SUM(replaced) AS diganti_awal,
+                   SUM(duplicates) AS duplikat,
+                   ROUND(SUM(lag_sum_s) / MAX(SUM(rows), 1), 1) AS lag_purata_s,
+                   ROUND(MAX(lag_max_s), 1) AS lag_max_s,
+                   MAX(last_checkin) AS checkin_terakhir,
+                   MAX(merged_at) AS merge_terakhir
+            FROM sync_segments
+            GROUP BY kiosk
+        """, conn)
+
+    beats = {}
+    status_dir = os.path.join(sync_dir, "status") if sync_dir else ""
+    if status_dir and os.path.isdir(status_dir):
+        for fn in os.listdir(status_dir):
+            if fn.endswith(".json"):
+                try:
+                    with open(os.path.join(status_dir, fn), "rb") as f:
+                        beats[fn[:-5]] = json.load(f)
+                except (OSError, ValueError):
+                    continue
+    backlog = {}
+    for name, _ in (pending_segments(sync_dir) if sync_dir else []):
+        k = name.split("/", 1)[0]
+        backlog[k] = backlog.get(k, 0) + 1
+
+    kiosks = sorted(set(df["kiosk"]) | set(beats) | set(backlog))
+    df = df.set_index("kiosk").reindex(kiosks).reset_index()
+    now = time.time()
+    df["pending_kiosk"] = [beats.get(k, {}).get("pending") for k in kiosks]
+    df["segmen_belum_merge"] = [backlog.get(k, 0) for k in kiosks]
+    df["heartbeat_s"] = [round(now - beats[k]["unix"]) if k in beats else None for k in kiosks]
+    df["online"] = [k in beats and now - beats[k]["unix"] <= SYNC_STALE_S for k in kiosks]
+    return df
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Sync kiosk <-> DB pusat melalui direktori dikongsi")
+    p.add_argument("role", choices=["central", "kiosk"])
+    p.add_argument("--dir", default=SYNC_DIR, help="direktori sync (default: MAJLIS_SYNC_DIR)")
+    p.add_argument("--id", default=db.KIOSK_ID, help="ID kiosk (role kiosk; default: MAJLIS_KIOSK_ID)")
+    p.add_argument("--db", help="fail DB (default: MAJLIS_DB atau dinner.db)")
+    p.add_argument("--interval", type=float, default=SYNC_INTERVAL)
+    p.add_argument("--once", action="store_true", help="satu pusingan sahaja")
+    args = p.parse_args(argv)
+    if not args.dir:
+        p.error("--dir atau MAJLIS_SYNC_DIR diperlukan")
+    if args.db:
+        db.DB_NAME = args.db
+    kiosk = ""
+    if args.role == "kiosk":
+        kiosk = check_kiosk_id(args.id)
+        db.KIOSK_ID = kiosk
+    db.init_db()
+
+    while True:
+        res = sync_once(args.dir, kiosk)
+        print(db.now_myt_str(), json.dumps(res, default=str, ensure_ascii=False), flush=True)
+        if args.once:
+            return 1 if res["error"] else 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
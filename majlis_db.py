@@ -0,0 +1,2813 @@
+"""Lapisan data Pendaftaran Majlis (SQLite + cache proses).
+
+Semua logik normalisasi, lookup, check-in, import & statistik ada di sini supaya
+boleh diimport tanpa Streamlit - oleh app.py, benchmark.py dan servis lain.
+State peringkat proses (pool connection, cache, writer) ialah singleton modul.
+"""
+import os
+import pandas as pd
+import sqlite3
+from datetime import datetime
+import time
+import pytz
+import io
+import mmap
+import re
+import hashlib
+import hmac
+import base64
+import threading
+import weakref
+import queue
+import collections
+import contextlib
+import array
+import json
+import random
+import secrets
+import functools
+import tempfile
+from concurrent.futures import Future
+
+# =========================
+# CONFIG
+# =========================
+DB_NAME = os.environ.get("MAJLIS_DB", "dinner.db")
+
+TZ = pytz.timezone("Asia/Kuala_Lumpur")
+
+ASSET_KINDS = ("poster", "layout", "aturcara")
+
+# Varian gambar dijana sekali masa upload (px lebar). Page tetamu ambil varian
+# terkecil yang >= GUEST_IMAGE_WIDTH.
+ASSET_VARIANT_WIDTHS = (480, 720, 1080)
+GUEST_IMAGE_WIDTH = 720
+
+IMPORT_CHUNK_ROWS = 5000   # baris setiap batch bila baca XLSX/CSV secara streaming
+
+# Mod kiosk (lihat kiosk_sync.py): DB ini replika tempatan, setiap check-in
+# juga ditulis ke changelog untuk dihantar ke DB pusat.
+KIOSK_ID = os.environ.get("MAJLIS_KIOSK_ID", "")
+
+
+def _process_singleton(fn):
+    """Satu objek dikongsi seluruh proses (dicipta sekali, thread-safe).
+
+    wrapper.reset() buang objek sedia ada (test tukar DB_NAME antara kes).
+    """
+    lock = threading.Lock()
+    box = []
+
+    @functools.wraps(fn)
+    def wrapper():
+        if not box:
+            with lock:
+                if not box:
+                    box.append(fn())
+        return box[0]
+    wrapper.reset = box.clear
+    return wrapper
+
+
+
+# =========================
+# INSTRUMENTATION
+# =========================
+# Masa setiap fungsi hot-path (decorator @timed) + setiap rerun UI. Bila
+# PERF_ENABLED False, wrapper hanya semak satu flag dan terus panggil fungsi.
+PERF_ENABLED = os.environ.get("MAJLIS_PERF", "1") != "0"
+PERF_WINDOW = 2048       # sampel terkini disimpan setiap op (histogram bergulir)
+PERF_SLOW_MS = 250.0     # > had ini masuk slow log
+PERF_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+
+@_process_singleton
+def _perf():
+    return {
+        "lock": threading.Lock(),
+        "ops": {},                                  # op -> {n, total, max, errors, locks, recent}
+        "slow": collections.deque(maxlen=500),      # (masa, op, ms, thread, ralat)
+        "since": time.time(),
+    }
+
+def perf_enabled() -> bool:
+    return PERF_ENABLED
+
+def set_perf_enabled(on: bool):
+    global PERF_ENABLED
+    PERF_ENABLED = bool(on)
+
+def perf_record(op: str, dt: float, error: BaseException = None):
+    """Rekod satu sampel (saat). Dipanggil oleh @timed; UI guna untuk 'rerun'."""
+    p = _perf()
+    locked = isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
+    )
+    with p["lock"]:
+        s = p["ops"].get(op)
+        if s is None:
+            s = p["ops"][op] = {
+                "n": 0, "total": 0.0, "max": 0.0, "errors": 0, "locks": 0,
+                "recent": collections.deque(maxlen=PERF_WINDOW),
+            }
+        s["n"] += 1
+        s["total"] += dt
+        if dt > s["max"]:
+            s["max"] = dt
+        if error is not None:
+            s["errors"] += 1
+        if locked:
+            s["locks"] += 1
+        s["recent"].append((time.monotonic(), dt))
+        if dt * 1000 >= PERF_SLOW_MS or error is not None:
+            p["slow"].append((
+                now_myt_str(), op, round(dt * 1000, 1), threading.current_thread().name,
+                type(error).__name__ if error is not None else "",
+            ))
+
+def timed(op: str = None):
+    """Decorator: rekod masa fungsi ke _perf() ikut nama op."""
+    def deco(fn):
+        name = op or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PERF_ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            err = None
+            try:
+                return fn(*args, **kwargs)
+            except BaseException as e:
+                err = e
+                raise
+            finally:
+                perf_record(name, time.perf_counter() - t0, err)
+        return wrapper
+    return deco
+
+def perf_snapshot(window_s: float = 60.0) -> list:
+    """Satu dict setiap op: kiraan keseluruhan + p50/p95/p99 & kadar dari sampel terkini."""
+    p = _perf()
+    with p["lock"]:
+        ops = {k: (v["n"], v["total"], v["max"], v["errors"], v["locks"], list(v["recent"]))
+               for k, v in p["ops"].items()}
+
+    cutoff = time.monotonic() - window_s
+    out = []
+    for op, (n, total, mx, errors, locks, recent) in sorted(ops.items()):
+        lat = sorted(dt for _, dt in recent)
+
+        def pct(q):
+            return (lat[min(len(lat) - 1, int(len(lat) * q))] * 1000) if lat else 0.0
+
+        out.append({
+            "op": op,
+            "calls": n,
+            "per_s": sum(1 for t, _ in recent if t >= cutoff) / window_s,
+            "avg_ms": total / n * 1000 if n else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": mx * 1000,
+            "errors": errors,
+            "lock_waits": locks,
+        })
+    return out
+
+def perf_histogram(op: str) -> dict:
+    """Histogram sampel terkini untuk satu op: {'<=1ms': n, ..., '>5000ms': n}."""
+    p = _perf()
+    with p["lock"]:
+        s = p["ops"].get(op)
+        recent = [dt for _, dt in s["recent"]] if s else []
+
+    hist = {f"<={b}ms": 0 for b in PERF_BUCKETS_MS}
+    hist[f">{PERF_BUCKETS_MS[-1]}ms"] = 0
+    for dt in recent:
+        ms = dt * 1000
+        for b in PERF_BUCKETS_MS:
+            if ms <= b:
+                hist[f"<={b}ms"] += 1
+                break
+        else:
+            hist[f">{PERF_BUCKETS_MS[-1]}ms"] += 1
+    return hist
+
+def perf_slow_log(limit: int = 100) -> list:
+    p = _perf()
+    with p["lock"]:
+        return list(p["slow"])[-limit:][::-1]
+
+def perf_export() -> bytes:
+    """Semua metrik sebagai JSON (untuk download / lampir dalam laporan)."""
+    p = _perf()
+    snap = perf_snapshot()
+    return json.dumps({
+        "exported_at": now_myt_str(),
+        "since": datetime.fromtimestamp(p["since"], TZ).strftime("%Y-%m-%d %H:%M:%S"),
+        "enabled": PERF_ENABLED,
+        "slow_ms": PERF_SLOW_MS,
+        "ops": snap,
+        "histograms": {r["op"]: perf_histogram(r["op"]) for r in snap},
+        "slow": [dict(zip(("at", "op", "ms", "thread", "error"), r)) for r in perf_slow_log(500)],
+    }, indent=2).encode("utf-8")
+
+def perf_reset():
+    p = _perf()
+    with p["lock"]:
+        p["ops"].clear()
+        p["slow"].clear()
+        p["since"] = time.time()
+
+# =========================
+# HELPERS: NORMALIZE
+# =========================
+# No_Meja nombor yang dibaca sebagai float (Excel / pandas) -> "1.0"; buang ".0".
+MEJA_INTEGRAL_FLOAT_RE = r"^(\d+)\.0+$"
+
+def norm_meja(v) -> str:
+    """Normalisasi No_Meja supaya match jemputan & koordinat (VIP 1 -> VIP1, 1.0 -> 1)."""
+    if v is None:
+        return ""
+    s = re.sub(r"\s+", "", str(v).upper())
+    return re.sub(MEJA_INTEGRAL_FLOAT_RE, r"\1", s)
+
+def norm_meja_col(col: pd.Series) -> pd.Series:
+    """norm_meja untuk seluruh kolum (vektor)."""
+    return (col.fillna("").astype(str).str.upper()
+            .str.replace(r"\s+", "", regex=True)
+            .str.replace(MEJA_INTEGRAL_FLOAT_RE, r"\1", regex=True))
+
+def norm_email(v) -> str:
+    return (str(v).strip().lower()) if v is not None else ""
+
+def now_myt_str():
+    return datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+MYT_OFFSET_S = 8 * 3600     # Malaysia tiada DST
+
+def myt_to_epoch(ts: str):
+    """'YYYY-mm-dd HH:MM:SS' (MYT) -> epoch saat, atau None kalau format lain."""
+    try:
+        return int(datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=pytz.utc).timestamp()) - MYT_OFFSET_S
+    except (TypeError, ValueError):
+        return None
+
+
+# =========================
+# DB
+# =========================
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # reader (dashboard) tak block writer (check-in)
+    "PRAGMA synchronous=NORMAL",     # selamat dengan WAL, kurang fsync
+    "PRAGMA busy_timeout=5000",      # tunggu lock (ms) daripada terus 'database is locked'
+    "PRAGMA cache_size=-16000",      # ~16MB page cache setiap connection
+    "PRAGMA temp_store=MEMORY",
+)
+
+@_process_singleton
+def _conn_pool():
+    """Pool connection peringkat proses.
+
+    Setiap thread pinjam satu connection (thread-local) dan guna semula untuk
+    semua helper dalam rerun tu. Bila thread tamat, connection dipulang ke
+    'idle' untuk thread seterusnya - jadi statement cache sqlite3 kekal panas.
+    """
+    return {"lock": threading.Lock(), "idle": [], "local": threading.local()}
+
+def _open_conn():
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, timeout=5.0, cached_statements=256)
+    for p in DB_PRAGMAS:
+        conn.execute(p)
+    return conn
+
+def _release_conn(pool, conn):
+    if conn.in_transaction:
+        conn.rollback()
+    with pool["lock"]:
+        pool["idle"].append(conn)
+
+# Tiada @timed: dipanggil oleh hampir setiap helper - masa diukur pada caller.
+def get_conn():
+    pool = _conn_pool()
+    conn = getattr(pool["local"], "conn", None)
+    if conn is not None:
+        return conn
+
+    with pool["lock"]:
+        conn = pool["idle"].pop() if pool["idle"] else None
+    if conn is None:
+        conn = _open_conn()
+
+    pool["local"].conn = conn
+    weakref.finalize(threading.current_thread(), _release_conn, pool, conn)
+    return conn
+
+
+# =========================
+# SCHEMA (migration bernombor, sekali setiap proses)
+# =========================
+def _m001_base(c):
+    """Jadual asas + counters."""
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS master (
+        email TEXT PRIMARY KEY,
+        nama TEXT,
+        gelaran TEXT,
+        no_meja TEXT
+    )""")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS attendance (
+        email TEXT PRIMARY KEY,
+        timestamp TEXT,
+        nama TEXT,
+        gelaran TEXT,
+        no_meja TEXT,
+        seq INTEGER
+    )""")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS winners (
+        email TEXT PRIMARY KEY,
+        timestamp TEXT,
+        nama TEXT,
+        gelaran TEXT,
+        no_meja TEXT
+    )""")
+
+    # Kekal (walaupun layout tak highlight lagi)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS table_map (
+        no_meja TEXT PRIMARY KEY,
+        x INTEGER,
+        y INTEGER,
+        r INTEGER
+    )""")
+
+    # minimal table; schema penuh akan dimigrate
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS event_assets (
+        id INTEGER PRIMARY KEY
+    )
+    """)
+
+    # log fail upload yang sudah diproses (ikut hash kandungan)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        sha256 TEXT,
+        filename TEXT,
+        size INTEGER,
+        ingested_at TEXT,
+        summary TEXT
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ingest_log_kind_sha ON ingest_log(kind, sha256)")
+
+    # varian saiz phone (WEBP + JPEG) untuk setiap asset
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS asset_variants (
+        kind TEXT,
+        fmt TEXT,
+        width INTEGER,
+        height INTEGER,
+        bytes BLOB,
+        PRIMARY KEY (kind, fmt, width)
+    )""")
+
+    # counter O(1) - dikemaskini oleh trigger (lihat COUNTER_TRIGGERS)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS table_counters (
+        no_meja TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        hadir INTEGER NOT NULL DEFAULT 0
+    )""")
+    for sql in COUNTER_TRIGGERS:
+        c.execute(sql)
+    if c.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 0:
+        _rebuild_counters(c)
+
+
+# Trigger counter: master / attendance / winners -> counters & table_counters.
+# DELETE penuh (reset Maintenance) pun lalu trigger yang sama, baris demi baris.
+# Guna ON CONFLICT DO NOTHING, bukan INSERT OR IGNORE: dalam cabang DO UPDATE
+# sesuatu UPSERT, policy ABORT statement luar mengatasi OR IGNORE trigger.
+COUNTER_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_master_ins AFTER INSERT ON master BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'master';
+        INSERT INTO table_counters(no_meja) VALUES (COALESCE(NEW.no_meja, '')) ON CONFLICT(no_meja) DO NOTHING;
+        UPDATE table_counters SET total = total + 1 WHERE no_meja = COALESCE(NEW.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_del AFTER DELETE ON master BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'master';
+        UPDATE table_counters SET total = total - 1 WHERE no_meja = COALESCE(OLD.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_upd AFTER UPDATE OF no_meja ON master
+    WHEN OLD.no_meja IS NOT NEW.no_meja BEGIN
+        UPDATE table_counters SET total = total - 1 WHERE no_meja = COALESCE(OLD.no_meja, '');
+        INSERT INTO table_counters(no_meja) VALUES (COALESCE(NEW.no_meja, '')) ON CONFLICT(no_meja) DO NOTHING;
+        UPDATE table_counters SET total = total + 1 WHERE no_meja = COALESCE(NEW.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_attendance_ins AFTER INSERT ON attendance BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'attendance';
+        INSERT INTO table_counters(no_meja) VALUES (COALESCE(NEW.no_meja, '')) ON CONFLICT(no_meja) DO NOTHING;
+        UPDATE table_counters SET hadir = hadir + 1 WHERE no_meja = COALESCE(NEW.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_attendance_del AFTER DELETE ON attendance BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'attendance';
+        UPDATE table_counters SET hadir = hadir - 1 WHERE no_meja = COALESCE(OLD.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_attendance_upd AFTER UPDATE OF no_meja ON attendance
+    WHEN OLD.no_meja IS NOT NEW.no_meja BEGIN
+        UPDATE table_counters SET hadir = hadir - 1 WHERE no_meja = COALESCE(OLD.no_meja, '');
+        INSERT INTO table_counters(no_meja) VALUES (COALESCE(NEW.no_meja, '')) ON CONFLICT(no_meja) DO NOTHING;
+        UPDATE table_counters SET hadir = hadir + 1 WHERE no_meja = COALESCE(NEW.no_meja, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_winners_ins AFTER INSERT ON winners BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'winners';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_winners_del AFTER DELETE ON winners BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'winners';
+    END""",
+)
+
+def _rebuild_counters(c):
+    """Kira semula counters & table_counters dari jadual sebenar (dalam transaksi caller)."""
+    c.execute("DELETE FROM counters WHERE name IN ('master', 'attendance', 'winners')")
+    c.execute("""
+        INSERT INTO counters(name, value)
+        SELECT 'master', COUNT(*) FROM master
+        UNION ALL SELECT 'attendance', COUNT(*) FROM attendance
+        UNION ALL SELECT 'winners', COUNT(*) FROM winners
+    """)
+    c.execute("DELETE FROM table_counters")
+    c.execute("""
+        INSERT INTO table_counters(no_meja, total, hadir)
+        SELECT no_meja, SUM(total), SUM(hadir) FROM (
+            SELECT COALESCE(no_meja, '') AS no_meja, 1 AS total, 0 AS hadir FROM master
+            UNION ALL
+            SELECT COALESCE(no_meja, ''), 0, 1 FROM attendance
+        ) GROUP BY no_meja
+    """)
+
+def check_counters(rebuild: bool = False) -> dict:
+    """Banding counters dengan COUNT(*) sebenar. Pulang {nama: (counter, sebenar)} yang tak sama.
+
+    rebuild=True -> bina semula counters kalau ada drift.
+    """
+    with get_conn() as conn:
+        stored = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        actual = {
+            "master": conn.execute("SELECT COUNT(*) FROM master").fetchone()[0],
+            "attendance": conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0],
+            "winners": conn.execute("SELECT COUNT(*) FROM winners").fetchone()[0],
+        }
+        drift = {k: (stored.get(k), v) for k, v in actual.items() if stored.get(k) != v}
+
+        tbl_drift = conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT no_meja, SUM(total) AS total, SUM(hadir) AS hadir FROM (
+                    SELECT no_meja, total, hadir FROM table_counters
+                    UNION ALL
+                    SELECT COALESCE(no_meja, ''), -1, 0 FROM master
+                    UNION ALL
+                    SELECT COALESCE(no_meja, ''), 0, -1 FROM attendance
+                ) GROUP BY no_meja
+                HAVING SUM(total) != 0 OR SUM(hadir) != 0
+            )
+        """).fetchone()[0]
+        if tbl_drift:
+            drift["table_counters"] = (tbl_drift, 0)
+
+        epoch = ATTENDANCE_EPOCH_SQL.format(r="attendance")
+        bucket_drift = conn.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT no_meja, minute FROM (
+                    SELECT no_meja, minute, n FROM arrival_buckets
+                    UNION ALL
+                    SELECT '*', {epoch} / 60, -1 FROM attendance
+                    UNION ALL
+                    SELECT COALESCE(no_meja, ''), {epoch} / 60, -1 FROM attendance
+                ) GROUP BY no_meja, minute
+                HAVING SUM(n) != 0
+            )
+        """).fetchone()[0]
+        if bucket_drift:
+            drift["arrival_buckets"] = (bucket_drift, 0)
+
+        hadir_drift = conn.execute("""
+            SELECT (SELECT COUNT(*) FROM (
+                        SELECT rowid FROM master_hadir
+                        EXCEPT SELECT m.rowid FROM master m JOIN attendance a ON a.email = m.email))
+                 + (SELECT COUNT(*) FROM (
+                        SELECT m.rowid FROM master m JOIN attendance a ON a.email = m.email
+                        EXCEPT SELECT rowid FROM master_hadir))
+        """).fetchone()[0]
+        if hadir_drift:
+            drift["master_hadir"] = (hadir_drift, 0)
+
+        if drift and rebuild:
+            _rebuild_counters(conn)
+            _rebuild_arrival_buckets(conn)
+            _rebuild_master_hadir(conn)
+            conn.commit()
+    return drift
+
+def _m002_event_assets(c):
+    """event_assets penuh (satu baris, id=1) + kolum hash. DB lama mungkin ada sebahagian kolum."""
+    cols = {
+        "poster_filename": "TEXT",
+        "poster_bytes": "BLOB",
+        "layout_filename": "TEXT",
+        "layout_bytes": "BLOB",
+        "aturcara_filename": "TEXT",
+        "aturcara_bytes": "BLOB",
+        "updated_at": "TEXT",
+        "poster_hash": "TEXT",
+        "layout_hash": "TEXT",
+        "aturcara_hash": "TEXT",
+    }
+    existing = [r[1] for r in c.execute("PRAGMA table_info(event_assets)").fetchall()]
+    for col, typ in cols.items():
+        if col not in existing:
+            c.execute(f"ALTER TABLE event_assets ADD COLUMN {col} {typ}")
+
+    c.execute("""
+        INSERT OR IGNORE INTO event_assets (id, updated_at)
+        VALUES (1, ?)
+    """, (now_myt_str(),))
+
+def _m003_attendance_seq(c):
+    """attendance.seq (urutan ketibaan, berindeks).
+
+    seq diambil dari counters 'attendance_seq' (high-water mark) - tak pernah
+    menurun walaupun attendance direset, jadi cursor dashboard kekal sah.
+    """
+    existing = [r[1] for r in c.execute("PRAGMA table_info(attendance)").fetchall()]
+    if "seq" not in existing:
+        c.execute("ALTER TABLE attendance ADD COLUMN seq INTEGER")
+    if c.execute("SELECT 1 FROM attendance WHERE seq IS NULL LIMIT 1").fetchone():
+        # rekod lama: susun ikut timestamp
+        base = c.execute("SELECT COALESCE(MAX(seq), 0) FROM attendance").fetchone()[0]
+        c.execute("""
+            UPDATE attendance SET seq = o.rn + ?
+            FROM (
+                SELECT email, ROW_NUMBER() OVER (ORDER BY timestamp, rowid) AS rn
+                FROM attendance WHERE seq IS NULL
+            ) AS o
+            WHERE attendance.email = o.email
+        """, (base,))
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_seq ON attendance(seq)")
+    c.execute("""
+        INSERT OR IGNORE INTO counters(name, value)
+        SELECT 'attendance_seq', COALESCE(MAX(seq), 0) FROM attendance
+    """)
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_attendance_seq_ins AFTER INSERT ON attendance BEGIN
+        UPDATE counters SET value = NEW.seq WHERE name = 'attendance_seq' AND NEW.seq > value;
+    END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_attendance_seq_upd AFTER UPDATE OF seq ON attendance BEGIN
+        UPDATE counters SET value = NEW.seq WHERE name = 'attendance_seq' AND NEW.seq > value;
+    END""")
+
+def _m004_lucky_draw(c):
+    """Jadual draws (audit cabutan) + kolum prize / draw_id dalam winners."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS draws (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT,
+        seed TEXT,
+        prize TEXT,
+        filters TEXT,
+        n_requested INTEGER,
+        n_awarded INTEGER
+    )""")
+    existing = [r[1] for r in c.execute("PRAGMA table_info(winners)").fetchall()]
+    for col, typ in (("prize", "TEXT"), ("draw_id", "INTEGER")):
+        if col not in existing:
+            c.execute(f"ALTER TABLE winners ADD COLUMN {col} {typ}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_no_meja ON attendance(no_meja)")
+
+def _m005_roster_generations(c):
+    """Counter generasi supaya proses lain (API / Streamlit) tahu roster dalam memori basi.
+
+    master_gen naik setiap kali master berubah; attendance_gen naik bila rekod
+    attendance dipadam (reset). Check-in baru dikesan melalui attendance_seq.
+    """
+    c.execute("INSERT OR IGNORE INTO counters(name, value) VALUES ('master_gen', 0), ('attendance_gen', 0)")
+    for ev in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_master_gen_{ev[:3].lower()} AFTER {ev} ON master BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'master_gen';
+        END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_attendance_gen_del AFTER DELETE ON attendance BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'attendance_gen';
+    END""")
+
+def _m006_settings(c):
+    """Jadual settings (key/value) + rahsia HMAC untuk token QR kad jemputan."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+    c.execute("INSERT OR IGNORE INTO settings(key, value) VALUES ('qr_secret', ?)", (secrets.token_hex(32),))
+
+def _m007_layout_highlights(c):
+    """Gambar layout pra-render dengan meja tetamu ditanda (satu setiap no_meja)."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS layout_highlights (
+        no_meja TEXT PRIMARY KEY,
+        build_key TEXT,
+        width INTEGER,
+        height INTEGER,
+        bytes BLOB
+    )""")
+
+def _m008_asset_store(c):
+    """Pindah BLOB asset (asal, varian, highlight) ke fail content-addressed (lihat ASSET STORE).
+
+    DB hanya simpan hash / filename / mime / size; kolum *_bytes dikosongkan.
+    """
+    existing = [r[1] for r in c.execute("PRAGMA table_info(event_assets)").fetchall()]
+    for kind in ASSET_KINDS:
+        for col, typ in ((f"{kind}_mime", "TEXT"), (f"{kind}_size", "INTEGER")):
+            if col not in existing:
+                c.execute(f"ALTER TABLE event_assets ADD COLUMN {col} {typ}")
+    for tbl in ("asset_variants", "layout_highlights"):
+        if "sha256" not in [r[1] for r in c.execute(f"PRAGMA table_info({tbl})").fetchall()]:
+            c.execute(f"ALTER TABLE {tbl} ADD COLUMN sha256 TEXT")
+
+    for kind in ASSET_KINDS:
+        row = c.execute(f"SELECT {kind}_bytes FROM event_assets WHERE id=1 AND {kind}_bytes IS NOT NULL").fetchone()
+        if row:
+            data = row[0]
+            c.execute(f"""
+                UPDATE event_assets
+                SET {kind}_hash=?, {kind}_mime=?, {kind}_size=?, {kind}_bytes=NULL
+                WHERE id=1
+            """, (blob_put(data), sniff_mime(data), len(data)))
+
+    for key_sql, tbl in (("kind, fmt, width", "asset_variants"), ("no_meja", "layout_highlights")):
+        keys = c.execute(f"SELECT {key_sql} FROM {tbl} WHERE bytes IS NOT NULL").fetchall()
+        where = " AND ".join(f"{k.strip()}=?" for k in key_sql.split(","))
+        for key in keys:
+            data = c.execute(f"SELECT bytes FROM {tbl} WHERE {where}", key).fetchone()[0]
+            c.execute(f"UPDATE {tbl} SET sha256=?, bytes=NULL WHERE {where}", (blob_put(data), *key))
+
+def _m009_kiosk_sync(c):
+    """changelog (kiosk: setiap check-in, append-only) & sync_segments (pusat: segmen yang sudah di-merge)."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS changelog (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT,
+        timestamp TEXT,
+        nama TEXT,
+        gelaran TEXT,
+        no_meja TEXT
+    )""")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS sync_segments (
+        name TEXT PRIMARY KEY,
+        kiosk TEXT,
+        rows INTEGER,
+        inserted INTEGER,
+        replaced INTEGER,
+        duplicates INTEGER,
+        lag_sum_s REAL,
+        lag_max_s REAL,
+        last_checkin TEXT,
+        merged_at TEXT
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sync_segments_kiosk ON sync_segments(kiosk)")
+
+def _m010_guest_fts(c):
+    """Index FTS5 atas master & attendance untuk carian Admin - dikemas kini oleh trigger.
+
+    External content: hanya index disimpan, teks dibaca dari jadual asal.
+    prefix='1 2 3' -> carian awalan pendek ("ah", "dr") pun guna index.
+    """
+    for tbl in ("master", "attendance"):
+        c.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {tbl}_fts USING fts5(
+                nama, gelaran, email, no_meja,
+                content='{tbl}', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )""")
+        new = f"INSERT INTO {tbl}_fts(rowid, nama, gelaran, email, no_meja) VALUES (NEW.rowid, NEW.nama, NEW.gelaran, NEW.email, NEW.no_meja);"
+        old = (f"INSERT INTO {tbl}_fts({tbl}_fts, rowid, nama, gelaran, email, no_meja) "
+               f"VALUES ('delete', OLD.rowid, OLD.nama, OLD.gelaran, OLD.email, OLD.no_meja);")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_ins AFTER INSERT ON {tbl} BEGIN {new} END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_del AFTER DELETE ON {tbl} BEGIN {old} END")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_upd AFTER UPDATE OF nama, gelaran, email, no_meja ON {tbl}
+            BEGIN {old} {new} END""")
+        c.execute(f"INSERT INTO {tbl}_fts({tbl}_fts) VALUES ('rebuild')")
+
+# Epoch rekod attendance (ts_epoch; rekod tanpa ts_epoch dikira dari timestamp MYT)
+ATTENDANCE_EPOCH_SQL = "COALESCE({r}.ts_epoch, CAST(strftime('%s', {r}.timestamp) AS INTEGER) - 28800, 0)"
+
+# arrival_buckets: bil. ketibaan setiap minit, keseluruhan (no_meja '*') & setiap meja.
+def _arrival_bucket_triggers():
+    new, old = ATTENDANCE_EPOCH_SQL.format(r="NEW"), ATTENDANCE_EPOCH_SQL.format(r="OLD")
+    inc = f"""INSERT INTO arrival_buckets(no_meja, minute, n)
+        VALUES ('*', {new} / 60, 1), (COALESCE(NEW.no_meja, ''), {new} / 60, 1)
+        ON CONFLICT(no_meja, minute) DO UPDATE SET n = n + 1;"""
+    dec = f"""UPDATE arrival_buckets SET n = n - 1
+        WHERE no_meja IN ('*', COALESCE(OLD.no_meja, '')) AND minute = {old} / 60;
+        DELETE FROM arrival_buckets
+        WHERE no_meja IN ('*', COALESCE(OLD.no_meja, '')) AND minute = {old} / 60 AND n <= 0;"""
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS trg_arrival_ins AFTER INSERT ON attendance BEGIN {inc} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_arrival_del AFTER DELETE ON attendance BEGIN {dec} END",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_arrival_upd AFTER UPDATE OF timestamp, ts_epoch, no_meja ON attendance
+        WHEN {old} / 60 != {new} / 60 OR OLD.no_meja IS NOT NEW.no_meja BEGIN {dec} {inc} END""",
+    )
+
+def _rebuild_arrival_buckets(c):
+    c.execute("DELETE FROM arrival_buckets")
+    c.execute(f"""
+        INSERT INTO arrival_buckets(no_meja, minute, n)
+        SELECT no_meja, minute, COUNT(*) FROM (
+            SELECT '*' AS no_meja, {ATTENDANCE_EPOCH_SQL.format(r="attendance")} / 60 AS minute FROM attendance
+            UNION ALL
+            SELECT COALESCE(no_meja, ''), {ATTENDANCE_EPOCH_SQL.format(r="attendance")} / 60 FROM attendance
+        ) GROUP BY no_meja, minute
+    """)
+
+def _m011_arrival_epoch(c):
+    """attendance.ts_epoch (integer, berindeks) + arrival_buckets setiap minit (trigger)."""
+    if "ts_epoch" not in [r[1] for r in c.execute("PRAGMA table_info(attendance)").fetchall()]:
+        c.execute("ALTER TABLE attendance ADD COLUMN ts_epoch INTEGER")
+    c.execute("""
+        UPDATE attendance SET ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER) - 28800
+        WHERE ts_epoch IS NULL
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_epoch ON attendance(ts_epoch)")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS arrival_buckets (
+        no_meja TEXT NOT NULL,
+        minute INTEGER NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (no_meja, minute)
+    ) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_arrival_buckets_minute ON arrival_buckets(minute)")
+    _rebuild_arrival_buckets(c)
+    for sql in _arrival_bucket_triggers():
+        c.execute(sql)
+
+def _m012_counter_trigger_upsert(c):
+    """Cipta semula trigger counter (INSERT OR IGNORE -> ON CONFLICT DO NOTHING)."""
+    for name in ("trg_master_ins", "trg_master_upd", "trg_attendance_ins", "trg_attendance_upd"):
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for sql in COUNTER_TRIGGERS:
+        c.execute(sql)
+    _rebuild_counters(c)
+
+def _m013_meja_integral_float(c):
+    """No_Meja "1.0" (dtype float dari import berchunk) -> "1", supaya satu meja satu counter."""
+    for tbl in ("master", "attendance", "winners", "table_map"):
+        fix = [(norm_meja(m), m) for (m,) in c.execute(f"SELECT DISTINCT no_meja FROM {tbl}")
+               if m and re.match(MEJA_INTEGRAL_FLOAT_RE, m)]
+        if tbl == "table_map":   # no_meja PK: koordinat sedia ada untuk "1" dikekalkan
+            c.executemany("UPDATE OR IGNORE table_map SET no_meja = ? WHERE no_meja = ?", fix)
+            c.executemany("DELETE FROM table_map WHERE no_meja = ?", [(old,) for _, old in fix])
+        else:
+            c.executemany(f"UPDATE {tbl} SET no_meja = ? WHERE no_meja = ?", fix)
+    _rebuild_counters(c)
+
+# master_hadir: rowid master yang sudah check-in (integer, kecil). Carian 'belum'
+# = rowid NOT IN master_hadir - probe integer, bukan anti-join email ke attendance.
+# Tidak sentuh jadual master (trigger master_gen akan muat semula roster).
+MASTER_HADIR_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_att_ins AFTER INSERT ON attendance BEGIN
+        INSERT INTO master_hadir(rowid) SELECT rowid FROM master WHERE email = NEW.email
+        ON CONFLICT DO NOTHING;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_att_del AFTER DELETE ON attendance BEGIN
+        DELETE FROM master_hadir WHERE rowid IN (SELECT rowid FROM master WHERE email = OLD.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_att_upd AFTER UPDATE OF email ON attendance
+    WHEN OLD.email IS NOT NEW.email BEGIN
+        DELETE FROM master_hadir WHERE rowid IN (SELECT rowid FROM master WHERE email = OLD.email);
+        INSERT INTO master_hadir(rowid) SELECT rowid FROM master WHERE email = NEW.email
+        ON CONFLICT DO NOTHING;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_ins AFTER INSERT ON master BEGIN
+        INSERT INTO master_hadir(rowid) SELECT NEW.rowid
+        WHERE EXISTS (SELECT 1 FROM attendance WHERE email = NEW.email)
+        ON CONFLICT DO NOTHING;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_del AFTER DELETE ON master BEGIN
+        DELETE FROM master_hadir WHERE rowid = OLD.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_master_hadir_upd AFTER UPDATE OF email ON master
+    WHEN OLD.email IS NOT NEW.email BEGIN
+        DELETE FROM master_hadir WHERE rowid = OLD.rowid;
+        INSERT INTO master_hadir(rowid) SELECT NEW.rowid
+        WHERE EXISTS (SELECT 1 FROM attendance WHERE email = NEW.email)
+        ON CONFLICT DO NOTHING;
+    END""",
+)
+
+def _rebuild_master_hadir(c):
+    c.execute("DELETE FROM master_hadir")
+    c.execute("INSERT INTO master_hadir(rowid) SELECT m.rowid FROM master m JOIN attendance a ON a.email = m.email")
+
+def _m014_master_hadir(c):
+    """master_hadir (rowid master yang sudah check-in) untuk kiraan & halaman 'belum'.
+
+    Index FTS dibina semula dengan prefix sehingga 6 aksara: awalan seperti
+    "staff" padan puluhan ribu token email (staff0..staff49999) dan tanpa index
+    prefix setiap halaman perlu gabung semua doclist itu (~15 ms pada 50k).
+    Trigger FTS dari migration 10 kekal (ia rujuk nama jadual, bukan objek).
+    """
+    c.execute("CREATE TABLE IF NOT EXISTS master_hadir (rowid INTEGER PRIMARY KEY)")
+    for sql in MASTER_HADIR_TRIGGERS:
+        c.execute(sql)
+    _rebuild_master_hadir(c)
+    for tbl in ("master", "attendance"):
+        c.execute(f"DROP TABLE IF EXISTS {tbl}_fts")
+        c.execute(f"""
+            CREATE VIRTUAL TABLE {tbl}_fts USING fts5(
+                nama, gelaran, email, no_meja,
+                content='{tbl}', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6'
+            )""")
+        c.execute(f"INSERT INTO {tbl}_fts({tbl}_fts) VALUES ('rebuild')")
+
+def _m015_draw_indexes(c):
+    """Index (no_meja, seq) & (gelaran, seq): cabutan bertapis baca seq layak terus dari index."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_meja_seq ON attendance(no_meja, seq)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_gelaran_seq ON attendance(gelaran, seq)")
+    c.execute("DROP INDEX IF EXISTS idx_attendance_no_meja")   # awalan idx_attendance_meja_seq
+
+def _rebuild_rowid_indexes(c):
+    """VACUUM boleh tukar rowid master / attendance - bina semula yang bergantung padanya."""
+    for tbl in ("master", "attendance"):
+        c.execute(f"INSERT INTO {tbl}_fts({tbl}_fts) VALUES ('rebuild')")
+    _rebuild_master_hadir(c)
+
+
+# Migration bernombor - JANGAN ubah yang sudah dikeluarkan, tambah nombor baru di hujung.
+# Setiap langkah idempotent (IF NOT EXISTS / semak PRAGMA) sebab DB sebelum
+# schema_version wujud mungkin sudah ada sebahagian schema.
+MIGRATIONS = (
+    (1, "base tables + counters", _m001_base),
+    (2, "event_assets columns + hash", _m002_event_assets),
+    (3, "attendance.seq", _m003_attendance_seq),
+    (4, "lucky draw audit", _m004_lucky_draw),
+    (5, "roster generation counters", _m005_roster_generations),
+    (6, "settings + qr secret", _m006_settings),
+    (7, "layout highlights", _m007_layout_highlights),
+    (8, "asset BLOBs -> file store", _m008_asset_store),
+    (9, "kiosk changelog + sync segments", _m009_kiosk_sync),
+    (10, "FTS5 index master + attendance", _m010_guest_fts),
+    (11, "attendance epoch + arrival buckets", _m011_arrival_epoch),
+    (12, "counter triggers upsert-safe", _m012_counter_trigger_upsert),
+    (13, "no_meja integral floats", _m013_meja_integral_float),
+    (14, "master_hadir + FTS prefix 6 for guest search", _m014_master_hadir),
+    (15, "attendance (no_meja, seq) / (gelaran, seq) for draws", _m015_draw_indexes),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_schema_lock = threading.Lock()
+_schema_ready = set()   # DB_NAME yang sudah disemak dalam proses ini
+
+def schema_version() -> int:
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'"
+        ).fetchone()
+        if not row:
+            return 0
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate_db() -> list:
+    """Jalankan migration yang belum ada dalam schema_version. Pulang list versi yang dijalankan.
+
+    Setiap migration dalam transaksi sendiri (BEGIN IMMEDIATE) - proses lain yang
+    start serentak akan tunggu, kemudian nampak versi sudah dijalankan & skip.
+    """
+    if schema_version() >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    with get_conn() as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )""")
+        for version, name, step in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = conn.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone()
+                if not done:
+                    step(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version(version, name, applied_at) VALUES (?, ?, ?)",
+                        (version, name, now_myt_str()),
+                    )
+                    applied.append(version)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if 8 in applied:
+            conn.execute("VACUUM")   # pulangkan ruang BLOB lama yang sudah dipindah ke asset store
+            with conn:
+                _rebuild_rowid_indexes(conn)
+    return applied
+
+def init_db():
+    """Pastikan schema terkini. Murah untuk dipanggil setiap rerun: selepas kali
+    pertama (setiap DB_NAME, setiap proses) ia tak sentuh DB langsung."""
+    if DB_NAME in _schema_ready:
+        return
+    with _schema_lock:
+        if DB_NAME not in _schema_ready:
+            migrate_db()
+            _schema_ready.add(DB_NAME)
+
+
+# =========================
+# ASSET STORE (fail content-addressed, mmap)
+# =========================
+# Bytes gambar disimpan sebagai fail <dir>/<sha[:2]>/<sha256>, bukan BLOB dalam
+# dinner.db - upload tak lagi membengkakkan WAL / page cache yang dikongsi
+# dengan check-in. Fail tak pernah diubah (nama = hash), jadi boleh di-mmap
+# & dikongsi antara proses tanpa salinan. Versi lama dibuang oleh gc_asset_store().
+# Hanya fail besar (asal) di-mmap - setiap mmap pegang satu fd; varian & highlight
+# kecil dibaca terus ke bytes. Kedua-duanya dalam satu cache LRU berhad.
+ASSET_GC_GRACE_S = 600      # fail tak dirujuk lebih lama dari ini dibuang oleh GC
+BLOB_MMAP_MIN_BYTES = 1 << 20   # fail lebih kecil dibaca ke bytes (tiada fd dipegang)
+BLOB_MMAP_MAX = 16              # mmap (fd) maksimum dalam cache
+BLOB_CACHE_BYTES = 64 << 20     # had jumlah bytes fail kecil dalam cache
+
+_blob_lru = {"items": collections.OrderedDict(), "bytes": 0, "maps": 0}   # sha -> bytes | memoryview(mmap)
+_blob_lock = threading.Lock()
+
+def asset_dir() -> str:
+    return os.environ.get("MAJLIS_ASSET_DIR") or (os.path.splitext(DB_NAME)[0] + "_assets")
+
+def _blob_path(sha: str) -> str:
+    return os.path.join(asset_dir(), sha[:2], sha)
+
+def sniff_mime(data) -> str:
+    head = bytes(data[:12])
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return "application/octet-stream"
+
+def blob_put(data) -> str:
+    """Simpan bytes (atomik: tulis .tmp, fsync, rename). Pulang sha256. Kandungan sama = fail sama."""
+    sha = hashlib.sha256(data).hexdigest()
+    path = _blob_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    return sha
+
+def _blob_forget(sha: str):
+    """Buang satu entri cache (dalam _blob_lock). mmap (& fd) ditutup bila rujukan terakhir hilang."""
+    lru = _blob_lru
+    data = lru["items"].pop(sha, None)
+    if data is None:
+        return
+    if isinstance(data, memoryview):
+        lru["maps"] -= 1
+    else:
+        lru["bytes"] -= len(data)
+
+def blob_view(sha: str):
+    """Kandungan fail: bytes (fail kecil) atau memoryview read-only atas mmap (fail besar).
+
+    None kalau fail tiada. Cache LRU: paling banyak BLOB_MMAP_MAX mmap &
+    BLOB_CACHE_BYTES bytes fail kecil.
+    """
+    if not sha:
+        return None
+    lru = _blob_lru
+    with _blob_lock:
+        data = lru["items"].get(sha)
+        if data is not None:
+            lru["items"].move_to_end(sha)
+            return data
+    try:
+        f = open(_blob_path(sha), "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < BLOB_MMAP_MIN_BYTES:
+            data = f.read()
+        else:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    with _blob_lock:
+        hit = lru["items"].get(sha)
+        if hit is not None:
+            return hit
+        lru["items"][sha] = data
+        if isinstance(data, memoryview):
+            lru["maps"] += 1
+        else:
+            lru["bytes"] += len(data)
+        while len(lru["items"]) > 1 and (lru["maps"] > BLOB_MMAP_MAX or lru["bytes"] > BLOB_CACHE_BYTES):
+            _blob_forget(next(iter(lru["items"])))
+    return data
+
+def asset_store_stats() -> dict:
+    """{files, bytes} asset store - stat sahaja (tiada query DB, tiada padam)."""
+    files = size = 0
+    for dirpath, _, names in os.walk(asset_dir()):
+        for name in names:
+            try:
+                size += os.stat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                continue
+            files += 1
+    return {"files": files, "bytes": size}
+
+def gc_asset_store(grace_s: float = ASSET_GC_GRACE_S) -> dict:
+    """Buang fail yang tiada rujukan dalam event_assets / asset_variants / layout_highlights.
+
+    grace_s melindungi fail yang baru ditulis tapi belum di-commit oleh proses lain.
+    """
+    with get_conn() as conn:
+        refs = set()
+        for kind in ASSET_KINDS:
+            refs.update(r[0] for r in conn.execute(f"SELECT {kind}_hash FROM event_assets"))
+        refs.update(r[0] for r in conn.execute("SELECT sha256 FROM asset_variants"))
+        refs.update(r[0] for r in conn.execute("SELECT sha256 FROM layout_highlights"))
+
+    root = asset_dir()
+    cutoff = time.time() - grace_s
+    kept = removed = kept_bytes = freed = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                st_ = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name in refs or st_.st_mtime > cutoff:
+                kept += 1
+                kept_bytes += st_.st_size
+                continue
+            os.remove(path)
+            with _blob_lock:
+                _blob_forget(name)
+            removed += 1
+            freed += st_.st_size
+    return {"files": kept, "bytes": kept_bytes, "removed": removed, "freed": freed}
+
+
+# =========================
+# ASSETS (Poster/Layout/Aturcara)
+# =========================
+@_process_singleton
+def _asset_cache():
+    """Cache assets peringkat proses (dikongsi semua sesi / rerun).
+
+    items: kind -> (versi, filename, data, updated_at). data = blob_view()
+    fail dalam asset store. Versi = hash kandungan. ("display", sha) -> salinan
+    bytes fail besar untuk st.image (disalin sekali sahaja).
+    """
+    return {"lock": threading.Lock(), "items": {}}
+
+def invalidate_asset_cache(kind: str = None):
+    cache = _asset_cache()
+    with cache["lock"]:
+        if kind is None:
+            cache["items"].clear()
+        else:
+            cache["items"].pop(kind, None)
+            cache["items"].pop(("variants", kind), None)
+            cache["items"].pop(("meta", kind), None)
+            for k in [k for k in cache["items"] if isinstance(k, tuple) and k[0] == "display"]:
+                del cache["items"][k]
+
+def blob_bytes(sha: str):
+    """bytes untuk st.image tanpa salinan setiap rerun: fail kecil memang bytes
+    (cache LRU); fail besar (mmap) disalin sekali & di-cache ikut hash."""
+    data = blob_view(sha)
+    if data is None or isinstance(data, bytes):
+        return data
+    key = ("display", sha)
+    cache = _asset_cache()
+    hit = cache["items"].get(key)
+    if hit is None:
+        hit = bytes(data)
+        with cache["lock"]:
+            cache["items"][key] = hit
+    return hit
+
+def build_asset_variants(data: bytes):
+    """Decode gambar sekali & jana varian kecil (WEBP + JPEG) ikut ASSET_VARIANT_WIDTHS.
+
+    Pulang list (fmt, width, height, bytes). Tak upscale gambar yang lebih kecil.
+    """
+    from PIL import Image, ImageOps   # lazy: hanya path upload perlukan PIL
+
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+
+    widths = sorted({min(w, img.width) for w in ASSET_VARIANT_WIDTHS})
+    out = []
+    for w in widths:
+        h = max(1, round(img.height * w / img.width))
+        im = img if w == img.width else img.resize((w, h), Image.LANCZOS)
+
+        buf = io.BytesIO()
+        im.save(buf, "WEBP", quality=80, method=4)
+        out.append(("WEBP", w, h, buf.getvalue()))
+
+        # JPEG fallback (tiada alpha -> latar putih)
+        if im.mode == "RGBA":
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=82, optimize=True, progressive=True)
+        out.append(("JPEG", w, h, buf.getvalue()))
+    return out
+
+@timed()
+def save_asset(kind: str, filename: str, data: bytes):
+    """kind: 'poster' | 'layout' | 'aturcara'"""
+    if kind not in ASSET_KINDS:
+        raise ValueError("Invalid kind for asset.")
+
+    upd = now_myt_str()
+    variants = build_asset_variants(data)
+
+    # fail ditulis dulu, baru DB dikemas kini -> DB tak pernah rujuk fail yang belum wujud
+    digest = blob_put(data)
+    vrows = [(kind, fmt, w, h, blob_put(b)) for fmt, w, h, b in variants]
+
+    with get_conn() as conn:
+        conn.execute(f"""
+            UPDATE event_assets
+            SET {kind}_filename = ?,
+                {kind}_bytes = NULL,
+                {kind}_hash = ?,
+                {kind}_mime = ?,
+                {kind}_size = ?,
+                updated_at = ?
+            WHERE id = 1
+        """, (filename, digest, sniff_mime(data), len(data), upd))
+        conn.execute("DELETE FROM asset_variants WHERE kind=?", (kind,))
+        conn.executemany("""
+            INSERT INTO asset_variants(kind, fmt, width, height, sha256)
+            VALUES (?, ?, ?, ?, ?)
+        """, vrows)
+        conn.commit()
+
+    invalidate_asset_cache(kind)
+    if kind == "layout":
+        build_layout_highlights()
+    gc_asset_store()
+
+def reset_assets() -> dict:
+    """Kosongkan semua asset (Maintenance). Fail dalam store dibuang terus oleh GC."""
+    cols = ", ".join(f"{k}_{c}=NULL" for k in ASSET_KINDS for c in ("filename", "bytes", "hash", "mime", "size"))
+    with get_conn() as conn:
+        conn.execute(f"UPDATE event_assets SET {cols}, updated_at=? WHERE id=1", (now_myt_str(),))
+        conn.execute("DELETE FROM asset_variants")
+        conn.execute("DELETE FROM layout_highlights")
+        conn.commit()
+    invalidate_asset_cache()
+    return gc_asset_store(grace_s=0)
+
+def get_asset_meta(kind: str):
+    """(filename, mime, size, updated_at) tanpa sentuh fail - untuk paparan status."""
+    if kind not in ASSET_KINDS:
+        return (None, None, None, None)
+    key = ("meta", kind)
+    cache = _asset_cache()
+    hit = cache["items"].get(key)
+    if hit is None:
+        with get_conn() as conn:
+            hit = conn.execute(f"""
+                SELECT {kind}_filename, {kind}_mime, {kind}_size, updated_at
+                FROM event_assets
+                WHERE id=1 AND {kind}_hash IS NOT NULL
+            """).fetchone() or (None, None, None, None)
+        with cache["lock"]:
+            cache["items"][key] = hit
+    return hit
+
+def get_asset_bytes(kind: str):
+    """Pulang (filename, data, updated_at) untuk satu kind. data = blob_view() (mmap untuk fail besar).
+
+    Baca dari cache proses; DB hanya disentuh bila cache kosong / invalidated,
+    dan hanya kolum kind tersebut yang di-SELECT.
+    """
+    if kind not in ASSET_KINDS:
+        return (None, None, None)
+
+    cache = _asset_cache()
+    hit = cache["items"].get(kind)
+    if hit is not None:
+        return hit[1:]
+
+    with cache["lock"]:
+        hit = cache["items"].get(kind)
+        if hit is not None:
+            return hit[1:]
+
+        with get_conn() as conn:
+            row = conn.execute(f"""
+                SELECT {kind}_filename, {kind}_hash, updated_at
+                FROM event_assets
+                WHERE id=1
+            """).fetchone()
+        if not row or not row[1]:
+            return (None, None, None)
+
+        fn, digest, upd = row
+        data = blob_view(digest)
+        cache["items"][kind] = (digest, fn, data, upd)
+        return (fn, data, upd)
+
+def get_asset_variants(kind: str):
+    """List (fmt, width, height, data, sha256) untuk satu kind (cache proses, data = blob_view())."""
+    key = ("variants", kind)
+    cache = _asset_cache()
+    hit = cache["items"].get(key)
+    if hit is not None:
+        return hit
+
+    with cache["lock"]:
+        hit = cache["items"].get(key)
+        if hit is not None:
+            return hit
+        with get_conn() as conn:
+            rows = conn.execute("""
+                SELECT fmt, width, height, sha256
+                FROM asset_variants
+                WHERE kind=?
+                ORDER BY width ASC
+            """, (kind,)).fetchall()
+        rows = [(fmt, w, h, blob_view(sha), sha) for fmt, w, h, sha in rows]
+        rows = [r for r in rows if r[3] is not None]
+        cache["items"][key] = rows
+        return rows
+
+@timed()
+def get_asset_display(kind: str, width: int = GUEST_IMAGE_WIDTH, fmt: str = "JPEG"):
+    """Pulang (bytes, fmt) untuk dipaparkan: varian terkecil yang lebar >= width.
+
+    Kalau tiada varian (asset lama sebelum varian wujud), guna bytes asal.
+    st.image hanya terima bytes (bukan memoryview) - blob_bytes() pulang objek
+    bytes yang sama setiap rerun, tiada salinan baru.
+    """
+    cands = [v for v in get_asset_variants(kind) if v[0] == fmt]
+    if cands:
+        best = next((v for v in cands if v[1] >= width), cands[-1])
+        return (blob_bytes(best[4]), fmt)
+
+    _, data, _ = get_asset_bytes(kind)
+    if not data:
+        return (None, None)
+    return (blob_bytes(_asset_cache()["items"][kind][0]), "auto")
+
+
+# =========================
+# LAYOUT HIGHLIGHT (satu gambar setiap meja)
+# =========================
+# Dibina semula bila layout atau table_map berubah. build_key setiap meja =
+# hash layout + (x, y, r) meja itu, jadi ubah satu koordinat hanya render
+# semula satu gambar. x / y / r dalam piksel gambar layout asal.
+LAYOUT_HL_WORKERS = min(8, os.cpu_count() or 1)
+LAYOUT_HL_MIN_R = 16        # px (selepas skala) supaya meja kecil tetap nampak
+LAYOUT_HL_DIM = 0.55        # kecerahan bahagian lain layout
+
+def _render_highlight(base, dim, scale, no_meja, x, y, r):
+    from PIL import Image, ImageDraw, ImageFont
+
+    cx, cy = x * scale, y * scale
+    rr = max(LAYOUT_HL_MIN_R, r * scale * 1.35)
+    box = (int(cx - rr), int(cy - rr), int(cx + rr) + 1, int(cy + rr) + 1)
+
+    img = dim.copy()
+    mask = Image.new("L", (box[2] - box[0], box[3] - box[1]), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, mask.width - 1, mask.height - 1), fill=255)
+    img.paste(base.crop(box), box[:2], mask)
+
+    d = ImageDraw.Draw(img)
+    d.ellipse(box, outline=(201, 162, 39), width=5)
+    d.ellipse((box[0] - 4, box[1] - 4, box[2] + 4, box[3] + 4), outline=(75, 31, 120), width=2)
+
+    # label "MEJA X" di atas bulatan (atau bawah kalau terlalu dekat tepi atas)
+    label = f"MEJA {no_meja}"
+    font = ImageFont.load_default(16)
+    tw = d.textlength(label, font=font) + 18
+    ly = box[1] - 34 if box[1] - 34 >= 0 else box[3] + 8
+    lx = min(max(0, cx - tw / 2), img.width - tw)
+    d.rounded_rectangle((lx, ly, lx + tw, ly + 26), radius=9, fill=(75, 31, 120))
+    d.text((lx + tw / 2, ly + 13), label, font=font, fill="white", anchor="mm")
+
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=82, optimize=True, progressive=True)
+    return buf.getvalue()
+
+def build_layout_highlights(force: bool = False, progress=None) -> dict:
+    """Pra-render layout dengan setiap meja ditanda. Hanya meja yang build_key berubah dirender.
+
+    Pulang {tables, built, cached, removed, seconds}.
+    """
+    t0 = time.perf_counter()
+    with get_conn() as conn:
+        # sha256 layout sudah disimpan masa upload - tak perlu baca & hash semula gambar
+        layout_sha = (conn.execute("SELECT layout_hash FROM event_assets WHERE id=1").fetchone() or (None,))[0]
+        rows = conn.execute("SELECT no_meja, x, y, r FROM table_map ORDER BY no_meja").fetchall()
+        existing = dict(conn.execute("SELECT no_meja, build_key FROM layout_highlights").fetchall())
+
+    if not layout_sha or not rows:
+        removed = clear_layout_highlights() if existing else 0
+        return {"tables": 0, "built": 0, "cached": 0, "removed": removed, "seconds": time.perf_counter() - t0}
+
+    keys = {m: f"{layout_sha[:16]}:{x},{y},{r}" for m, x, y, r in rows}
+    todo = [row for row in rows if force or existing.get(row[0]) != keys[row[0]]]
+    stale = [m for m in existing if m not in keys]
+
+    results = []
+    if todo:
+        from PIL import Image, ImageEnhance, ImageOps
+        from concurrent.futures import ThreadPoolExecutor
+
+        data = blob_view(layout_sha)
+        if data is None:
+            raise ValueError("Fail layout tiada dalam asset store. Sila upload semula layout.")
+        src = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+        scale = min(1.0, GUEST_IMAGE_WIDTH / src.width)
+        base = src if scale == 1.0 else src.resize(
+            (round(src.width * scale), max(1, round(src.height * scale))), Image.LANCZOS
+        )
+        dim = ImageEnhance.Brightness(base).enhance(LAYOUT_HL_DIM)
+
+        def one(row):
+            m, x, y, r = row
+            return (m, keys[m], base.width, base.height, blob_put(_render_highlight(base, dim, scale, m, x, y, r)))
+
+        # PIL lepaskan GIL semasa resize / encode JPEG -> thread cukup, tiada salin gambar ke proses lain
+        with ThreadPoolExecutor(max_workers=LAYOUT_HL_WORKERS) as pool:
+            for res in pool.map(one, todo):
+                results.append(res)
+                if progress:
+                    progress(len(results), len(todo))
+
+    with get_conn() as conn:
+        conn.executemany("DELETE FROM layout_highlights WHERE no_meja=?", [(m,) for m in stale])
+        conn.executemany("""
+            INSERT OR REPLACE INTO layout_highlights(no_meja, build_key, width, height, sha256)
+            VALUES (?, ?, ?, ?, ?)
+        """, results)
+        conn.commit()
+    _invalidate_highlights()
+
+    secs = time.perf_counter() - t0
+    if PERF_ENABLED:
+        perf_record("build_layout_highlights", secs)
+    return {"tables": len(rows), "built": len(results), "cached": len(rows) - len(results),
+            "removed": len(stale), "seconds": secs}
+
+def clear_layout_highlights() -> int:
+    """Padam semua highlight (reset layout / table map)."""
+    with get_conn() as conn:
+        n = conn.execute("DELETE FROM layout_highlights").rowcount
+        conn.commit()
+    _invalidate_highlights()
+    if n:
+        gc_asset_store()
+    return n
+
+def _invalidate_highlights():
+    cache = _asset_cache()
+    with cache["lock"]:
+        for k in [k for k in cache["items"] if isinstance(k, tuple) and k[0] == "hl"]:
+            del cache["items"][k]
+
+def get_layout_highlight(no_meja: str):
+    """(bytes, 'JPEG') layout dengan meja ini ditanda, atau (None, None) kalau belum dibina / tiada koordinat."""
+    key = ("hl", norm_meja(no_meja))
+    cache = _asset_cache()
+    sha = cache["items"].get(key)
+    if sha is None:
+        with get_conn() as conn:
+            row = conn.execute("SELECT sha256 FROM layout_highlights WHERE no_meja=?", (key[1],)).fetchone()
+        sha = (row and row[0]) or ""
+        with cache["lock"]:
+            cache["items"][key] = sha
+    data = blob_bytes(sha) if sha else None
+    return (data, "JPEG") if data else (None, None)
+
+def layout_highlight_count() -> int:
+    with get_conn() as conn:
+        return conn.execute("SELECT COUNT(*) FROM layout_highlights").fetchone()[0]
+
+
+# =========================
+# ROSTER INDEX (memori)
+# =========================
+ROSTER_SYNC_INTERVAL = 0.5   # saat; semak perubahan dari proses lain (API / UI lain)
+ROSTER_SYNC_INLINE = True    # False: lookup baca memori sahaja, pemanggil jalankan roster_sync() di latar (api.py)
+
+ROSTER_GEN_SQL = """
+    SELECT name, value FROM counters
+    WHERE name IN ('master_gen', 'attendance_gen', 'attendance_seq')
+"""
+
+@_process_singleton
+def _roster():
+    """Index roster peringkat proses (dikongsi semua sesi).
+
+    by_email: email -> (email, nama, gelaran, no_meja) - tuple sama yang
+              get_guest pulangkan, no_meja dah dinormalisasi.
+    hadir:    set email yang sudah check-in.
+    fuzzy:    index trigram untuk fuzzy_lookup (None = belum dibina).
+    gen:      counters master_gen / attendance_gen / attendance_seq yang sudah dimuat.
+    Dimuat sekali dari DB, kemudian dikemaskini terus oleh import_master,
+    writer check-in & reset Maintenance. Perubahan dari proses lain (api.py)
+    dikesan oleh _roster_sync() melalui counters generasi.
+    """
+    return {
+        "lock": threading.Lock(), "loaded": False, "by_email": {}, "hadir": set(), "fuzzy": None,
+        "gen": {}, "synced_at": 0.0,
+    }
+
+def _roster_index():
+    r = _roster()
+    if r["loaded"]:
+        if ROSTER_SYNC_INLINE and time.monotonic() - r["synced_at"] >= ROSTER_SYNC_INTERVAL:
+            _roster_sync(r)
+        return r
+    with r["lock"]:
+        if not r["loaded"]:
+            with get_conn() as conn:
+                gen = dict(conn.execute(ROSTER_GEN_SQL).fetchall())
+                rows = conn.execute("SELECT email, nama, gelaran, no_meja FROM master").fetchall()
+                hadir = conn.execute("SELECT email FROM attendance").fetchall()
+            r["by_email"] = {e: (e, n, g, norm_meja(m)) for e, n, g, m in rows}
+            r["hadir"] = {e for (e,) in hadir}
+            r["gen"] = gen
+            r["synced_at"] = time.monotonic()
+            r["loaded"] = True
+    return r
+
+def _roster_sync(r):
+    """Satu SELECT kecil atas counters; muat semula hanya bahagian yang berubah."""
+    r["synced_at"] = time.monotonic()
+    with get_conn() as conn:
+        gen = dict(conn.execute(ROSTER_GEN_SQL).fetchall())
+        old = r["gen"]
+
+        if gen.get("master_gen") != old.get("master_gen"):
+            rows = conn.execute("SELECT email, nama, gelaran, no_meja FROM master").fetchall()
+            by_email = {e: (e, n, g, norm_meja(m)) for e, n, g, m in rows}
+            with r["lock"]:
+                r["by_email"] = by_email
+                r["fuzzy"] = None
+
+        if gen.get("attendance_gen") != old.get("attendance_gen"):
+            hadir = {e for (e,) in conn.execute("SELECT email FROM attendance").fetchall()}
+            with r["lock"]:
+                r["hadir"] = hadir
+        elif gen.get("attendance_seq", 0) > old.get("attendance_seq", 0):
+            new = conn.execute(
+                "SELECT email FROM attendance WHERE seq > ?", (old.get("attendance_seq", 0),)
+            ).fetchall()
+            with r["lock"]:
+                r["hadir"].update(e for (e,) in new)
+    r["gen"] = gen
+
+def roster_sync():
+    """Muat / sync index roster sekarang (query DB; mungkin muat semula master penuh)."""
+    r = _roster_index()
+    if not ROSTER_SYNC_INLINE:
+        _roster_sync(r)
+
+def roster_stats() -> dict:
+    """Saiz index roster (memuatkan index kalau belum)."""
+    r = _roster_index()
+    return {"guests": len(r["by_email"]), "hadir": len(r["hadir"])}
+
+def reset_roster_index(master: bool = False, attendance: bool = False):
+    """Panggil selepas DELETE master / attendance."""
+    r = _roster()
+    with r["lock"]:
+        if master:
+            r["by_email"] = {}
+            r["fuzzy"] = None
+        if attendance:
+            r["hadir"] = set()
+
+
+# =========================
+# QR TOKEN (kad jemputan)
+# =========================
+# Token = MJ1.<email base64url>.<HMAC-SHA256 dipotong 12 bait>. Ditandatangan
+# dengan rahsia dalam settings (atau MAJLIS_QR_SECRET), jadi tak boleh dipalsukan
+# dan terus dipetakan ke email tanpa query tambahan.
+QR_TOKEN_PREFIX = "MJ1"
+QR_BASE_URL = os.environ.get("MAJLIS_PUBLIC_URL", "")   # cth https://daftar.uitm.my -> QR buka app terus
+
+_qr_secrets = {}   # DB_NAME -> bytes
+
+def _b64(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+def _qr_secret() -> bytes:
+    env = os.environ.get("MAJLIS_QR_SECRET")
+    if env:
+        return env.encode("utf-8")
+    key = _qr_secrets.get(DB_NAME)
+    if key is None:
+        with get_conn() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'qr_secret'").fetchone()
+        if not row:
+            raise ValueError("Rahsia QR tiada dalam settings - jalankan init_db().")
+        key = _qr_secrets[DB_NAME] = row[0].encode("ascii")
+    return key
+
+def qr_token(email: str) -> str:
+    e = norm_email(email)
+    sig = hmac.new(_qr_secret(), e.encode("utf-8"), hashlib.sha256).digest()[:12]
+    return f"{QR_TOKEN_PREFIX}.{_b64(e.encode('utf-8'))}.{_b64(sig)}"
+
+def qr_payload(email: str) -> str:
+    """Kandungan QR: URL app dengan ?t=token kalau MAJLIS_PUBLIC_URL diset, jika tidak token sahaja."""
+    token = qr_token(email)
+    return f"{QR_BASE_URL.rstrip('/')}/?t={token}" if QR_BASE_URL else token
+
+def resolve_token(token: str):
+    """Token sah -> email, selain itu None."""
+    parts = (token or "").strip().split(".")
+    if len(parts) != 3 or parts[0] != QR_TOKEN_PREFIX:
+        return None
+    try:
+        email = _unb64(parts[1]).decode("utf-8")
+        sig = _unb64(parts[2])
+    except ValueError:
+        return None
+    good = hmac.new(_qr_secret(), email.encode("utf-8"), hashlib.sha256).digest()[:12]
+    return email if hmac.compare_digest(sig, good) else None
+
+def parse_checkin_input(raw) -> str:
+    """Input kotak check-in / scanner: email, token QR atau URL ?t=token -> email (dinormalisasi)."""
+    text = (raw or "").strip() if isinstance(raw, str) else ""
+    if "t=" + QR_TOKEN_PREFIX + "." in text:
+        text = text.split("t=", 1)[1].split("&", 1)[0]
+    if text.startswith(QR_TOKEN_PREFIX + "."):
+        return resolve_token(text) or ""
+    return norm_email(text)
+
+
+# =========================
+# FUZZY EMAIL LOOKUP (trigram)
+# =========================
+FUZZY_MAX_DIST = 2        # had edit distance untuk cadangan
+FUZZY_CANDIDATES = 40     # calon (ikut bilangan trigram sepadan) sebelum kira Levenshtein
+FUZZY_STOP_RATIO = 0.10   # trigram yang ada dalam >10% email (cth '@ui', 'du.') diabaikan
+
+def _trigrams(s: str):
+    s = f"^{s}$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _levenshtein(a: str, b: str, max_dist: int) -> int:
+    """Edit distance dengan had; pulang max_dist + 1 kalau melebihi."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1]
+
+def build_fuzzy_index():
+    """Bina index trigram daripada roster (dipanggil oleh import_master)."""
+    r = _roster_index()
+    emails = list(r["by_email"])
+    postings = collections.defaultdict(lambda: array.array("I"))
+    for i, e in enumerate(emails):
+        for g in _trigrams(e):
+            postings[g].append(i)
+    with r["lock"]:
+        r["fuzzy"] = {"emails": emails, "grams": dict(postings)}
+    return r["fuzzy"]
+
+@timed()
+def fuzzy_lookup(email: str, limit: int = 3, max_dist: int = FUZZY_MAX_DIST):
+    """Cadangan email jemputan terdekat: list (email, nama, jarak), terdekat dahulu."""
+    q = norm_email(email)
+    if len(q) < 5:
+        return []
+    r = _roster_index()
+    idx = r["fuzzy"] or build_fuzzy_index()
+    emails, grams = idx["emails"], idx["grams"]
+    stop = max(50, int(len(emails) * FUZZY_STOP_RATIO))
+
+    counts = collections.Counter()
+    for g in _trigrams(q):
+        ids = grams.get(g)
+        if ids is not None and len(ids) <= stop:
+            counts.update(ids)
+
+    out = []
+    for i, _ in counts.most_common(FUZZY_CANDIDATES):
+        e = emails[i]
+        d = _levenshtein(q, e, max_dist)
+        if d <= max_dist:
+            guest = r["by_email"].get(e)
+            out.append((e, guest[1] if guest else "", d))
+    out.sort(key=lambda x: x[2])
+    return out[:limit]
+
+
+# =========================
+# GUEST SEARCH (FTS5, Admin)
+# =========================
+# Setiap perkataan dipadan sebagai awalan token dalam nama / gelaran / email /
+# no_meja ("ahm" -> Ahmad, "staff12" -> staff1234@..., "dr" -> Dr., "12" ->
+# meja 12, 120...). "meja:12" = no_meja tepat. Semua perkataan mesti padan (AND).
+# 'hadir' dicari terus dalam attendance_fts; 'belum' = padanan master tanpa
+# baris dalam master_hadir. Halaman guna keyset atas rowid (FTS5 pulang rowid
+# mengikut tertib & boleh seek), jadi halaman ke-500 sama murah dengan yang pertama.
+# Jumlah padanan guna predikat yang sama dengan halaman, di-cache ikut generasi data.
+GUEST_PAGE_SIZE = 50
+GUEST_SEARCH_COLS = ["email", "nama", "gelaran", "no_meja", "hadir_pada"]
+GUEST_COUNT_CACHE_MAX = 256
+
+def fts_query(query: str) -> str:
+    """Teks carian -> ungkapan MATCH FTS5 ('' kalau tiada perkataan)."""
+    parts = []
+    for t in (query or "").split():
+        if not any(ch.isalnum() for ch in t):
+            continue
+        if t.lower().startswith("meja:") and len(t) > 5:
+            parts.append('no_meja : "' + norm_meja(t[5:]).replace('"', '""') + '"')
+        else:
+            parts.append('"' + t.replace('"', '""') + '"*')
+    return " AND ".join(parts)
+
+@_process_singleton
+def _search_counts():
+    return {"lock": threading.Lock(), "gen": None, "counts": {}}
+
+@timed()
+def search_guests(query: str = "", status: str = "semua", after: int = 0, page_size: int = GUEST_PAGE_SIZE):
+    """Cari jemputan, satu halaman (tiada DataFrame penuh). Pulang (rows, jumlah padanan, kunci seterusnya).
+
+    rows = [(email, nama, gelaran, no_meja, hadir_pada)]; hadir_pada None kalau
+    belum check-in. status: 'semua' | 'hadir' | 'belum'. after = kunci dari
+    halaman sebelumnya (0 = halaman pertama); kunci seterusnya None kalau tiada lagi.
+    """
+    if status not in ("semua", "hadir", "belum"):
+        raise ValueError("Status carian tidak sah.")
+    match = fts_query(query)
+
+    if status == "hadir":
+        fts = "attendance_fts"
+        src, key = ("attendance_fts f JOIN attendance a ON a.rowid = f.rowid", "f.rowid") if match else ("attendance a", "a.rowid")
+        count_src = "attendance_fts f" if match else "attendance a"
+        cols = "a.email, a.nama, a.gelaran, a.no_meja, a.timestamp"
+    else:
+        fts = "master_fts"
+        src, key = ("master_fts f JOIN master m ON m.rowid = f.rowid", "f.rowid") if match else ("master m", "m.rowid")
+        count_src = "master_fts f" if match else "master m"
+        if status == "semua":
+            src += " LEFT JOIN attendance a ON a.email = m.email"
+            cols = "m.email, m.nama, m.gelaran, m.no_meja, a.timestamp"
+        else:
+            cols = "m.email, m.nama, m.gelaran, m.no_meja, NULL"
+
+    conds, params = [], []
+    if match:
+        conds.append(f"{fts} MATCH ?")
+        params.append(match)
+    if status == "belum":
+        conds.append(f"{key} NOT IN (SELECT rowid FROM master_hadir)")
+
+    with get_conn() as conn:
+        rows = conn.execute(f"""
+            SELECT {key}, {cols} FROM {src}
+            WHERE {" AND ".join(conds + [f"{key} > ?"])}
+            ORDER BY {key} LIMIT ?
+        """, (*params, after or 0, page_size + 1)).fetchall()
+        total = _search_total(conn, match, status, count_src, conds, params)
+
+    nxt = rows[page_size - 1][0] if len(rows) > page_size else None
+    return [r[1:] for r in rows[:page_size]], total, nxt
+
+def _search_total(conn, match, status, count_src, conds, params) -> int:
+    if not match:   # tanpa carian: counters + saiz master_hadir (tepat, O(1))
+        total, hadir, _ = count_stats()
+        if status == "semua":
+            return total
+        if status == "hadir":
+            return hadir
+        return total - conn.execute("SELECT COUNT(*) FROM master_hadir").fetchone()[0]
+
+    cache = _search_counts()
+    gen = tuple(sorted(conn.execute(ROSTER_GEN_SQL).fetchall()))
+    with cache["lock"]:
+        if cache["gen"] != gen or len(cache["counts"]) > GUEST_COUNT_CACHE_MAX:
+            cache["gen"], cache["counts"] = gen, {}
+        hit = cache["counts"].get((match, status))
+    if hit is None:
+        hit = conn.execute(f"SELECT COUNT(*) FROM {count_src} WHERE {' AND '.join(conds)}", params).fetchone()[0]
+        with cache["lock"]:
+            if cache["gen"] == gen:
+                cache["counts"][(match, status)] = hit
+    return hit
+
+
+# =========================
+# MASTER IMPORT
+# =========================
+def _clean_master(df: pd.DataFrame):
+    """Normalisasi vektor (pandas .str) - pulang (df baris sah, bil. ditolak). Belum buang duplikat."""
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+
+    required = ["Email", "Nama", "No_Meja"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Kolum wajib tiada: {missing}. Perlu: {required}")
+
+    if "Gelaran" not in df.columns:
+        df["Gelaran"] = ""
+
+    # sama seperti norm_email / norm_meja, tapi sekali gus untuk seluruh kolum
+    df["Email"] = df["Email"].fillna("").astype(str).str.strip().str.lower()
+    df["Nama"] = df["Nama"].fillna("").astype(str).str.strip()
+    df["Gelaran"] = df["Gelaran"].fillna("").astype(str).str.strip()
+    df["No_Meja"] = norm_meja_col(df["No_Meja"])
+
+    valid = df["Email"].str.len() > 3
+    return df.loc[valid, ["Email", "Nama", "Gelaran", "No_Meja"]], int((~valid).sum())
+
+def normalize_master(df: pd.DataFrame) -> pd.DataFrame:
+    df, _ = _clean_master(df)
+    return df.drop_duplicates(subset=["Email"], keep="last")
+
+def import_master(df: pd.DataFrame, replace: bool = False) -> dict:
+    return import_master_chunks([df], replace=replace)
+
+@timed("import_master")
+def import_master_chunks(chunks, replace: bool = False, progress=None) -> dict:
+    """Import master melalui staging table, satu batch DataFrame pada satu masa.
+
+    1) Setiap batch dinormalisasi & dimuat ke temp.master_staging
+       (executemany; temp DB - tak pegang write lock DB utama). Email berulang
+       (dalam batch atau merentas batch) -> baris terakhir menang, dup dikira.
+    2) Kira diff (baru / dikemaskini / dibuang) dengan SELECT sahaja.
+    3) Merge ke master dalam satu transaksi pendek. replace=True juga buang
+       jemputan yang tiada dalam fail (swap penuh).
+    progress(n) dipanggil selepas setiap batch (n = jumlah baris dibaca setakat ini).
+    Pulang ringkasan untuk dipaparkan di Admin.
+    """
+    read = rejected = 0
+
+    with get_conn() as conn:
+        conn.execute("DROP TABLE IF EXISTS temp.master_staging")
+        conn.execute("""
+            CREATE TEMP TABLE master_staging (
+                email TEXT PRIMARY KEY,
+                nama TEXT,
+                gelaran TEXT,
+                no_meja TEXT,
+                dup INTEGER DEFAULT 0
+            )""")
+        for chunk in chunks:
+            clean, rej = _clean_master(chunk)
+            read += len(chunk)
+            rejected += rej
+            conn.executemany("""
+                INSERT INTO temp.master_staging(email, nama, gelaran, no_meja)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET
+                  nama=excluded.nama,
+                  gelaran=excluded.gelaran,
+                  no_meja=excluded.no_meja,
+                  dup=dup + 1
+            """, clean.itertuples(index=False, name=None))
+            conn.commit()
+            if progress:
+                progress(read)
+
+        rows = conn.execute("SELECT COUNT(*) FROM temp.master_staging").fetchone()[0]
+        duplicates = [e for (e,) in conn.execute("SELECT email FROM temp.master_staging WHERE dup > 0")]
+        added = conn.execute("""
+            SELECT s.email, s.no_meja FROM temp.master_staging s
+            LEFT JOIN master m ON m.email = s.email
+            WHERE m.email IS NULL
+        """).fetchall()
+        updated = conn.execute("""
+            SELECT s.email, s.no_meja, m.no_meja FROM temp.master_staging s
+            JOIN master m ON m.email = s.email
+            WHERE m.nama IS NOT s.nama OR m.gelaran IS NOT s.gelaran OR m.no_meja IS NOT s.no_meja
+        """).fetchall()
+        removed = conn.execute("""
+            SELECT m.email, m.no_meja FROM master m
+            WHERE m.email NOT IN (SELECT email FROM temp.master_staging)
+        """).fetchall() if replace else []
+
+        conn.execute("""
+            INSERT INTO master(email, nama, gelaran, no_meja)
+            SELECT email, nama, gelaran, no_meja FROM temp.master_staging WHERE true
+            ON CONFLICT(email) DO UPDATE SET
+              nama=excluded.nama,
+              gelaran=excluded.gelaran,
+              no_meja=excluded.no_meja
+            WHERE master.nama IS NOT excluded.nama
+               OR master.gelaran IS NOT excluded.gelaran
+               OR master.no_meja IS NOT excluded.no_meja
+        """)
+        if replace:
+            conn.execute("DELETE FROM master WHERE email NOT IN (SELECT email FROM temp.master_staging)")
+        conn.commit()
+
+        r = _roster_index()
+        cur = conn.execute("SELECT email, nama, gelaran, no_meja FROM temp.master_staging")
+        while True:
+            batch = cur.fetchmany(IMPORT_CHUNK_ROWS)
+            if not batch:
+                break
+            with r["lock"]:
+                r["by_email"].update((e, (e, n, g, m)) for e, n, g, m in batch)
+        with r["lock"]:
+            for e, _ in removed:
+                r["by_email"].pop(e, None)
+        # index dah dikemaskini terus - elak _roster_sync muat semula master
+        gen = conn.execute("SELECT value FROM counters WHERE name = 'master_gen'").fetchone()
+        r["gen"] = {**r["gen"], "master_gen": gen[0] if gen else None}
+        conn.execute("DROP TABLE IF EXISTS temp.master_staging")
+    build_fuzzy_index()
+
+    tables = {m for _, m in added} | {m for _, m, _ in updated} | {m for _, _, m in updated} | {m for _, m in removed}
+    return {
+        "rows": rows,
+        "added": len(added),
+        "updated": len(updated),
+        "unchanged": rows - len(added) - len(updated),
+        "removed": len(removed),
+        "rejected": rejected,
+        "duplicates": duplicates,
+        "tables": sorted(t for t in tables if t),
+    }
+
+@timed()
+def get_guest(email: str):
+    """Lookup roster dalam memori (tiada query SQLite)."""
+    email = norm_email(email)
+    if not email:
+        return None
+    return _roster_index()["by_email"].get(email)
+
+def already_checked_in(email: str) -> bool:
+    return email in _roster_index()["hadir"]
+
+def submit_checkin(row) -> Future:
+    """Hantar check-in ke writer (group commit) tanpa tunggu.
+
+    Future selesai dengan timestamp rekod selepas commit. Check-in serentak
+    untuk email yang sama berkongsi Future yang sama (satu tulisan sahaja).
+    """
+    dt = datetime.now(TZ)
+    now = dt.strftime("%Y-%m-%d %H:%M:%S")
+    email, nama, gelaran, no_meja = row
+    no_meja = norm_meja(no_meja)
+    w = _checkin_writer()
+    with w["lock"]:
+        fut = w["inflight"].get(email)
+        if fut is not None:
+            return fut
+        fut = w["inflight"][email] = Future()
+    w["q"].put(((email, now, nama, gelaran, no_meja, int(dt.timestamp())), fut, time.perf_counter()))
+    return fut
+
+@timed()
+def confirm_checkin(row):
+    """Hantar check-in ke writer & tunggu sampai rekod durable. Pulang timestamp."""
+    return submit_checkin(row).result(timeout=30)
+
+@timed()
+def count_stats():
+    """(total, hadir, belum) - satu bacaan jadual counters (tiada COUNT(*))."""
+    with get_conn() as conn:
+        c = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    total, hadir = c.get("master", 0), c.get("attendance", 0)
+    return total, hadir, max(total - hadir, 0)
+
+@timed()
+def table_stats() -> pd.DataFrame:
+    """Jemputan & kehadiran ikut no_meja (dari table_counters)."""
+    with get_conn() as conn:
+        return pd.read_sql("""
+            SELECT no_meja, total, hadir, MAX(total - hadir, 0) AS belum
+            FROM table_counters
+            WHERE total > 0 OR hadir > 0
+            ORDER BY no_meja ASC
+        """, conn)
+
+@timed()
+def load_attendance():
+    with get_conn() as conn:
+        return pd.read_sql(
+            "SELECT email, timestamp, nama, no_meja FROM attendance ORDER BY seq DESC",
+            conn
+        )
+
+
+# =========================
+# ATTENDANCE FEED (dashboard: incremental + pagination)
+# =========================
+ATTENDANCE_PAGE_SIZE = 200
+ATTENDANCE_COLS = ["seq", "email", "timestamp", "nama", "no_meja"]
+
+def fetch_attendance_since(after_seq: int, limit: int = 1000):
+    """Rekod dengan seq > after_seq (guna index seq), lama -> baru."""
+    with get_conn() as conn:
+        return conn.execute("""
+            SELECT seq, email, timestamp, nama, no_meja FROM attendance
+            WHERE seq > ? ORDER BY seq ASC LIMIT ?
+        """, (after_seq, limit)).fetchall()
+
+@timed()
+def fetch_attendance_page(page: int, page_size: int = ATTENDANCE_PAGE_SIZE):
+    """Satu halaman (1 = terkini) ikut seq DESC."""
+    with get_conn() as conn:
+        return conn.execute("""
+            SELECT seq, email, timestamp, nama, no_meja FROM attendance
+            ORDER BY seq DESC LIMIT ? OFFSET ?
+        """, (page_size, (max(page, 1) - 1) * page_size)).fetchall()
+
+@timed()
+def attendance_feed(feed: dict, size: int = ATTENDANCE_PAGE_SIZE):
+    """Kemaskini feed (simpan dalam session_state) dengan check-in baru sahaja.
+
+    feed: {'cursor': seq terakhir dilihat, 'count': bil. attendance dijangka,
+           'rows': dict email -> row (terkini di hujung)}.
+    Kalau bilangan tak sepadan (reset / rekod dibuang / re-confirm rekod lama),
+    muat semula halaman pertama sahaja. Pulang list row, terkini dahulu.
+    """
+    with get_conn() as conn:
+        conn.execute("BEGIN")   # snapshot sama untuk counter & rekod baru
+        try:
+            count = conn.execute("SELECT value FROM counters WHERE name = 'attendance'").fetchone()
+            count = count[0] if count else 0
+            new = conn.execute("""
+                SELECT seq, email, timestamp, nama, no_meja FROM attendance
+                WHERE seq > ? ORDER BY seq ASC LIMIT ?
+            """, (feed.get("cursor", 0), size + 1)).fetchall() if "rows" in feed else None
+        finally:
+            conn.rollback()
+
+    if new is not None and len(new) <= size:
+        rows = feed["rows"]
+        added = 0
+        for r in new:
+            if r[1] in rows:
+                del rows[r[1]]
+            else:
+                added += 1
+            rows[r[1]] = r
+        if feed["count"] + added == count:
+            feed["count"] = count
+            if new:
+                feed["cursor"] = new[-1][0]
+            while len(rows) > size:
+                del rows[next(iter(rows))]
+            return list(reversed(rows.values()))
+
+    latest = fetch_attendance_page(1, size)
+    feed["rows"] = {r[1]: r for r in reversed(latest)}
+    feed["cursor"] = latest[0][0] if latest else 0
+    feed["count"] = count
+    return latest
+
+
+# =========================
+# LIVE DASHBOARD (poll murah, query bila berubah)
+# =========================
+# Setiap skrin dashboard poll dashboard_snapshot() berkala. Semakan dibuat
+# sekali setiap proses setiap DASH_POLL_INTERVAL, dua peringkat:
+#   1. PRAGMA data_version pada connection khas (tak pernah menulis) - berubah
+#      bila mana-mana connection / proses lain commit. Kos ~mikrosaat.
+#   2. Kalau berubah, baca jadual counters (satu SELECT kecil). Counter
+#      attendance_seq / master_gen / winners dll. naik untuk setiap perubahan
+#      yang dipapar; commit lain (upload asset, table map) diabaikan.
+# Snapshot (stats, meja, halaman pertama kehadiran) dibina semula hanya bila
+# counters berubah, dan dikongsi semua sesi - N skrin = satu set query.
+DASH_POLL_INTERVAL = 1.0    # saat
+DASH_REFRESH_S = 2          # default run_every fragment dashboard
+
+@_process_singleton
+def _dash():
+    return {"lock": threading.Lock(), "conn": None, "data_version": None, "counters": None,
+            "gen": 0, "checked_at": 0.0, "snap": None, "feed": {}, "polls": 0, "queries": 0}
+
+def dashboard_version() -> int:
+    """Generation dashboard semasa - naik hanya bila data yang dipapar berubah."""
+    d = _dash()
+    now = time.monotonic()
+    if now - d["checked_at"] < DASH_POLL_INTERVAL:
+        return d["gen"]
+    with d["lock"]:
+        if now - d["checked_at"] < DASH_POLL_INTERVAL:
+            return d["gen"]
+        if d["conn"] is None:
+            d["conn"] = _open_conn()
+        d["polls"] += 1
+        dv = d["conn"].execute("PRAGMA data_version").fetchone()[0]
+        if dv != d["data_version"]:
+            d["data_version"] = dv
+            counters = tuple(d["conn"].execute("SELECT name, value FROM counters ORDER BY name").fetchall())
+            if counters != d["counters"]:
+                d["counters"] = counters
+                d["gen"] += 1
+        d["checked_at"] = time.monotonic()
+        return d["gen"]
+
+def dashboard_snapshot() -> dict:
+    """{gen, total, hadir, belum, tables, latest, at} - dibina semula hanya bila gen berubah."""
+    gen = dashboard_version()
+    d = _dash()
+    snap = d["snap"]
+    if snap is not None and snap["gen"] == gen:
+        return snap
+    with d["lock"]:
+        snap = d["snap"]
+        if snap is not None and snap["gen"] == gen:
+            return snap
+        total, hadir, belum = count_stats()
+        snap = {
+            "gen": gen,
+            "total": total,
+            "hadir": hadir,
+            "belum": belum,
+            "tables": table_stats(),
+            "latest": attendance_feed(d["feed"]),
+            "at": now_myt_str(),
+        }
+        d["snap"] = snap
+        d["queries"] += 1
+        return snap
+
+def dashboard_stats() -> dict:
+    d = _dash()
+    return {"gen": d["gen"], "polls": d["polls"], "rebuilds": d["queries"]}
+
+
+# =========================
+# ARRIVAL ANALYTICS (bucket seminit + ramalan)
+# =========================
+# Chart & ramalan hanya baca arrival_buckets (dikemas kini trigger), tak
+# pernah imbas attendance. Hasil di-cache ikut generation dashboard + minit
+# semasa, jadi banyak skrin / refresh = satu query.
+ARRIVAL_WINDOW_MIN = 120    # minit sejarah dalam chart
+ARRIVAL_HORIZON_MIN = 30    # minit ramalan
+ARRIVAL_FIT_MIN = 60        # minit terakhir (lengkap) untuk model
+ARRIVAL_ALPHA = 0.4         # Holt: pemberat level
+ARRIVAL_BETA = 0.2          # Holt: pemberat trend
+ARRIVAL_DAMP = 0.9          # trend dilemahkan setiap minit ke depan
+ARRIVAL_DESK_SERVICE_S = 20 # saat setiap tetamu di satu kaunter
+ARRIVAL_DESK_UTIL = 0.8     # sasaran penggunaan kaunter
+ARRIVAL_TARGET = 0.9        # ETA bila kehadiran capai peratus ini
+
+def _holt_forecast(series, horizon: int):
+    """Holt (trend dilemahkan) atas kiraan seminit. Pulang (level, trend, ramalan[horizon])."""
+    if not series:
+        return 0.0, 0.0, [0.0] * horizon
+    level, trend = float(series[0]), 0.0
+    for x in series[1:]:
+        prev = level
+        level = ARRIVAL_ALPHA * x + (1 - ARRIVAL_ALPHA) * (level + trend)
+        trend = ARRIVAL_BETA * (level - prev) + (1 - ARRIVAL_BETA) * trend
+    out, damp = [], 0.0
+    for h in range(1, horizon + 1):
+        damp += ARRIVAL_DAMP ** h
+        out.append(max(0.0, level + damp * trend))
+    return level, trend, out
+
+def _arrival_counts(conn, no_meja: str, start: int, end: int) -> list:
+    """Kiraan seminit [start, end] (termasuk minit kosong = 0)."""
+    got = dict(conn.execute("""
+        SELECT minute, n FROM arrival_buckets
+        WHERE no_meja = ? AND minute BETWEEN ? AND ?
+    """, (no_meja, start, end)).fetchall())
+    return [got.get(m, 0) for m in range(start, end + 1)]
+
+@timed()
+def arrival_forecast(no_meja: str = None, window: int = ARRIVAL_WINDOW_MIN, horizon: int = ARRIVAL_HORIZON_MIN) -> dict:
+    """Siri ketibaan seminit + ramalan jangka pendek (keseluruhan atau satu meja).
+
+    Pulang {minutes, actual, forecast_minutes, forecast, rate, trend, expected,
+    belum, belum_forecast, eta_target_min, desks, at}. minutes = epoch // 60.
+    """
+    key = norm_meja(no_meja) if no_meja else "*"
+    now_min = int(time.time()) // 60
+    gen = dashboard_version()
+    d = _dash()
+    cache = d.setdefault("arrivals", {})
+    ck = (gen, now_min, key, window, horizon)
+    hit = cache.get(ck)
+    if hit is not None:
+        return hit
+
+    start = now_min - max(window, ARRIVAL_FIT_MIN)
+    with get_conn() as conn:
+        counts = _arrival_counts(conn, key, start, now_min)
+        if key == "*":
+            total, hadir, belum = count_stats()
+        else:
+            row = conn.execute("SELECT total, hadir FROM table_counters WHERE no_meja = ?", (key,)).fetchone()
+            total, hadir = row if row else (0, 0)
+            belum = max(total - hadir, 0)
+
+    # minit semasa belum lengkap - tak dimasukkan dalam model
+    level, trend, fc = _holt_forecast(counts[-ARRIVAL_FIT_MIN - 1:-1], horizon)
+    cum, belum_fc, eta = 0.0, [], None
+    target = ARRIVAL_TARGET * total
+    for h, x in enumerate(fc, 1):
+        cum = min(cum + x, belum)
+        belum_fc.append(belum - cum)
+        if eta is None and total and hadir + cum >= target:
+            eta = h
+    if total and hadir >= target:
+        eta = 0
+    peak = max([level] + fc)
+    res = {
+        "minutes": list(range(now_min - window, now_min + 1)),
+        "actual": counts[-window - 1:],
+        "forecast_minutes": list(range(now_min + 1, now_min + horizon + 1)),
+        "forecast": fc,
+        "rate": level,
+        "trend": trend,
+        "expected": cum,
+        "total": total,
+        "hadir": hadir,
+        "belum": belum,
+        "belum_forecast": belum_fc,
+        "eta_target_min": eta,
+        "desks": max(1, int(-(-peak * ARRIVAL_DESK_SERVICE_S // (60 * ARRIVAL_DESK_UTIL)))) if peak > 0 else 0,
+        "at": now_myt_str(),
+    }
+    with d["lock"]:
+        if any(k[0] != gen or k[1] != now_min for k in cache):
+            cache.clear()
+        cache[ck] = res
+    return res
+
+@timed()
+def arrivals_by_table(last_min: int = 15) -> pd.DataFrame:
+    """Ketibaan setiap meja dalam last_min minit terakhir + baki belum hadir (bucket & table_counters sahaja)."""
+    since = int(time.time()) // 60 - last_min + 1
+    with get_conn() as conn:
+        return pd.read_sql("""
+            SELECT b.no_meja, SUM(b.n) AS tiba, MAX(t.total - t.hadir, 0) AS belum
+            FROM arrival_buckets b
+            LEFT JOIN table_counters t ON t.no_meja = b.no_meja
+            WHERE b.minute >= ? AND b.no_meja != '*'
+            GROUP BY b.no_meja
+            ORDER BY tiba DESC, b.no_meja
+        """, conn, params=(since,))
+
+
+# =========================
+# CHECK-IN WRITER (group commit)
+# =========================
+CHECKIN_BATCH_MAX = 64          # had rekod setiap commit
+CHECKIN_BATCH_WINDOW = 0.020    # saat: masa maksimum kumpul batch selepas request pertama
+
+SQL_UPSERT_ATTENDANCE = """
+    INSERT INTO attendance(email, timestamp, nama, gelaran, no_meja, ts_epoch, seq)
+    VALUES (?, ?, ?, ?, ?, ?, (SELECT value + 1 FROM counters WHERE name = 'attendance_seq'))
+    ON CONFLICT(email) DO UPDATE SET
+      timestamp=excluded.timestamp,
+      nama=excluded.nama,
+      gelaran=excluded.gelaran,
+      no_meja=excluded.no_meja,
+      ts_epoch=excluded.ts_epoch,
+      seq=excluded.seq
+"""
+
+SQL_APPEND_CHANGELOG = """
+    INSERT INTO changelog(email, timestamp, nama, gelaran, no_meja) VALUES (?, ?, ?, ?, ?)
+"""
+
+@_process_singleton
+def _checkin_writer():
+    """Satu writer thread untuk semua sesi: kumpul check-in & commit secara batch.
+
+    Setiap item dalam queue: (params, Future, masa enqueue). Future di-set
+    selepas commit, jadi caller hanya sambung bila rekod dah durable.
+    """
+    w = {
+        "q": queue.Queue(),
+        "lock": threading.Lock(),
+        "committed": 0,
+        "batches": 0,
+        "errors": 0,
+        "lat": collections.deque(maxlen=2000),      # saat, enqueue -> ack
+        "done_at": collections.deque(maxlen=5000),  # monotonic, setiap rekod
+        "inflight": {},                             # email -> Future (belum commit)
+    }
+    conn = _open_conn()
+    # DB_PRAGMAS guna NORMAL (WAL hanya fsync masa checkpoint). Writer ini ack
+    # 'durable', jadi WAL mesti di-fsync pada setiap commit - kos dikongsi satu batch.
+    conn.execute("PRAGMA synchronous=FULL")
+    threading.Thread(target=_checkin_writer_loop, args=(w, conn), name="checkin-writer", daemon=True).start()
+    return w
+
+def _checkin_writer_loop(w, conn):
+    q = w["q"]
+    while True:
+        batch = [q.get()]
+        deadline = time.monotonic() + CHECKIN_BATCH_WINDOW
+        while len(batch) < CHECKIN_BATCH_MAX:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(q.get(timeout=left))
+            except queue.Empty:
+                break
+
+        t_commit = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(SQL_UPSERT_ATTENDANCE, [params for params, _, _ in batch])
+                if KIOSK_ID:
+                    conn.executemany(SQL_APPEND_CHANGELOG, [params[:5] for params, _, _ in batch])
+        except Exception as e:
+            if PERF_ENABLED:
+                perf_record("checkin_commit", time.perf_counter() - t_commit, e)
+            with w["lock"]:
+                w["errors"] += len(batch)
+                for params, _, _ in batch:
+                    w["inflight"].pop(params[0], None)
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            continue
+
+        t_done = time.perf_counter()
+        t_mono = time.monotonic()
+        if PERF_ENABLED:
+            perf_record("checkin_commit", t_done - t_commit)
+        r = _roster()
+        if r["loaded"]:
+            with r["lock"]:
+                r["hadir"].update(params[0] for params, _, _ in batch)
+        _dash()["checked_at"] = 0.0     # check-in proses ini terus nampak pada dashboard
+        with w["lock"]:
+            w["committed"] += len(batch)
+            w["batches"] += 1
+            for params, _, t0 in batch:
+                w["lat"].append(t_done - t0)
+                w["done_at"].append(t_mono)
+                w["inflight"].pop(params[0], None)
+        for params, fut, _ in batch:
+            fut.set_result(params[1])
+
+def checkin_writer_stats(window_s: float = 10.0) -> dict:
+    """Statistik writer untuk tuning: throughput (rekod/s dalam window) & latency."""
+    w = _checkin_writer()
+    with w["lock"]:
+        lat = sorted(w["lat"])
+        done = list(w["done_at"])
+        committed, batches, errors = w["committed"], w["batches"], w["errors"]
+
+    cutoff = time.monotonic() - window_s
+    recent = sum(1 for t in done if t >= cutoff)
+
+    def pct(p):
+        return (lat[min(len(lat) - 1, int(len(lat) * p))] * 1000) if lat else 0.0
+
+    return {
+        "committed": committed,
+        "batches": batches,
+        "avg_batch": (committed / batches) if batches else 0.0,
+        "errors": errors,
+        "queue": w["q"].qsize(),
+        "rate": recent / window_s,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+
+
+# =========================
+# ADMISSION CONTROL (rate limit + admission queue)
+# =========================
+# Dua lapis di depan lookup & confirm:
+#  1. token bucket setiap client (sesi Streamlit; kiosk id / IP untuk API) - tap
+#     berulang ditolak serta-merta tanpa sentuh DB. Op "api_*" ada had sendiri
+#     yang jauh lebih longgar: satu kiosk / scanner imbas berterusan;
+#  2. gate global: paling banyak ADMIT_MAX_ACTIVE op serentak, selebihnya beratur
+#     (maks ADMIT_QUEUE_MAX) sehingga ADMIT_WAIT_S. Queue penuh / tunggu terlalu
+#     lama -> Busy, caller papar "sila tunggu" dan bukan bertimbun di belakang SQLite.
+RATE_LIMITS = {            # op -> (burst, token sesaat)
+    "lookup": (10, 1.0),
+    "confirm": (5, 0.5),
+    "api_lookup": (600, 200.0),
+    "api_confirm": (1000, 200.0),   # /confirm/batch dicaj satu token setiap email
+}
+RATE_MAX_CLIENTS = 5000    # bucket idle dibuang bila melebihi had ini
+ADMIT_MAX_ACTIVE = 16
+ADMIT_QUEUE_MAX = 64
+ADMIT_WAIT_S = 3.0
+
+
+class Busy(Exception):
+    """Permintaan ditolak oleh rate limit / admission queue. retry_after dalam saat."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason                  # "rate" | "queue_full" | "timeout"
+        self.retry_after = max(retry_after, 0.1)
+
+
+@_process_singleton
+def _admission():
+    return {
+        "cond": threading.Condition(),
+        "active": 0,
+        "waiting": 0,
+        "peak_waiting": 0,
+        "buckets": {},                              # (client, op) -> [token, masa monotonic]
+        "admitted": collections.Counter(),          # op -> n
+        "rejected": collections.Counter(),          # (op, reason) -> n
+        "waits": collections.deque(maxlen=2000),    # saat beratur (yang diterima sahaja)
+    }
+
+def rate_limit(client: str, op: str, cost: float = 1.0):
+    """Ambil token dari bucket (client, op). Raise Busy('rate') kalau tak cukup."""
+    burst, per_s = RATE_LIMITS[op]
+    a = _admission()
+    now = time.monotonic()
+    with a["cond"]:
+        b = a["buckets"].get((client, op))
+        if b is None:
+            if len(a["buckets"]) >= RATE_MAX_CLIENTS:
+                idle = [k for k, (tok, t) in a["buckets"].items()
+                        if tok + (now - t) * RATE_LIMITS[k[1]][1] >= RATE_LIMITS[k[1]][0]]
+                for k in idle:
+                    del a["buckets"][k]
+            b = a["buckets"][(client, op)] = [float(burst), now]
+        b[0] = min(burst, b[0] + (now - b[1]) * per_s)
+        b[1] = now
+        if b[0] < cost:
+            a["rejected"][(op, "rate")] += 1
+            raise Busy("rate", (cost - b[0]) / per_s)
+        b[0] -= cost
+
+@contextlib.contextmanager
+def admit(op: str, client: str = None, wait_s: float = ADMIT_WAIT_S, cost: float = 1.0):
+    """Context manager: rate limit (kalau client diberi, caj `cost` token) + satu slot gate global.
+
+    wait_s=0 -> tak beratur (untuk event loop API yang tak boleh blok).
+    """
+    if client is not None:
+        rate_limit(client, op, cost)
+    a = _admission()
+    cond = a["cond"]
+    t0 = time.monotonic()
+    with cond:
+        if a["active"] >= ADMIT_MAX_ACTIVE:
+            if wait_s <= 0 or a["waiting"] >= ADMIT_QUEUE_MAX:
+                a["rejected"][(op, "queue_full")] += 1
+                raise Busy("queue_full", 1.0)
+            a["waiting"] += 1
+            a["peak_waiting"] = max(a["peak_waiting"], a["waiting"])
+            try:
+                ok = cond.wait_for(lambda: a["active"] < ADMIT_MAX_ACTIVE, timeout=wait_s)
+            finally:
+                a["waiting"] -= 1
+            if not ok:
+                a["rejected"][(op, "timeout")] += 1
+                raise Busy("timeout", 1.0)
+        a["active"] += 1
+        a["admitted"][op] += 1
+        a["waits"].append(time.monotonic() - t0)
+    try:
+        yield
+    finally:
+        with cond:
+            a["active"] -= 1
+            cond.notify()
+
+def admission_stats() -> dict:
+    """Kedalaman queue, bilangan diterima/ditolak setiap op & masa tunggu (ms)."""
+    a = _admission()
+    with a["cond"]:
+        waits = sorted(a["waits"])
+        admitted = dict(a["admitted"])
+        rejected = dict(a["rejected"])
+        out = {
+            "active": a["active"],
+            "waiting": a["waiting"],
+            "peak_waiting": a["peak_waiting"],
+            "clients": len({c for c, _ in a["buckets"]}),
+        }
+
+    def pct(p):
+        return (waits[min(len(waits) - 1, int(len(waits) * p))] * 1000) if waits else 0.0
+
+    out.update({
+        "max_active": ADMIT_MAX_ACTIVE,
+        "queue_max": ADMIT_QUEUE_MAX,
+        "wait_p50_ms": pct(0.50),
+        "wait_p99_ms": pct(0.99),
+        "wait_max_ms": (waits[-1] * 1000) if waits else 0.0,
+        "ops": [
+            {
+                "op": op,
+                "diterima": admitted.get(op, 0),
+                "rate_limit": rejected.get((op, "rate"), 0),
+                "queue_penuh": rejected.get((op, "queue_full"), 0),
+                "timeout": rejected.get((op, "timeout"), 0),
+            }
+            for op in RATE_LIMITS
+        ],
+    })
+    return out
+
+def admission_reset():
+    """Kosongkan kaunter & sampel tunggu (bucket client dikekalkan)."""
+    a = _admission()
+    with a["cond"]:
+        a["admitted"].clear()
+        a["rejected"].clear()
+        a["waits"].clear()
+        a["peak_waiting"] = a["waiting"]
+
+
+# =========================
+# LUCKY DRAW
+# =========================
+DRAW_PROBES = 64   # cubaan seq rawak (tanpa penapis) sebelum ambil senarai seq layak
+
+@timed()
+def draw_winners(n: int = 1, prize: str = "", no_meja=None, gelaran=None, seed=None) -> dict:
+    """Cabut n pemenang secara rawak seragam daripada (attendance - winners).
+
+    Tanpa penapis & pool padat: pilih seq rawak dalam [MIN(seq), MAX(seq)] dan
+    ambil rekod itu kalau layak (lookup index). Bila ada penapis meja / gelaran,
+    atau probe gagal (ramai dah menang), seq layak dibaca SEKALI bagi setiap
+    cabutan (index (no_meja, seq) / (gelaran, seq) - hanya set bertapis) dan
+    disampel dalam Python tanpa ulang. Semua dalam satu transaksi BEGIN
+    IMMEDIATE + PK winners.email, jadi dua skrin admin tak boleh award orang
+    yang sama. RNG = random.Random(seed); seed disimpan dalam jadual draws
+    untuk audit / ulang semula.
+    """
+    seed = str(seed).strip() if seed not in (None, "") else str(secrets.randbits(64))
+    rng = random.Random(seed)
+    no_meja = [norm_meja(m) for m in (no_meja or []) if norm_meja(m)]
+    gelaran = [str(g).strip() for g in (gelaran or []) if str(g).strip()]
+
+    cond = ["NOT EXISTS (SELECT 1 FROM winners w WHERE w.email = a.email)"]
+    params = []
+    if no_meja:
+        cond.append(f"a.no_meja IN ({','.join('?' * len(no_meja))})")
+        params += no_meja
+    if gelaran:
+        cond.append(f"a.gelaran IN ({','.join('?' * len(gelaran))})")
+        params += gelaran
+    cond = " AND ".join(cond)
+    cols = "a.email, a.nama, a.gelaran, a.no_meja"
+
+    picked = []
+    pool = None     # seq layak (dibaca sekali), None = masih guna probe
+    now = now_myt_str()
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        draw_id = conn.execute("""
+            INSERT INTO draws(created_at, seed, prize, filters, n_requested, n_awarded)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (now, seed, prize, json.dumps({"no_meja": no_meja, "gelaran": gelaran}), n)).lastrowid
+        lo, hi = conn.execute("SELECT MIN(seq), MAX(seq) FROM attendance").fetchone()
+
+        for _ in range(max(n, 0)):
+            row = None
+            if pool is None and lo is not None and not (no_meja or gelaran):
+                for _ in range(DRAW_PROBES):
+                    row = conn.execute(
+                        f"SELECT {cols} FROM attendance a WHERE a.seq = ? AND {cond}",
+                        (rng.randint(lo, hi), *params),
+                    ).fetchone()
+                    if row:
+                        break
+            if row is None:
+                if pool is None:   # pemenang cabutan ini sudah dalam winners -> tak termasuk
+                    pool = [s for (s,) in conn.execute(
+                        f"SELECT a.seq FROM attendance a WHERE {cond} ORDER BY a.seq", params)]
+                if not pool:
+                    break
+                i = rng.randrange(len(pool))
+                pool[i], pool[-1] = pool[-1], pool[i]
+                row = conn.execute(f"SELECT {cols} FROM attendance a WHERE a.seq = ?", (pool.pop(),)).fetchone()
+
+            conn.execute("""
+                INSERT INTO winners(email, timestamp, nama, gelaran, no_meja, prize, draw_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (*row[:1], now, *row[1:], prize, draw_id))
+            picked.append(row)
+
+        conn.execute("UPDATE draws SET n_awarded = ? WHERE id = ?", (len(picked), draw_id))
+
+    return {"draw_id": draw_id, "seed": seed, "winners": picked}
+
+def load_winners(limit: int = 100) -> pd.DataFrame:
+    with get_conn() as conn:
+        return pd.read_sql("""
+            SELECT w.draw_id, w.prize, w.nama, w.no_meja, w.email, w.timestamp
+            FROM winners w
+            ORDER BY w.draw_id DESC, w.rowid ASC
+            LIMIT ?
+        """, conn, params=(limit,))
+
+
+# =========================
+# STREAMING READER (XLSX / CSV)
+# =========================
+def iter_upload_chunks(upload, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Baca fail upload (XLSX / CSV) sebagai DataFrame kecil bersaiz chunk_rows.
+
+    XLSX guna openpyxl read_only (baris di-stream, workbook tak dimuat penuh);
+    CSV guna pd.read_csv(chunksize=...). Memori kekal ~satu batch.
+    Semua kolum dibaca sebagai str - pandas tak teka dtype berbeza setiap chunk
+    (meja 1 jadi "1" dalam satu chunk, "1.0" dalam chunk yang ada sel kosong).
+    """
+    name = (getattr(upload, "name", "") or "").lower()
+    if name.endswith(".csv"):
+        yield from pd.read_csv(upload, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(upload, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ["" if h is None else str(h) for h in header]
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(tuple(None if v is None else str(v) for v in row[:len(header)]))
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, dtype=object)
+    finally:
+        wb.close()
+
+
+# =========================
+# STREAMING EXPORT (CSV / XLSX)
+# =========================
+# Semua laporan satu export dibaca dengan cursor.fetchmany() dalam satu
+# transaksi baca (satu snapshot WAL: sheet konsisten sesama sendiri, writer
+# check-in tak pernah ditahan) dan ditulis terus ke fail: CSV baris demi baris,
+# XLSX guna openpyxl write_only. Memori kekal ~satu chunk walau berapa besar DB.
+# Sort guna temp_store=FILE (spill ke disk).
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "majlis_export")
+EXPORT_KEEP_S = 3600             # fail export lama dalam EXPORT_DIR dibuang selepas ini
+
+EXPORT_REPORTS = {
+    "hadir": ("Kehadiran", ["Email", "Nama", "Gelaran", "No_Meja", "Masa_Hadir"], """
+        SELECT email, nama, gelaran, no_meja, timestamp FROM attendance ORDER BY seq
+    """),
+    "belum": ("Belum Hadir", ["Email", "Nama", "Gelaran", "No_Meja"], """
+        SELECT m.email, m.nama, m.gelaran, m.no_meja FROM master m
+        WHERE NOT EXISTS (SELECT 1 FROM attendance a WHERE a.email = m.email)
+        ORDER BY m.no_meja, m.nama
+    """),
+    "pemenang": ("Pemenang", ["Cabutan", "Hadiah", "Email", "Nama", "Gelaran", "No_Meja", "Masa"], """
+        SELECT draw_id, prize, email, nama, gelaran, no_meja, timestamp FROM winners
+        ORDER BY draw_id, rowid
+    """),
+}
+
+def iter_report(kind: str, conn, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yield list baris (chunk_rows setiap satu) untuk satu laporan, atas conn baca caller."""
+    if kind not in EXPORT_REPORTS:
+        raise ValueError("Jenis laporan tidak sah.")
+    cur = conn.execute(EXPORT_REPORTS[kind][2])
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            break
+        yield rows
+
+def export_report(kinds, fmt: str = "xlsx", out_path: str = None, progress=None) -> dict:
+    """Tulis satu / beberapa laporan ke fail (CSV: satu laporan sahaja; XLSX: satu sheet setiap laporan).
+
+    progress(n) dipanggil selepas setiap chunk (n = jumlah baris ditulis).
+    Pulang {path, filename, rows: {kind: n}, seconds}.
+    """
+    kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+    if not kinds or any(k not in EXPORT_REPORTS for k in kinds):
+        raise ValueError("Jenis laporan tidak sah.")
+    if fmt not in ("csv", "xlsx"):
+        raise ValueError("Format export mesti csv atau xlsx.")
+    if fmt == "csv" and len(kinds) != 1:
+        raise ValueError("CSV hanya boleh satu laporan - guna XLSX untuk beberapa sheet.")
+
+    t0 = time.perf_counter()
+    stamp = now_myt_str().replace(" ", "_").replace(":", "")
+    filename = f"{'_'.join(kinds)}_{stamp}.{fmt}"
+    if out_path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        for old in os.scandir(EXPORT_DIR):
+            try:
+                if old.is_file() and time.time() - old.stat().st_mtime > EXPORT_KEEP_S:
+                    os.remove(old.path)
+            except OSError:
+                pass
+        out_path = os.path.join(EXPORT_DIR, filename)
+    counts, done = {}, 0
+
+    conn = _open_conn()
+    try:
+        conn.execute("PRAGMA temp_store=FILE")
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("BEGIN")   # satu snapshot untuk semua laporan
+        if fmt == "csv":
+            import csv
+
+            kind = kinds[0]
+            with open(out_path, "w", newline="", encoding="utf-8-sig") as f:   # BOM: Excel baca UTF-8 betul
+                w = csv.writer(f)
+                w.writerow(EXPORT_REPORTS[kind][1])
+                counts[kind] = 0
+                for rows in iter_report(kind, conn):
+                    w.writerows(rows)
+                    counts[kind] += len(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done)
+        else:
+            from openpyxl import Workbook
+
+            wb = Workbook(write_only=True)
+            for kind in kinds:
+                title, header, _ = EXPORT_REPORTS[kind]
+                ws = wb.create_sheet(title)
+                ws.append(header)
+                counts[kind] = 0
+                for rows in iter_report(kind, conn):
+                    for r in rows:
+                        ws.append(r)
+                    counts[kind] += len(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done)
+            wb.save(out_path)
+    finally:
+        conn.close()
+
+    secs = time.perf_counter() - t0
+    if PERF_ENABLED:
+        perf_record(f"export_{fmt}", secs)
+    return {"path": out_path, "filename": filename, "rows": counts, "seconds": secs}
+
+
+# =========================
+# INGEST LOG (setiap fail upload diproses sekali)
+# =========================
+@_process_singleton
+def _ingest_state():
+    """done: (kind, sha256, opts) -> info; fid: file_id upload -> sha256 (elak hash semula setiap rerun)."""
+    return {"lock": threading.Lock(), "done": {}, "fid": {}}
+
+def upload_digest(upload) -> str:
+    state = _ingest_state()
+    fid = getattr(upload, "file_id", None)
+    digest = state["fid"].get(fid) if fid else None
+    if digest is None:
+        digest = hashlib.sha256(upload.getvalue()).hexdigest()
+        if fid:
+            state["fid"][fid] = digest
+    return digest
+
+def ingest_once(kind: str, upload, fn, opts=()):
+    """Jalankan fn() sekali sahaja bagi setiap fail (kind + hash + opts) dalam proses ini.
+
+    Rerun seterusnya dengan fail sama tak proses semula - pulang hasil yang
+    disimpan. Pulang (hasil fn, info dict dengan ingested_at & ran).
+    """
+    state = _ingest_state()
+    digest = upload_digest(upload)
+    key = (kind, digest, tuple(opts))
+
+    hit = state["done"].get(key)
+    if hit is not None:
+        return hit["result"], dict(hit, ran=False)
+
+    with state["lock"]:
+        hit = state["done"].get(key)
+        if hit is not None:
+            return hit["result"], dict(hit, ran=False)
+
+        result = fn()
+        info = {"result": result, "ingested_at": now_myt_str(), "sha256": digest}
+        with get_conn() as conn:
+            conn.execute("""
+                INSERT INTO ingest_log(kind, sha256, filename, size, ingested_at, summary)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (kind, digest, getattr(upload, "name", ""), getattr(upload, "size", None),
+                  info["ingested_at"], json.dumps(result, default=str)))
+            conn.commit()
+        state["done"][key] = info
+    return result, dict(info, ran=True)
+
+def forget_ingest(*kinds):
+    """Lepas reset data, benarkan fail yang sama diproses semula."""
+    state = _ingest_state()
+    with state["lock"]:
+        for key in [k for k in state["done"] if k[0] in kinds]:
+            del state["done"][key]
+
+
+# =========================
+# TABLE MAP (KEKAL)
+# =========================
+def _clean_table_map(df_map: pd.DataFrame) -> pd.DataFrame:
+    df = df_map.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+
+    required = ["No_Meja", "x", "y"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Kolum wajib tiada: {missing}. Perlu: {required}")
+
+    if "r" not in df.columns:
+        df["r"] = 18
+
+    df["No_Meja"] = norm_meja_col(df["No_Meja"])
+    df["x"] = pd.to_numeric(df["x"], errors="coerce").fillna(0).astype(int)
+    df["y"] = pd.to_numeric(df["y"], errors="coerce").fillna(0).astype(int)
+    df["r"] = pd.to_numeric(df["r"], errors="coerce").fillna(18).astype(int)
+
+    return df.loc[df["No_Meja"].str.len() > 0, ["No_Meja", "x", "y", "r"]]
+
+def upsert_table_map(df_map: pd.DataFrame):
+    return upsert_table_map_chunks([df_map])
+
+def upsert_table_map_chunks(chunks, progress=None) -> int:
+    """Upsert table_map batch demi batch (satu transaksi setiap batch). Pulang bil. baris."""
+    n = 0
+    with get_conn() as conn:
+        for chunk in chunks:
+            df = _clean_table_map(chunk)
+            conn.executemany("""
+            INSERT INTO table_map(no_meja, x, y, r)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(no_meja) DO UPDATE SET
+              x=excluded.x, y=excluded.y, r=excluded.r
+            """, ((m, int(x), int(y), int(r)) for m, x, y, r in df.itertuples(index=False, name=None)))
+            conn.commit()
+            n += len(df)
+            if progress:
+                progress(n)
+    build_layout_highlights()
+    gc_asset_store()    # highlight lama yang diganti
+    return n
+
+def list_mapped_tables(limit=500):
+    with get_conn() as conn:
+        df = pd.read_sql("SELECT no_meja, x, y, r FROM table_map ORDER BY no_meja ASC", conn)
+    return df.head(limit)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import majlis_db  # noqa: E402
+
+
+def reset_process_state():
+    """Buang semua singleton proses (pool connection, roster, writer, ...)."""
+    for obj in list(vars(majlis_db).values()):
+        if callable(getattr(obj, "reset", None)) and hasattr(obj, "__wrapped__"):
+            obj.reset()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """majlis_db atas DB baru dalam tmp_path (schema terkini)."""
+    monkeypatch.setattr(majlis_db, "DB_NAME", str(tmp_path / "test.db"))
+    monkeypatch.setenv("MAJLIS_ASSET_DIR", str(tmp_path / "assets"))
+    reset_process_state()
+    majlis_db.init_db()
+    yield majlis_db
+    reset_process_state()
+
+
+def master_df(rows):
+    """rows: [(email, nama, no_meja), ...] -> DataFrame format template master."""
+    return pd.DataFrame(
+        [{"Email": e, "Nama": n, "Gelaran": "", "No_Meja": m} for e, n, m in rows]
+    )
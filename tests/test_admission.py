@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+import api
+
+
+def test_rate_limit_burst_then_busy(db):
+    burst, per_s = db.RATE_LIMITS["confirm"]
+    for _ in range(burst):
+        db.rate_limit("sesi1", "confirm")
+    with pytest.raises(db.Busy) as e:
+        db.rate_limit("sesi1", "confirm")
+    assert e.value.reason == "rate"
+    assert e.value.retry_after == pytest.approx(1 / per_s, rel=0.1)
+
+    db.rate_limit("sesi2", "confirm")         # bucket setiap client
+    db.rate_limit("sesi1", "lookup")          # dan setiap op
+
+
+def test_batch_cost_is_charged_per_email(db):
+    burst, _ = db.RATE_LIMITS["api_confirm"]
+    with db.admit("api_confirm", "kiosk:a", wait_s=0, cost=burst - 10):
+        pass
+    with pytest.raises(db.Busy):
+        with db.admit("api_confirm", "kiosk:a", wait_s=0, cost=500):
+            pass
+
+
+def test_api_limits_allow_a_busy_kiosk(db):
+    for _ in range(200):
+        db.rate_limit("kiosk:pintu1", "api_lookup")
+        db.rate_limit("kiosk:pintu1", "api_confirm")
+
+
+def test_gate_rejects_when_full_without_queue(db, monkeypatch):
+    monkeypatch.setattr(db, "ADMIT_MAX_ACTIVE", 2)
+    with db.admit("confirm"), db.admit("confirm"):
+        with pytest.raises(db.Busy) as e:
+            with db.admit("confirm", wait_s=0):
+                pass
+        assert e.value.reason == "queue_full"
+        with pytest.raises(db.Busy) as e:
+            with db.admit("confirm", wait_s=0.05):
+                pass
+        assert e.value.reason == "timeout"
+    with db.admit("confirm", wait_s=0):         # slot dipulang selepas keluar
+        pass
+
+    ops = {r["op"]: r for r in db.admission_stats()["ops"]}
+    assert (ops["confirm"]["diterima"], ops["confirm"]["queue_penuh"], ops["confirm"]["timeout"]) == (3, 1, 1)
+
+
+def test_gate_queue_bound(db, monkeypatch):
+    monkeypatch.setattr(db, "ADMIT_MAX_ACTIVE", 1)
+    monkeypatch.setattr(db, "ADMIT_QUEUE_MAX", 3)
+    release = threading.Event()
+    results = []
+
+    def worker():
+        try:
+            with db.admit("lookup", wait_s=5):
+                release.wait(5)
+            results.append("ok")
+        except db.Busy as e:
+            results.append(e.reason)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for _ in range(100):
+        if len(results) >= 6:
+            break
+        threading.Event().wait(0.02)
+    release.set()
+    for t in threads:
+        t.join()
+    assert sorted(results) == ["ok"] * 4 + ["queue_full"] * 6
+    assert db.admission_stats()["peak_waiting"] == 3
+
+
+def test_api_client_key_prefers_kiosk_header():
+    assert api.client_key({"x-kiosk-id": "pintu1"}, "10.0.0.5") == "kiosk:pintu1"
+    assert api.client_key({"x-kiosk-id": "bad id!"}, "10.0.0.5") == "ip:10.0.0.5"
+    assert api.client_key({}, "10.0.0.5") == "ip:10.0.0.5"
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import api
+from conftest import master_df
+
+
+@pytest.fixture
+def guests(db):
+    db.import_master(master_df([
+        ("ahmad.ali@uitm.edu.my", "Ahmad Ali", "5"),
+        ("siti@uitm.edu.my", "Siti", "7"),
+    ]))
+    return db
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_lookup_found_then_already(guests):
+    status, body = run(api.handle_lookup({"email": [" Ahmad.Ali@UiTM.edu.my "]}, None))
+    assert status == 200
+    assert (body["found"], body["no_meja"], body["checked_in"]) == (True, "5", False)
+
+    status, body = run(api.handle_confirm({}, {"email": "ahmad.ali@uitm.edu.my"}))
+    assert (status, body["status"]) == (200, "checked_in")
+    assert guests.count_stats()[1] == 1
+
+    status, body = run(api.handle_confirm({}, {"email": "ahmad.ali@uitm.edu.my"}))
+    assert (status, body["status"]) == (200, "already")
+    assert run(api.handle_lookup({"email": ["ahmad.ali@uitm.edu.my"]}, None))[1]["checked_in"] is True
+    assert guests.count_stats()[1] == 1
+
+
+def test_lookup_404_with_suggestions(guests):
+    status, body = run(api.handle_lookup({"email": ["ahmad.aly@uitm.edu.my"]}, None))
+    assert (status, body["found"]) == (404, False)
+    assert body["suggestions"][0]["email"] == "ahmad.ali@uitm.edu.my"
+
+
+def test_lookup_and_confirm_reject_bad_input(guests):
+    with pytest.raises(api.HTTPError) as e:
+        run(api.handle_lookup({}, None))
+    assert e.value.status == 400
+    with pytest.raises(api.HTTPError):
+        run(api.handle_confirm({}, {"email": " "}))
+    status, body = run(api.handle_confirm({}, {"email": "tiada@uitm.edu.my"}))
+    assert (status, body["status"]) == (404, "not_found")
+
+
+def test_confirm_with_qr_token(guests):
+    token = guests.qr_token("siti@uitm.edu.my")
+    status, body = run(api.handle_confirm({}, {"email": token}))
+    assert (status, body["email"], body["status"]) == (200, "siti@uitm.edu.my", "checked_in")
+
+
+def test_batch_summary(guests):
+    guests.confirm_checkin(guests.get_guest("siti@uitm.edu.my"))
+    status, body = run(api.handle_confirm_batch({}, {"emails": [
+        "ahmad.ali@uitm.edu.my", "siti@uitm.edu.my", "tiada@uitm.edu.my", "ahmad.ali@uitm.edu.my",
+    ]}))
+    assert status == 200
+    assert [r["status"] for r in body["results"]][1:3] == ["already", "not_found"]
+    assert body["summary"]["not_found"] == 1
+    assert guests.count_stats()[1] == 2
+
+
+def test_handlers_do_not_sync_roster_on_event_loop(guests, monkeypatch):
+    monkeypatch.setattr(guests, "ROSTER_SYNC_INLINE", False)   # seperti api.serve()
+    monkeypatch.setattr(guests, "ROSTER_SYNC_INTERVAL", 0.0)
+    synced = []
+    real = guests._roster_sync
+    monkeypatch.setattr(guests, "_roster_sync", lambda r: (synced.append(1), real(r)))
+    with guests.get_conn() as conn:   # import dari proses lain -> master_gen berubah
+        conn.execute("INSERT INTO master VALUES ('baru@uitm.edu.my', 'Baru', '', '9')")
+        conn.commit()
+
+    assert run(api.handle_lookup({"email": ["baru@uitm.edu.my"]}, None))[0] == 404
+    assert run(api.handle_confirm({}, {"email": "siti@uitm.edu.my"}))[0] == 200
+    assert synced == []
+
+    guests.roster_sync()   # kerja task latar roster_sync_loop
+    assert synced == [1]
+    assert run(api.handle_lookup({"email": ["baru@uitm.edu.my"]}, None))[0] == 200
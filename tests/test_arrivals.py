@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from conftest import master_df
+
+T0 = "2025-05-05 20:00:10"
+T0_LATE = "2025-05-05 20:00:50"   # minit sama dengan T0
+T1 = "2025-05-05 20:01:30"
+
+
+def upsert(db, email, timestamp, no_meja, ts_epoch=...):
+    """Check-in / re-confirm terus ke attendance (upsert sama seperti writer)."""
+    if ts_epoch is ...:
+        ts_epoch = db.myt_to_epoch(timestamp)
+    with db.get_conn() as conn:
+        conn.execute(db.SQL_UPSERT_ATTENDANCE, (email, timestamp, email, "", no_meja, ts_epoch))
+        conn.commit()
+
+
+def buckets(db):
+    with db.get_conn() as conn:
+        return {(m, minute): n for m, minute, n in conn.execute("SELECT no_meja, minute, n FROM arrival_buckets")}
+
+
+def minute(db, ts):
+    return db.myt_to_epoch(ts) // 60
+
+
+@pytest.fixture
+def hall(db):
+    db.import_master(master_df([("a@x.com", "A", "1"), ("b@x.com", "B", "1"), ("c@x.com", "C", "2")]))
+    return db
+
+
+def test_insert_counts_overall_and_per_table(hall):
+    m0, m1 = minute(hall, T0), minute(hall, T1)
+    upsert(hall, "a@x.com", T0, "1")
+    upsert(hall, "b@x.com", T0_LATE, "1")
+    upsert(hall, "c@x.com", T1, "2")
+
+    assert buckets(hall) == {("*", m0): 2, ("1", m0): 2, ("*", m1): 1, ("2", m1): 1}
+    assert hall.check_counters() == {}
+
+
+def test_reconfirm_moves_bucket(hall):
+    m0, m1 = minute(hall, T0), minute(hall, T1)
+    upsert(hall, "a@x.com", T0, "1")
+    upsert(hall, "b@x.com", T0, "1")
+
+    upsert(hall, "a@x.com", T0_LATE, "1")           # minit & meja sama -> tiada perubahan
+    assert buckets(hall) == {("*", m0): 2, ("1", m0): 2}
+
+    upsert(hall, "a@x.com", T1, "1")                # timestamp berubah minit
+    assert buckets(hall) == {("*", m0): 1, ("1", m0): 1, ("*", m1): 1, ("1", m1): 1}
+
+    upsert(hall, "b@x.com", T0, "2")                # pindah meja, minit sama
+    assert buckets(hall) == {("*", m0): 1, ("2", m0): 1, ("*", m1): 1, ("1", m1): 1}
+    assert hall.check_counters() == {}
+
+    with hall.get_conn() as conn:
+        conn.execute("DELETE FROM attendance WHERE email = 'b@x.com'")
+        conn.commit()
+    assert buckets(hall) == {("*", m1): 1, ("1", m1): 1}
+
+
+def test_missing_epoch_falls_back_to_timestamp(hall):
+    upsert(hall, "a@x.com", T0, "1", ts_epoch=None)   # rekod lama tanpa ts_epoch
+    assert buckets(hall) == {("*", minute(hall, T0)): 1, ("1", minute(hall, T0)): 1}
+    assert hall.check_counters() == {}
+
+
+def test_forecast_sees_writer_checkin(hall):
+    now_min = int(time.time()) // 60
+    hall.confirm_checkin(hall.get_guest("c@x.com"))
+    got = buckets(hall)
+    # check-in mungkin jatuh tepat pada sempadan minit
+    assert got in ({("*", now_min): 1, ("2", now_min): 1}, {("*", now_min + 1): 1, ("2", now_min + 1): 1})
+
+    res = hall.arrival_forecast("2")
+    assert (res["total"], res["hadir"], res["belum"]) == (1, 1, 0)
+    assert res["actual"][-1] == 1
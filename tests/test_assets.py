@@ -0,0 +1,72 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+
+def png(w=1200, h=800, color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_blob_cache_bounds_open_files(db, monkeypatch):
+    monkeypatch.setattr(db, "BLOB_MMAP_MIN_BYTES", 4096)
+    small = [db.blob_put(os.urandom(1000)) for _ in range(300)]
+    large = [db.blob_put(os.urandom(8192)) for _ in range(40)]
+
+    before = open_fds()
+    for sha in small + large:
+        assert db.blob_view(sha) is not None
+    assert open_fds() - before <= db.BLOB_MMAP_MAX
+    assert all(isinstance(db.blob_view(sha), bytes) for sha in small[-5:])
+    assert isinstance(db.blob_view(large[-1]), memoryview)
+
+
+def test_display_bytes_not_copied_per_call(db):
+    db.save_asset("poster", "poster.png", png())
+    a, fmt = db.get_asset_display("poster")
+    b, _ = db.get_asset_display("poster")
+    assert fmt == "JPEG" and isinstance(a, bytes)
+    assert a is b
+
+
+def test_highlight_bytes_not_copied_per_call(db):
+    import pandas as pd
+    db.save_asset("layout", "layout.png", png())
+    db.upsert_table_map(pd.DataFrame({"No_Meja": ["1", "2"], "x": [100, 300], "y": [100, 300]}))
+    a, _ = db.get_layout_highlight("1")
+    assert a is not None and a is db.get_layout_highlight("1")[0]
+    assert db.get_layout_highlight("99") == (None, None)
+
+
+def test_store_stats_read_only_and_gc_after_upload(db):
+    db.save_asset("poster", "a.png", png(color=(255, 0, 0)))
+    first = db.asset_store_stats()
+    db.save_asset("poster", "b.png", png(color=(0, 0, 255)))
+    assert db.asset_store_stats()["files"] > first["files"]     # versi lama masih dalam grace
+
+    assert db.gc_asset_store(grace_s=0)["removed"] == first["files"]
+    stats = db.asset_store_stats()
+    assert stats == db.asset_store_stats()                        # stat tak ubah apa-apa
+    assert db.get_asset_display("poster")[0] is not None
+
+
+def test_highlight_build_uses_stored_layout_digest(db, monkeypatch):
+    import pandas as pd
+    layout = png()
+    db.save_asset("layout", "layout.png", layout)
+    db.upsert_table_map(pd.DataFrame({"No_Meja": ["1", "2"], "x": [100, 300], "y": [100, 300]}))
+
+    hashed = []
+    real_sha256 = db.hashlib.sha256
+    monkeypatch.setattr(db.hashlib, "sha256", lambda d=b"": (hashed.append(len(d)), real_sha256(d))[1])
+    monkeypatch.setattr(db, "blob_view", lambda sha: pytest.fail("layout dibaca walaupun semua cache"))
+    res = db.build_layout_highlights()
+    assert (res["built"], res["cached"]) == (0, 2)
+    assert len(layout) not in hashed
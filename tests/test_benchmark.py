@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+import benchmark
+
+
+def test_refuses_existing_db(tmp_path):
+    path = tmp_path / "dinner.db"
+    path.write_bytes(b"")
+    with pytest.raises(SystemExit) as e:
+        benchmark.main(["--db", str(path), "--duration", "0"])
+    assert e.value.code == 2
+    assert path.read_bytes() == b""
+
+
+def test_refuses_existing_asset_dir(tmp_path):
+    os.mkdir(tmp_path / "dinner_assets")
+    with pytest.raises(SystemExit):
+        benchmark.main(["--db", str(tmp_path / "dinner.db"), "--duration", "0"])
+    assert not (tmp_path / "dinner.db").exists()
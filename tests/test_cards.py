@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import cards
+from conftest import master_df
+
+
+@pytest.fixture
+def card_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "cards")
+    monkeypatch.setattr(cards, "CARD_DIR", path)
+    return path
+
+
+def test_qr_token_round_trip(db):
+    token = db.qr_token(" Ahmad@UiTM.edu.my ")
+    assert db.resolve_token(token) == "ahmad@uitm.edu.my"
+    assert db.parse_checkin_input(token) == "ahmad@uitm.edu.my"
+    assert db.parse_checkin_input(f"https://majlis.example/?t={token}&x=1") == "ahmad@uitm.edu.my"
+
+
+def test_qr_token_tamper_rejected(db):
+    prefix, payload, sig = db.qr_token("ahmad@uitm.edu.my").split(".")
+    other = db.qr_token("siti@uitm.edu.my").split(".")[1]
+    assert db.resolve_token(f"{prefix}.{other}.{sig}") is None                # email ditukar
+    bad_sig = ("B" if sig[0] == "A" else "A") + sig[1:]
+    assert db.resolve_token(f"{prefix}.{payload}.{bad_sig}") is None          # tandatangan diubah
+    assert db.resolve_token(f"{prefix}.{payload}") is None
+    assert db.resolve_token(f"X.{payload}.{sig}") is None
+    assert db.parse_checkin_input(f"{prefix}.{payload}.!!") == ""
+
+
+def test_cards_cached_per_roster_and_old_files_pruned(db, card_dir):
+    db.import_master(master_df([("a@x.com", "A", "1"), ("b@x.com", "B", "2")]))
+    first = cards.generate_cards("zip")
+    assert (first["count"], first["cached"]) == (2, False)
+    assert cards.generate_cards("zip")["cached"]
+    pdf = cards.generate_cards("pdf")["path"]
+
+    stale_part = os.path.join(card_dir, "kad_jemputan_lama.pdf.part")
+    open(stale_part, "wb").close()
+    os.utime(stale_part, (0, 0))
+    fresh_part = os.path.join(card_dir, "kad_jemputan_lain.zip.part")
+    open(fresh_part, "wb").close()
+
+    db.import_master(master_df([("c@x.com", "C", "3")]))   # master_gen berubah -> tag baru
+    second = cards.generate_cards("zip")
+    assert (second["count"], second["cached"]) == (3, False)
+    assert sorted(os.listdir(card_dir)) == sorted([os.path.basename(second["path"]), os.path.basename(fresh_part)])
+    assert not os.path.exists(pdf)
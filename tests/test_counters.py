@@ -0,0 +1,53 @@
+from conftest import master_df
+
+
+def table_counts(db):
+    with db.get_conn() as conn:
+        return {m: (t, h) for m, t, h in conn.execute(
+            "SELECT no_meja, total, hadir FROM table_counters WHERE total > 0 OR hadir > 0"
+        )}
+
+
+def test_reimport_moves_guest_to_existing_table(db):
+    db.import_master(master_df([("a@x.com", "A", "1"), ("b@x.com", "B", "2")]))
+    res = db.import_master(master_df([("a@x.com", "A", "2"), ("b@x.com", "B", "2")]))
+
+    assert res["updated"] == 1
+    assert table_counts(db) == {"2": (2, 0)}
+    assert db.check_counters() == {}
+
+
+def test_reconfirm_moves_attendance_to_existing_table(db):
+    db.import_master(master_df([("a@x.com", "A", "1"), ("b@x.com", "B", "2")]))
+    db.confirm_checkin(("a@x.com", "A", "", "1"))
+    db.confirm_checkin(("b@x.com", "B", "", "2"))
+
+    db.confirm_checkin(("a@x.com", "A", "", "2"))
+
+    assert table_counts(db) == {"1": (1, 0), "2": (1, 2)}
+    assert db.count_stats() == (2, 2, 0)
+    assert db.check_counters() == {}
+
+
+def test_counters_follow_import_replace_and_reset(db):
+    db.import_master(master_df([(f"g{i}@x.com", f"G {i}", str(i % 3)) for i in range(30)]))
+    for i in range(0, 30, 2):
+        db.confirm_checkin(db.get_guest(f"g{i}@x.com"))
+    assert db.count_stats() == (30, 15, 15)
+
+    # swap penuh: 10 dibuang, 5 baru, semua pindah meja
+    res = db.import_master(
+        master_df([(f"g{i}@x.com", f"G {i}", str((i + 1) % 3)) for i in range(10, 35)]),
+        replace=True,
+    )
+    assert (res["added"], res["removed"]) == (5, 10)
+    assert db.count_stats()[0] == 25
+    assert db.check_counters() == {}
+
+    with db.get_conn() as conn:
+        conn.execute("DELETE FROM attendance")
+        conn.execute("DELETE FROM master")
+        conn.commit()
+    assert db.count_stats() == (0, 0, 0)
+    assert table_counts(db) == {}
+    assert db.check_counters() == {}
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import master_df
+
+
+@pytest.fixture
+def hall(db):
+    """30 hadir: meja 1..3, gelaran Dr. untuk i % 5 == 0."""
+    db.import_master(master_df([(f"g{i}@x.com", f"G {i}", str(i % 3 + 1)) for i in range(30)]))
+    for i in range(30):
+        email, nama, _, meja = db.get_guest(f"g{i}@x.com")
+        db.confirm_checkin((email, nama, "Dr." if i % 5 == 0 else "", meja))
+    return db
+
+
+def winner_emails(res):
+    return [w[0] for w in res["winners"]]
+
+
+def draw_row(db, draw_id):
+    with db.get_conn() as conn:
+        return conn.execute("SELECT n_requested, n_awarded, seed FROM draws WHERE id = ?", (draw_id,)).fetchone()
+
+
+def test_winners_excluded_from_later_draws(hall):
+    seen = []
+    for _ in range(6):
+        seen += winner_emails(hall.draw_winners(5, prize="Hamper"))
+    assert len(seen) == len(set(seen)) == 30
+    assert hall.draw_winners(1)["winners"] == []
+
+
+def test_filters_honoured(hall):
+    # Dr. di meja 1: g0, g15
+    res = hall.draw_winners(10, no_meja=["1"], gelaran=["Dr."])
+    assert sorted(winner_emails(res)) == ["g0@x.com", "g15@x.com"]
+
+    res = hall.draw_winners(10, gelaran=["Dr."])
+    assert len(res["winners"]) == 4
+    assert {w[2] for w in res["winners"]} == {"Dr."}
+
+    res = hall.draw_winners(4, no_meja=["2"])
+    assert len(res["winners"]) == 4
+    assert {w[3] for w in res["winners"]} == {"2"}
+
+
+def test_n_awarded_capped_at_pool(hall):
+    res = hall.draw_winners(50, no_meja=["3"])
+    assert len(res["winners"]) == 10
+    assert draw_row(hall, res["draw_id"])[:2] == (50, 10)
+
+
+def test_sparse_pool_after_most_have_won(hall, monkeypatch):
+    monkeypatch.setattr(hall, "DRAW_PROBES", 1)   # paksa laluan senarai seq
+    first = set(winner_emails(hall.draw_winners(27)))
+    rest = set(winner_emails(hall.draw_winners(5)))
+    assert len(rest) == 3 and not (first & rest)
+
+
+def test_same_seed_same_draw(hall):
+    res = hall.draw_winners(8, seed="abc")
+    a = winner_emails(res)
+    assert draw_row(hall, res["draw_id"])[2] == "abc"
+    with hall.get_conn() as conn:   # undo cabutan, ulang dengan seed sama
+        conn.execute("DELETE FROM winners WHERE draw_id = ?", (res["draw_id"],))
+        conn.commit()
+    assert winner_emails(hall.draw_winners(8, seed="abc")) == a
+    assert winner_emails(hall.draw_winners(3, no_meja=["1"], seed="x")) != []
@@ -0,0 +1,70 @@
+import csv
+
+import pytest
+
+from conftest import master_df
+
+
+@pytest.fixture
+def hall(db):
+    """10 tetamu, 4 hadir, satu cabutan 2 pemenang."""
+    db.import_master(master_df([(f"g{i}@x.com", f"G {i}", str(i % 2 + 1)) for i in range(10)]))
+    for i in range(4):
+        db.confirm_checkin(db.get_guest(f"g{i}@x.com"))
+    db.draw_winners(2, prize="Hamper")
+    return db
+
+
+def sheet_rows(path):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        return {ws.title: list(ws.values) for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_xlsx_one_sheet_per_report(hall, tmp_path):
+    out = hall.export_report(["hadir", "belum", "pemenang"], "xlsx", out_path=str(tmp_path / "r.xlsx"))
+    assert out["rows"] == {"hadir": 4, "belum": 6, "pemenang": 2}
+
+    sheets = sheet_rows(out["path"])
+    assert list(sheets) == ["Kehadiran", "Belum Hadir", "Pemenang"]
+    assert sheets["Kehadiran"][0] == tuple(hall.EXPORT_REPORTS["hadir"][1])
+    assert [len(rows) - 1 for rows in sheets.values()] == [4, 6, 2]
+    assert [r[0] for r in sheets["Kehadiran"][1:]] == [f"g{i}@x.com" for i in range(4)]
+
+
+def test_csv_single_report(hall, tmp_path):
+    progress = []
+    out = hall.export_report("belum", "csv", out_path=str(tmp_path / "b.csv"), progress=progress.append)
+    assert out["rows"] == {"belum": 6}
+    assert progress == [6]
+    with open(out["path"], newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == hall.EXPORT_REPORTS["belum"][1]
+    assert sorted(r[0] for r in rows[1:]) == [f"g{i}@x.com" for i in range(4, 10)]
+
+
+def test_bad_requests_rejected(hall, tmp_path):
+    with pytest.raises(ValueError):
+        hall.export_report(["hadir", "belum"], "csv", out_path=str(tmp_path / "x.csv"))
+    with pytest.raises(ValueError):
+        hall.export_report([], "xlsx")
+    with pytest.raises(ValueError):
+        hall.export_report(["entah"], "xlsx")
+    with pytest.raises(ValueError):
+        hall.export_report(["hadir"], "json")
+    assert not (tmp_path / "x.csv").exists()
+
+
+def test_sheets_share_one_snapshot(hall, tmp_path):
+    def checkin_mid_export(n):   # selepas sheet Kehadiran, sebelum Belum Hadir
+        if n == 4:
+            hall.confirm_checkin(hall.get_guest("g9@x.com"))
+
+    out = hall.export_report(["hadir", "belum"], "xlsx", out_path=str(tmp_path / "s.xlsx"),
+                             progress=checkin_mid_export)
+    assert out["rows"] == {"hadir": 4, "belum": 6}
+    assert hall.count_stats() == (10, 5, 5)
@@ -0,0 +1,88 @@
+import io
+
+from openpyxl import Workbook
+
+
+def upload(data: bytes, name: str):
+    f = io.BytesIO(data)
+    f.name = name
+    return f
+
+
+def tables(db):
+    with db.get_conn() as conn:
+        return dict(conn.execute("SELECT no_meja, total FROM table_counters WHERE total > 0"))
+
+
+def test_norm_meja():
+    import majlis_db as db
+    assert db.norm_meja(" vip 1 ") == "VIP1"
+    assert db.norm_meja(1.0) == "1"
+    assert db.norm_meja("12.00") == "12"
+    assert db.norm_meja("1.5") == "1.5"
+    assert db.norm_meja(None) == ""
+
+
+def test_csv_chunks_keep_table_numbers_consistent(db):
+    # chunk kedua ada sel No_Meja kosong -> dulu pandas baca kolum itu sebagai float
+    csv = "Email,Nama,Gelaran,No_Meja\n" + "\n".join([
+        "a@x.com,A,,1", "b@x.com,B,,1",
+        "c@x.com,C,,1", "d@x.com,D,,",
+        "e@x.com,NA,,007",
+    ])
+    chunks = list(db.iter_upload_chunks(upload(csv.encode(), "master.csv"), chunk_rows=2))
+    assert len(chunks) == 3
+    res = db.import_master_chunks(chunks)
+
+    assert res["rows"] == 5
+    assert tables(db) == {"1": 3, "": 1, "007": 1}
+    assert db.get_guest("e@x.com")[1] == "NA"     # bukan NaN
+
+
+def test_chunks_normalise_emails_and_dedupe_across_batches(db):
+    csv = "Email,Nama,Gelaran,No_Meja\n" + "\n".join([
+        " A@X.com ,A lama,,1", "b@x.com,B,,2",
+        "a@x.com,A baru,Dr.,3", ",Tiada email,,4",
+        "x,Pendek,,4",
+    ])
+    res = db.import_master_chunks(db.iter_upload_chunks(upload(csv.encode(), "master.csv"), chunk_rows=2))
+
+    assert (res["rows"], res["added"], res["rejected"]) == (2, 2, 2)
+    assert res["duplicates"] == ["a@x.com"]
+    assert db.get_guest("a@x.com") == ("a@x.com", "A baru", "Dr.", "3")
+    assert tables(db) == {"2": 1, "3": 1}
+    assert db.check_counters() == {}
+
+
+def test_xlsx_chunks_read_as_text(db):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Email", "Nama", "Gelaran", "No_Meja"])
+    ws.append(["a@x.com", "A", None, 1])
+    ws.append(["b@x.com", "B", None, 1.0])
+    ws.append(["c@x.com", "C", None, None])
+    ws.append(["d@x.com", "D", None, "VIP 2"])
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    db.import_master_chunks(db.iter_upload_chunks(upload(buf.getvalue(), "master.xlsx"), chunk_rows=2))
+    assert tables(db) == {"1": 2, "": 1, "VIP2": 1}
+
+
+def test_dataframe_with_float_tables(db):
+    import pandas as pd
+    df = pd.DataFrame({"Email": ["a@x.com", "b@x.com"], "Nama": ["A", "B"], "No_Meja": [3.0, None]})
+    db.import_master(df)
+    assert tables(db) == {"3": 1, "": 1}
+
+
+def test_migration_merges_float_table_numbers(db):
+    with db.get_conn() as conn:
+        conn.execute("INSERT INTO master(email, nama, no_meja) VALUES ('a@x.com', 'A', '1'), ('b@x.com', 'B', '1.0')")
+        conn.execute("INSERT INTO table_map(no_meja, x, y, r) VALUES ('1', 10, 10, 18), ('1.0', 99, 99, 18), ('2.0', 5, 5, 18)")
+        conn.commit()
+        db._m013_meja_integral_float(conn)
+        conn.commit()
+        assert dict(conn.execute("SELECT no_meja, x FROM table_map")) == {"1": 10, "2": 5}
+    assert tables(db) == {"1": 2}
+    assert db.check_counters() == {}
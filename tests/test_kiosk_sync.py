@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+import kiosk_sync
+from conftest import master_df, reset_process_state
+
+
+@pytest.fixture
+def sites(db, tmp_path, monkeypatch):
+    """Dua DB dalam satu proses: use("pusat") / use("pintu1") tukar DB aktif majlis_db."""
+    def use(name):
+        monkeypatch.setattr(db, "DB_NAME", str(tmp_path / f"{name}.db"))
+        reset_process_state()
+        db.init_db()
+        return db
+
+    use.sync_dir = str(tmp_path / "sync")
+    os.makedirs(use.sync_dir)
+    return use
+
+
+def checkin_raw(db, email, timestamp):
+    with db.get_conn() as conn:
+        conn.execute(db.SQL_UPSERT_ATTENDANCE, (email, timestamp, email, "", "1", db.myt_to_epoch(timestamp)))
+        conn.commit()
+
+
+def kiosk_checkins(db, rows):
+    """Tulis terus ke changelog kiosk dengan timestamp tetap: rows = [(email, timestamp), ...]."""
+    with db.get_conn() as conn:
+        conn.executemany(db.SQL_APPEND_CHANGELOG, [(e, t, e, "", "1") for e, t in rows])
+        conn.commit()
+
+
+def attendance(db):
+    with db.get_conn() as conn:
+        return dict(conn.execute("SELECT email, timestamp FROM attendance"))
+
+
+def segments(db):
+    with db.get_conn() as conn:
+        return conn.execute("SELECT name, rows, inserted, replaced, duplicates FROM sync_segments ORDER BY name").fetchall()
+
+
+def test_round_trip_earliest_wins_and_stats(sites):
+    pusat = sites("pusat")
+    pusat.import_master(master_df([(f"{c}@x.com", c.upper(), "1") for c in "abcd"]))
+    checkin_raw(pusat, "a@x.com", "2025-05-05 20:05:00")
+    checkin_raw(pusat, "b@x.com", "2025-05-05 20:00:00")
+
+    kiosk = sites("pintu1")
+    kiosk_checkins(kiosk, [
+        ("a@x.com", "2025-05-05 20:01:00"),   # lebih awal dari pusat -> ganti
+        ("b@x.com", "2025-05-05 20:02:00"),   # lebih lewat -> duplikat
+        ("c@x.com", "2025-05-05 20:03:00"),   # baru
+        ("C@x.com", "2025-05-05 20:04:00"),   # email sama dalam segmen -> duplikat
+        ("d@x.com", "2025-05-05 20:06:00"),   # baru
+    ])
+    assert kiosk_sync.push_changelog(sites.sync_dir, "pintu1") == 5
+    assert kiosk_sync.push_changelog(sites.sync_dir, "pintu1") == 0
+    assert kiosk_sync.kiosk_status()["pending"] == 0
+
+    pusat = sites("pusat")
+    total = kiosk_sync.merge_inbox(sites.sync_dir)
+    assert total == {"segments": 1, "rows": 5, "inserted": 2, "replaced": 1, "duplicates": 2}
+    assert segments(pusat) == [("pintu1/0000000001-0000000005.jsonl", 5, 2, 1, 2)]
+    assert attendance(pusat) == {
+        "a@x.com": "2025-05-05 20:01:00",
+        "b@x.com": "2025-05-05 20:00:00",
+        "c@x.com": "2025-05-05 20:03:00",
+        "d@x.com": "2025-05-05 20:06:00",
+    }
+    assert pusat.count_stats() == (4, 4, 0)
+    assert pusat.check_counters() == {}
+
+
+def test_repush_after_crash_not_double_counted(sites, monkeypatch):
+    monkeypatch.setattr(kiosk_sync, "SYNC_SEGMENT_ROWS", 2)
+    sites("pusat").import_master(master_df([(f"g{i}@x.com", f"G {i}", "1") for i in range(5)]))
+
+    kiosk = sites("pintu1")
+    kiosk_checkins(kiosk, [(f"g{i}@x.com", f"2025-05-05 20:0{i}:00") for i in range(3)])
+    assert kiosk_sync.push_changelog(sites.sync_dir, "pintu1") == 3
+
+    pusat = sites("pusat")
+    assert kiosk_sync.merge_inbox(sites.sync_dir)["inserted"] == 3
+
+    # kiosk crash sebelum sync_pushed_id disimpan -> hantar semula dari awal, nama segmen sama
+    kiosk = sites("pintu1")
+    with kiosk.get_conn() as conn:
+        kiosk_sync._set_setting(conn, "sync_pushed_id", 0)
+        conn.commit()
+    assert kiosk_sync.push_changelog(sites.sync_dir, "pintu1") == 3
+    assert sorted(os.listdir(os.path.join(sites.sync_dir, "inbox", "pintu1"))) == [
+        "0000000001-0000000002.jsonl", "0000000003-0000000003.jsonl",
+    ]
+
+    pusat = sites("pusat")
+    assert kiosk_sync.merge_inbox(sites.sync_dir)["segments"] == 0
+    assert len(segments(pusat)) == 2
+
+    # crash lagi, kali ini dengan check-in baru -> segmen bertindih dengan nama lain
+    kiosk = sites("pintu1")
+    kiosk_checkins(kiosk, [("g3@x.com", "2025-05-05 20:03:00")])
+    with kiosk.get_conn() as conn:
+        kiosk_sync._set_setting(conn, "sync_pushed_id", 2)
+        conn.commit()
+    assert kiosk_sync.push_changelog(sites.sync_dir, "pintu1") == 2
+
+    pusat = sites("pusat")
+    total = kiosk_sync.merge_inbox(sites.sync_dir)
+    assert (total["segments"], total["inserted"], total["replaced"], total["duplicates"]) == (1, 1, 0, 1)
+    assert pusat.count_stats() == (5, 4, 1)
+    assert pusat.check_counters() == {}
@@ -0,0 +1,109 @@
+import io
+import sqlite3
+
+import pytest
+
+from conftest import reset_process_state
+
+# Schema asal (app.py sebelum majlis_db wujud): tiada schema_version, counters,
+# FTS atau asset store - asset disimpan sebagai BLOB dalam event_assets.
+BASELINE_SCHEMA = """
+CREATE TABLE master (email TEXT PRIMARY KEY, nama TEXT, gelaran TEXT, no_meja TEXT);
+CREATE TABLE attendance (email TEXT PRIMARY KEY, timestamp TEXT, nama TEXT, gelaran TEXT, no_meja TEXT);
+CREATE TABLE winners (email TEXT PRIMARY KEY, timestamp TEXT, nama TEXT, gelaran TEXT, no_meja TEXT);
+CREATE TABLE table_map (no_meja TEXT PRIMARY KEY, x INTEGER, y INTEGER, r INTEGER);
+CREATE TABLE event_assets (
+    id INTEGER PRIMARY KEY,
+    poster_filename TEXT, poster_bytes BLOB,
+    layout_filename TEXT, layout_bytes BLOB,
+    aturcara_filename TEXT, aturcara_bytes BLOB,
+    updated_at TEXT
+);
+"""
+
+
+def png_bytes(color, size=(64, 48)):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def baseline(tmp_path, monkeypatch):
+    """majlis_db atas DB schema asal yang sudah berisi data (belum dimigrate)."""
+    import majlis_db
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    # pandas lama baca no_meja sebagai float -> "5.0"
+    conn.executemany("INSERT INTO master VALUES (?,?,?,?)",
+                     [(f"ahmad{i}@x.com", f"Ahmad {i}", "Dr.", f"{i % 3}.0") for i in range(12)]
+                     + [(f"siti{i}@x.com", f"Siti {i}", "", "VIP") for i in range(6)])
+    conn.executemany("INSERT INTO attendance VALUES (?,?,?,?,?)",
+                     [(f"ahmad{i}@x.com", "2025-05-05 20:00:00", f"Ahmad {i}", "Dr.", f"{i % 3}.0") for i in range(0, 12, 2)]
+                     + [("siti0@x.com", "2025-05-05 20:01:00", "Siti Lain", "", "VIP"),
+                        ("ghost@x.com", "2025-05-05 20:02:00", "Ahmad Walk-in", "", "9")])
+    conn.execute("INSERT INTO winners VALUES ('ahmad0@x.com', '2025-05-05 21:00:00', 'Ahmad 0', 'Dr.', '0.0')")
+    conn.execute("INSERT INTO table_map VALUES ('1.0', 10, 20, 5)")
+    conn.execute("INSERT INTO event_assets(id, poster_filename, poster_bytes, updated_at) VALUES (1, 'poster.png', ?, ?)",
+                 (png_bytes((200, 30, 30)), "2025-05-01 09:00:00"))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(majlis_db, "DB_NAME", path)
+    monkeypatch.setenv("MAJLIS_ASSET_DIR", str(tmp_path / "assets"))
+    reset_process_state()
+    yield majlis_db
+    reset_process_state()
+
+
+def test_baseline_migrates_to_latest(baseline):
+    db = baseline
+    assert db.schema_version() == 0
+
+    applied = db.migrate_db()
+
+    assert applied == [v for v, _, _ in db.MIGRATIONS]
+    assert db.schema_version() == db.SCHEMA_VERSION
+    assert db.migrate_db() == []
+
+
+def test_baseline_data_consistent_after_migration(baseline):
+    db = baseline
+    db.init_db()
+
+    assert db.check_counters() == {}
+    assert db.count_stats() == (18, 8, 10)
+    assert db.get_guest("AHMAD4@x.com")[3] == "1"
+    with db.get_conn() as conn:
+        mejas = {m for (m,) in conn.execute(
+            "SELECT no_meja FROM master UNION SELECT no_meja FROM attendance "
+            "UNION SELECT no_meja FROM winners UNION SELECT no_meja FROM table_map")}
+    assert mejas == {"0", "1", "2", "VIP", "9"}
+
+
+def test_baseline_search_after_migration(baseline):
+    db = baseline
+    db.init_db()
+
+    assert db.search_guests("ahmad", "semua")[1] == 12
+    assert db.search_guests("ahmad", "belum")[1] == 6
+    assert db.search_guests("ahmad", "hadir")[1] == 6 + 1   # + walk-in (tiada dalam master)
+    assert db.search_guests("siti", "belum")[1] == 5
+    assert db.search_guests("meja:1", "semua")[1] == 4
+
+
+def test_baseline_assets_moved_to_store(baseline):
+    db = baseline
+    db.init_db()
+
+    fn, data, _ = db.get_asset_bytes("poster")
+    assert fn == "poster.png"
+    assert bytes(data) == png_bytes((200, 30, 30))
+    assert db.get_asset_display("poster")[0] is not None
+    with db.get_conn() as conn:
+        assert conn.execute("SELECT poster_bytes FROM event_assets WHERE id=1").fetchone() == (None,)
+    assert db.asset_store_stats()["files"] == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import master_df
+
+
+def checkin_raw(db, email, nama, no_meja="1"):
+    """Check-in terus ke attendance (boleh email luar master / nama lain dari master)."""
+    with db.get_conn() as conn:
+        conn.execute(db.SQL_UPSERT_ATTENDANCE, (email, "2025-05-05 10:00:00", nama, "", no_meja, 1746410400))
+        conn.commit()
+
+
+def walk(db, query, status, page_size):
+    """Semua halaman keyset -> (emails, total setiap halaman)."""
+    emails, totals, after = [], set(), 0
+    while True:
+        rows, total, after = db.search_guests(query, status, after=after, page_size=page_size)
+        emails += [r[0] for r in rows]
+        totals.add(total)
+        if after is None:
+            return emails, totals
+
+
+@pytest.fixture
+def roster(db):
+    db.import_master(master_df(
+        [(f"ahmad{i}@x.com", f"Ahmad {i}", str(i % 4)) for i in range(23)]
+        + [(f"siti{i}@x.com", f"Siti {i}", str(i % 4)) for i in range(17)]
+    ))
+    for i in range(0, 23, 3):
+        db.confirm_checkin(db.get_guest(f"ahmad{i}@x.com"))
+    # nama attendance lain dari master + tetamu luar senarai
+    checkin_raw(db, "siti0@x.com", "Ahmad Walk-in")
+    for i in range(5):
+        checkin_raw(db, f"ghost{i}@x.com", f"Ahmad Ghost {i}")
+    return db
+
+
+@pytest.mark.parametrize("query", ["", "ahmad", "siti", "x", "meja:2"])
+def test_totals_match_rows_for_every_status(roster, query):
+    with roster.get_conn() as conn:
+        hadir = {e for (e,) in conn.execute("SELECT email FROM attendance")}
+    all_rows, _ = walk(roster, query, "semua", 1000)
+    belum_rows, belum_totals = walk(roster, query, "belum", 7)
+    hadir_rows, hadir_totals = walk(roster, query, "hadir", 7)
+
+    assert belum_totals == {len(belum_rows)}
+    assert hadir_totals == {len(hadir_rows)}
+    assert set(belum_rows) == {e for e in all_rows if e not in hadir}
+    assert len(set(belum_rows)) == len(belum_rows)
+
+
+def test_belum_total_ignores_attendance_name_and_ghosts(roster):
+    # "ahmad": 23 dalam master, 8 sudah hadir; siti0 & ghost* tiada kaitan dengan 'belum'
+    assert roster.search_guests("ahmad", "belum")[1] == 15
+    assert roster.search_guests("siti", "belum")[1] == 16
+    assert roster.search_guests("", "belum")[1] == 40 - 9
+    assert roster.search_guests("ahmad", "hadir")[1] == 8 + 1 + 5
+
+
+def test_keyset_pages_cover_all_without_duplicates(roster):
+    for status in ("semua", "hadir", "belum"):
+        emails, totals = walk(roster, "", status, 4)
+        assert len(emails) == len(set(emails)) == totals.pop()
+
+
+def test_totals_follow_checkins(roster):
+    assert roster.search_guests("siti", "belum")[1] == 16
+    roster.confirm_checkin(roster.get_guest("siti5@x.com"))
+    assert roster.search_guests("siti", "belum")[1] == 15
+    with roster.get_conn() as conn:   # reset seperti butang Admin
+        conn.execute("DELETE FROM attendance")
+        conn.commit()
+    assert roster.search_guests("siti", "belum")[1] == 17
+
+
+def test_master_hadir_consistent_after_reimport(roster):
+    roster.import_master(master_df([(f"siti{i}@x.com", f"Siti {i}", "9") for i in range(17)]), replace=True)
+    assert roster.check_counters() == {}
+    assert roster.search_guests("", "belum")[1] == 16
+    assert roster.search_guests("ahmad", "belum")[1] == 0
+
+
+def test_bad_status_rejected(db):
+    with pytest.raises(ValueError):
+        db.search_guests("", "entah")